@@ -0,0 +1,242 @@
+# bench.py
+#
+# Benchmarks the game engines on every stratagem pairing and compares the
+# results against a stored baseline.
+import argparse
+import json
+import numpy as np
+import platform
+import sys
+import tracemalloc
+
+from datetime import datetime
+from itertools import combinations_with_replacement
+from pathlib import Path
+from time import perf_counter, time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from game import BatchMatch, Match
+from gather_data import EXPERIMENTS, STRATAGEMS
+from rng import BlockRandom
+from stratagem import Stratagem, resolve, shared
+from trials import Experiment
+
+# Games timed per pairing by each engine
+NUM_GAMES: dict[str, int] = {
+    'batch': 20000,
+    'fast': 2000,
+    'match': 2000,
+}
+
+# Seed of every timed run, so runs compared against a baseline play the same games
+SEED: int = 0
+
+# Folder benchmark results are written to
+OUT_DIRECTORY = "./benchmarks/results/"
+
+# Bump when the layout of the results file changes
+RESULTS_VERSION: int = 1
+
+parser = argparse.ArgumentParser(
+    prog="BenchBuckshotEngines",
+    description="Times every game engine on every stratagem pairing and flags regressions against a baseline."
+)
+
+parser.add_argument('-e', '--engines', nargs='+', choices=tuple(NUM_GAMES), default=list(NUM_GAMES), metavar='ENGINE',
+                    help=f'engines to benchmark (default all: {", ".join(NUM_GAMES)})')
+parser.add_argument('-s', '--strats', nargs='+', metavar='STRATEGY',
+                    help='stratagems to pair up (default all)')
+parser.add_argument('-g', '--scale', type=float, default=1.0,
+                    help='multiply the number of games timed per pairing by SCALE (default 1)')
+parser.add_argument('-n', '--repeat', type=int, default=3,
+                    help='time each pairing REPEAT times and keep the fastest (default 3)')
+parser.add_argument('-o', '--output', metavar='FILE',
+                    help=f'file to write results to (default {OUT_DIRECTORY}[date]-[time].json)')
+parser.add_argument('-b', '--baseline', metavar='FILE',
+                    help='results file to compare against; exits with status 1 on a regression')
+parser.add_argument('-t', '--threshold', type=float, default=0.10,
+                    help='fraction games/sec may drop (or peak memory grow) before it is a regression (default 0.10)')
+
+
+def main() -> None:
+    """
+    Benchmarks each engine on every pairing of every experiment in
+    `EXPERIMENTS`, writes the results as JSON and, given a baseline, reports
+    every pairing and engine that regressed beyond the threshold.
+    """
+    args = parser.parse_args()
+
+    pool: list[type[Stratagem]] = STRATAGEMS if args.strats is None else resolve(args.strats)
+
+    results: list[dict] = list()
+    for engine in args.engines:
+        num_games: int = max(1, int(NUM_GAMES[engine] * args.scale))
+
+        for experiment in EXPERIMENTS:
+            for strat_one, strat_two in combinations_with_replacement(pool, 2):
+                result: dict = bench_pairing(engine, experiment, strat_one, strat_two, num_games, args.repeat)
+                results.append(result)
+                print(f'{engine:>5}  {experiment.num_blanks}B/{experiment.num_lives}L/{experiment.starting_health}HP  '
+                      f'{strat_one.__name__.lower():>12} vs {strat_two.__name__.lower():<12}  {result["games_per_sec"]:>12,.0f} games/s  '
+                      f'{result["ns_per_shot"]:>8,.0f} ns/shot  {result["peak_bytes"] / 1024:>8,.1f} KiB')
+
+    report: dict = {'version': RESULTS_VERSION,
+                    'created': datetime.fromtimestamp(time()).isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'machine': platform.machine(),
+                    'seed': SEED,
+                    'repeat': args.repeat,
+                    'engines': summarize(results),
+                    'results': results}
+
+    print()
+    for engine, summary in report['engines'].items():
+        print(f'{engine:>5}  {summary["games_per_sec"]:>12,.0f} games/s  {summary["ns_per_shot"]:>8,.0f} ns/shot  '
+              f'{summary["peak_bytes"] / 1024:>8,.1f} KiB peak')
+
+    out_path: Path = Path(args.output) if args.output else Path(f'{OUT_DIRECTORY}{datetime.fromtimestamp(time()).strftime("%Y-%m-%d-%H-%M")}.json')
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, 'w') as out_file:
+        json.dump(report, out_file, indent=2)
+    print(f'\nResults written to {out_path}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as in_file:
+            baseline: dict = json.load(in_file)
+
+        regressions: list[str] = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.baseline}:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print(f'\nNo regressions beyond {args.threshold:.0%} against {args.baseline}.')
+
+
+def bench_pairing(engine: str, experiment: Experiment, strat_one: type[Stratagem],
+                  strat_two: type[Stratagem], num_games: int, repeat: int) -> dict:
+    """
+    Times `num_games` games of one pairing on one engine.
+
+    Each of the `repeat` timed runs replays the same seeded games and the
+    fastest is kept. Peak memory is measured by one more run under
+    `tracemalloc`, which is left out of the timings since it slows every
+    allocation down.
+
+    :param str engine: `'batch'`, `'fast'` or `'match'` (see `trials.play_chunk`).
+    :returns dict: The pairing, the games and shots played, the fastest time
+    and the games/sec, ns/shot and peak bytes allocated.
+    """
+    seconds: float = float('inf')
+    for _ in range(repeat):
+        elapsed, shots = _play_games(engine, experiment, strat_one, strat_two, num_games)
+        seconds = min(seconds, elapsed)
+
+    tracemalloc.start()
+    _play_games(engine, experiment, strat_one, strat_two, num_games)
+    peak_bytes: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'engine': engine,
+            'blanks': experiment.num_blanks,
+            'lives': experiment.num_lives,
+            'health': experiment.starting_health,
+            'strat_one': strat_one.__name__.lower(),
+            'strat_two': strat_two.__name__.lower(),
+            'games': num_games,
+            'shots': shots,
+            'seconds': seconds,
+            'games_per_sec': num_games / seconds,
+            'ns_per_shot': seconds * 1e9 / shots,
+            'peak_bytes': peak_bytes}
+
+
+def _play_games(engine: str, experiment: Experiment, strat_one: type[Stratagem],
+                strat_two: type[Stratagem], num_games: int) -> tuple[float, int]:
+    """Plays `num_games` seeded games and returns the seconds they took and the shots fired."""
+    if engine == 'batch':
+        rng: np.random.Generator = np.random.default_rng(SEED)
+        start: float = perf_counter()
+        batch: BatchMatch = BatchMatch(experiment.num_blanks, experiment.num_lives, experiment.starting_health,
+                                       shared(strat_one), shared(strat_two), num_games, rng)
+        batch.play()
+        return perf_counter() - start, batch.shots_fired
+
+    rng: BlockRandom = BlockRandom(np.random.default_rng(SEED))
+    shots: int = 0
+
+    if engine == 'fast':
+        start: float = perf_counter()
+        reused_match: Match = Match(experiment.num_blanks, experiment.num_lives, experiment.starting_health, 
+                                    shared(strat_one), shared(strat_two), rng=rng)
+        for _ in range(num_games):
+            reused_match.reset()
+            reused_match.play_fast()
+            shots += reused_match.shots_fired
+        return perf_counter() - start, shots
+
+    start: float = perf_counter()
+    for _ in range(num_games):
+        new_match: Match = Match(experiment.num_blanks, experiment.num_lives, experiment.starting_health, 
+                                 shared(strat_one), shared(strat_two), rng=rng)
+        new_match.play()
+        shots += new_match.shots_fired
+    return perf_counter() - start, shots
+
+
+def summarize(results: list[dict]) -> dict[str, dict]:
+    """Returns each engine's totals over every pairing: games/sec, ns/shot and the largest peak memory."""
+    summaries: dict[str, dict] = dict()
+
+    for engine in dict.fromkeys(result['engine'] for result in results):
+        engine_results: list[dict] = [result for result in results if result['engine'] == engine]
+        seconds: float = sum(result['seconds'] for result in engine_results)
+        summaries[engine] = {'games': sum(result['games'] for result in engine_results),
+                             'shots': sum(result['shots'] for result in engine_results),
+                             'seconds': seconds,
+                             'games_per_sec': sum(result['games'] for result in engine_results) / seconds,
+                             'ns_per_shot': seconds * 1e9 / sum(result['shots'] for result in engine_results),
+                             'peak_bytes': max(result['peak_bytes'] for result in engine_results)}
+
+    return summaries
+
+
+def compare(baseline: dict, report: dict, threshold: float) -> list[str]:
+    """
+    Returns a description of every engine and pairing in both `baseline` and
+    `report` whose games/sec dropped, or whose peak memory grew, by more than
+    `threshold` (a fraction). Pairings only in one of them are skipped.
+    """
+    if baseline.get('version') != RESULTS_VERSION:
+        raise ValueError(f'Unsupported baseline version {baseline.get("version")}.')
+
+    regressions: list[str] = list()
+
+    def check(label: str, old: dict, new: dict) -> None:
+        if new['games_per_sec'] < old['games_per_sec'] * (1 - threshold):
+            regressions.append(f'{label}: {old["games_per_sec"]:,.0f} -> {new["games_per_sec"]:,.0f} games/s '
+                               f'({new["games_per_sec"] / old["games_per_sec"] - 1:+.1%})')
+        if new['peak_bytes'] > old['peak_bytes'] * (1 + threshold):
+            regressions.append(f'{label}: {old["peak_bytes"]:,} -> {new["peak_bytes"]:,} peak bytes '
+                               f'({new["peak_bytes"] / old["peak_bytes"] - 1:+.1%})')
+
+    for engine, summary in report['engines'].items():
+        if engine in baseline['engines']:
+            check(f'{engine} (all pairings)', baseline['engines'][engine], summary)
+
+    def result_key(result: dict) -> tuple:
+        return (result['engine'], result['blanks'], result['lives'], result['health'], result['strat_one'], result['strat_two'])
+
+    old_results: dict[tuple, dict] = {result_key(result): result for result in baseline['results']}
+    for result in report['results']:
+        if result_key(result) in old_results:
+            check(f'{result["engine"]} {result["blanks"]}B/{result["lives"]}L/{result["health"]}HP '
+                  f'{result["strat_one"]} vs {result["strat_two"]}', old_results[result_key(result)], result)
+
+    return regressions
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# cache.py
+#
+# Content-addressed on-disk cache of pairing results, so unchanged pairings 
+# are not played again.
+import json
+import os
+
+from functools import lru_cache
+from hashlib import sha256
+from inspect import getsource
+from pathlib import Path
+from stratagem import Stratagem
+
+# Where cached results are stored
+CACHE_DIRECTORY: str = './cache/'
+
+# Cached results are evicted, least recently used first, beyond this many bytes
+MAX_CACHE_BYTES: int = 64 * 1024 * 1024
+
+# Bump to invalidate every cached result (e.g. after changing the game rules)
+CACHE_VERSION: int = 3
+
+# Modules every result depends on (engines, compiled policies, the solver, random streams,
+# tallies and how chunks of trials are seeded and played); editing any of them invalidates 
+# every cached result
+ENGINE_MODULES: tuple[str, ...] = ('game', 'policy', 'optimal', 'rng', 'shells', 'outcomes', 'trials')
+
+
+@lru_cache(maxsize=None)
+def stratagem_digest(stratagem: type[Stratagem]) -> str:
+    """
+    Returns a hash of the source code of `stratagem`'s class and of every 
+    class it inherits from up to `Stratagem`, so editing a base class (e.g. 
+    the default `get_moves`) changes the digest of every stratagem built on it.
+    Reading sources is slow, so each class is only hashed once per process.
+    """
+    sources: list[str] = list()
+    for cls in stratagem.__mro__:
+        if not issubclass(cls, Stratagem):
+            continue
+        try:
+            sources.append(getsource(cls))
+        except (OSError, TypeError):
+            sources.append(f'{cls.__module__}.{cls.__qualname__}')
+
+    return sha256('\n'.join(sources).encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def engine_digest() -> str:
+    """Returns a hash of the source code of every module in `ENGINE_MODULES`."""
+    digest = sha256()
+    for module in ENGINE_MODULES:
+        digest.update((Path(__file__).parent / f'{module}.py').read_bytes())
+    return digest.hexdigest()
+
+
+def pairing_key(strat_one: type[Stratagem], strat_two: type[Stratagem], params: dict) -> str:
+    """
+    Returns the cache key of a pairing's result: a hash of both stratagems' 
+    source code, the engine modules' source code (see `engine_digest`) and 
+    `params`, which should hold everything else the result depends on 
+    (experiment parameters, trial count, chunk size, seed, engine).
+    """
+    contents: list = [CACHE_VERSION, engine_digest(), stratagem_digest(strat_one), stratagem_digest(strat_two), params]
+    return sha256(json.dumps(contents, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    A directory of JSON results named by their key. Reading a result marks it 
+    as recently used (by its modification time), and writing one evicts the 
+    least recently used results until the cache is back under three quarters 
+    of `max_bytes`, so eviction does not rescan the cache on every write.
+    """
+    def __init__(self, directory: str = CACHE_DIRECTORY, max_bytes: int = MAX_CACHE_BYTES) -> None:
+        self._directory: Path = Path(directory)
+        self._max_bytes: int = max_bytes
+        self._total_bytes: int | None = None
+
+
+    def _path(self, key: str) -> Path:
+        """Returns the path of the result with key `key`."""
+        return self._directory / key[:2] / f'{key}.json'
+
+
+    def get(self, key: str) -> dict | None:
+        """Returns the result with key `key`, or `None` if it is not cached."""
+        path: Path = self._path(key)
+        try:
+            with open(path, 'r') as in_file:
+                result: dict = json.load(in_file)
+        except (OSError, ValueError):
+            return None
+
+        os.utime(path)
+        return result
+
+
+    def put(self, key: str, result: dict) -> None:
+        """Caches `result` under key `key`."""
+        path: Path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Size of the result being replaced, if any, so overwriting it does not inflate the total
+        try:
+            replaced_bytes: int = path.stat().st_size
+        except OSError:
+            replaced_bytes = 0
+
+        # Write then rename, so readers never see a partial result
+        temp_path: Path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(temp_path, 'w') as out_file:
+            json.dump(result, out_file)
+        os.replace(temp_path, path)
+
+        if self._total_bytes is None:
+            self._total_bytes = sum(entry.stat().st_size for entry in self._directory.glob('*/*.json'))
+        else:
+            self._total_bytes += path.stat().st_size - replaced_bytes
+
+        if self._total_bytes > self._max_bytes:
+            self._evict()
+
+
+    def _evict(self) -> None:
+        """Removes least recently used results until the cache fits in its size bound."""
+        entries: list[tuple[float, int, Path]] = list()
+        for entry in self._directory.glob('*/*.json'):
+            stat: os.stat_result = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        entries.sort()
+        self._total_bytes = sum(size for _, size, _ in entries)
+
+        for _, size, entry in entries:
+            if self._total_bytes <= self._max_bytes * 3 // 4:
+                break
+            entry.unlink(missing_ok=True)
+            self._total_bytes -= size
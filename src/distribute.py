@@ -0,0 +1,316 @@
+# distribute.py
+#
+# Distributes the trials of gather_data across any number of worker processes
+# and machines through a shared directory of jobs.
+import argparse
+import json
+import os
+import socket
+import threading
+
+from cache import stratagem_digest
+from collections import defaultdict
+from datetime import datetime
+from gather_data import CHUNK_SIZE, EXPERIMENTS, NUM_TRIALS, OUT_DIRECTORY, SEED, STRATAGEMS
+from itertools import combinations_with_replacement
+from multiprocessing import Process
+from outcomes import OutcomeTally
+from pathlib import Path
+from results import write_experiments
+from stratagem import Stratagem, lookup
+from time import sleep, time
+from trials import Experiment, TrialChunk, make_chunks, play_chunk, root_seed
+
+# Name of the file describing a manifest's experiments, stratagems and settings
+MANIFEST_NAME: str = 'manifest.json'
+
+# Bump when the layout of manifests changes
+MANIFEST_VERSION: int = 1
+
+# Subdirectories holding jobs waiting to be played, jobs being played, and results
+PENDING: str = 'pending'
+CLAIMED: str = 'claimed'
+RESULTS: str = 'results'
+
+# Seconds without a heartbeat after which a claimed job is taken back
+STALE_SECONDS: float = 300.0
+
+# Seconds an idle worker waits before looking for jobs again
+POLL_SECONDS: float = 2.0
+
+parser = argparse.ArgumentParser(
+    prog="DistributeBuckshotData",
+    description="Splits gather_data's experiments into jobs in a shared directory, plays them on any number of "
+                "workers on any machines sharing it, and merges their results."
+)
+commands = parser.add_subparsers(dest='command', required=True)
+
+create_parser = commands.add_parser('create', help='write a manifest of every job to DIRECTORY')
+create_parser.add_argument('directory', help='directory to write the manifest to (must not hold one already)')
+create_parser.add_argument('-t', '--trials', type=int, default=NUM_TRIALS, help=f'trials per pairing (default {NUM_TRIALS})')
+create_parser.add_argument('-e', '--engine', choices=('batch', 'fast', 'match'), default='batch',
+                           help='simulator the workers play trials on (default batch)')
+create_parser.add_argument('--shells', choices=('independent', 'common', 'antithetic'), default='independent',
+                           help='how shell sequences are shared between pairings (default independent)')
+create_parser.add_argument('--seed', type=int, help='root seed of every random stream (default SEED in gather_data.py)')
+
+work_parser = commands.add_parser('work', help='play jobs of the manifest in DIRECTORY until none are left')
+work_parser.add_argument('directory', help='directory holding the manifest')
+work_parser.add_argument('-j', '--workers', type=int, default=1, help='number of worker processes to start (default 1)')
+work_parser.add_argument('--stale', type=float, default=STALE_SECONDS,
+                         help=f'seconds without a heartbeat before another worker\'s job is taken back (default {STALE_SECONDS:g}); '
+                              'must exceed the clock skew between machines')
+
+status_parser = commands.add_parser('status', help='count the jobs of the manifest in DIRECTORY')
+status_parser.add_argument('directory', help='directory holding the manifest')
+
+merge_parser = commands.add_parser('merge', help='merge the results in DIRECTORY into experiment files')
+merge_parser.add_argument('directory', help='directory holding the manifest')
+merge_parser.add_argument('-o', '--output', metavar='FOLDER',
+                          help='folder to write to (default ./data/[year-month-day]/[hours-minutes])')
+merge_parser.add_argument('-f', '--format', choices=('both', 'binary', 'json'), default='both',
+                          help='write results as a binary store, JSON experiment files, or both (default)')
+
+
+def main() -> None:
+    """
+    Runs one of the `create`, `work`, `status` or `merge` commands.
+
+    `create` splits `NUM_TRIALS` trials of every pairing of every experiment in
+    `EXPERIMENTS` into the same seeded chunks `gather_data` plays, and writes
+    each as a job file. Any number of `work` commands, on any machines sharing
+    the directory, then claim and play jobs until none are left. Once every
+    job has a result, `merge` writes the same output as `gather_data` would
+    have with the same seed, engine and shells.
+    """
+    args = parser.parse_args()
+    directory: Path = Path(args.directory)
+
+    if args.command == 'create':
+        num_jobs: int = create_manifest(directory, args.trials, args.engine, args.shells, root_seed(args.seed, SEED))
+        print(f'Wrote {num_jobs} jobs to "{directory}"')
+    elif args.command == 'work':
+        workers: list[Process] = [Process(target=work, args=(directory, args.stale)) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    elif args.command == 'status':
+        counts: dict[str, int] = job_counts(directory)
+        print(', '.join(f'{count} {name}' for name, count in counts.items()))
+    else:
+        folder: Path = Path(args.output) if args.output else \
+                       Path(f'{OUT_DIRECTORY}{datetime.fromtimestamp(time()).strftime("%Y-%m-%d/%H-%M")}')
+        merge_results(directory, folder, args.format)
+        print(f'Merged results into "{folder}"')
+
+
+def create_manifest(directory: Path, num_trials: int, engine: str, shells: str, seed: int) -> int:
+    """
+    Writes the manifest of every job to `directory`: one job per chunk of
+    `trials.make_chunks`, named `[experiment #]-[pairing #]-[chunk #]`.
+
+    :returns: The number of jobs written.
+    """
+    if (directory / MANIFEST_NAME).exists():
+        raise FileExistsError(f'"{directory}" already holds a manifest.')
+
+    match_pairs: list[tuple[type[Stratagem], type[Stratagem]]] = list(combinations_with_replacement(STRATAGEMS, 2))
+    pairings: list[tuple[int, int]] = [(exp_num, pair_num) for exp_num in range(len(EXPERIMENTS)) for pair_num in range(len(match_pairs))]
+    chunks: list[TrialChunk] = make_chunks(EXPERIMENTS, match_pairs, pairings, num_trials, CHUNK_SIZE, engine, seed, shells)
+
+    for name in (PENDING, CLAIMED, RESULTS):
+        (directory / name).mkdir(parents=True, exist_ok=True)
+
+    for chunk in chunks:
+        job: dict = {'exp_num': chunk.exp_num, 'pair_num': chunk.pair_num, 'num_trials': chunk.num_trials,
+                     'seed': chunk.seed, 'first_trial': chunk.first_trial, 'shell_seed': chunk.shell_seed,
+                     'antithetic': chunk.antithetic}
+        _write_json(directory / PENDING / f'{_job_name(chunk)}.json', job)
+
+    _write_json(directory / MANIFEST_NAME, {
+        'version': MANIFEST_VERSION,
+        'experiments': [{'num_blanks': experiment.num_blanks, 'num_lives': experiment.num_lives,
+                         'starting_health': experiment.starting_health} for experiment in EXPERIMENTS],
+        'strats': [stratagem.__name__.lower() for stratagem in STRATAGEMS],
+        'sources': {stratagem.__name__.lower(): stratagem_digest(stratagem) for stratagem in STRATAGEMS},
+        'trials': num_trials,
+        'engine': engine,
+        'shells': shells,
+        'seed': seed,
+        'jobs': len(chunks)})
+
+    return len(chunks)
+
+
+def work(directory: Path, stale_seconds: float = STALE_SECONDS) -> None:
+    """
+    Claims and plays jobs from the manifest in `directory` until every job
+    has a result.
+
+    A job is claimed by renaming it from `pending/` into `claimed/` under this
+    worker's name, which only one worker can do. While it plays, a thread
+    touches the claimed file every quarter of `stale_seconds` as a heartbeat.
+    Its result is written to `results/` (through a temporary file and a
+    rename, so a result is never read half-written) before the claim is
+    removed. Claims whose heartbeat is older than `stale_seconds` belong to
+    dead workers, and are renamed back into `pending/` by whichever worker
+    notices first. A job played twice gives the same result both times, as
+    it is seeded.
+    """
+    manifest: dict = _read_manifest(directory)
+    experiments: list[Experiment] = [Experiment(**experiment) for experiment in manifest['experiments']]
+    match_pairs: list[tuple[type[Stratagem], type[Stratagem]]] = list(combinations_with_replacement(_manifest_stratagems(manifest), 2))
+    worker_name: str = f'{socket.gethostname()}-{os.getpid()}'
+
+    while True:
+        _reclaim_stale(directory, stale_seconds)
+        claimed: Path | None = _claim(directory, worker_name)
+
+        if claimed is None:
+            if not any((directory / PENDING).iterdir()) and not any((directory / CLAIMED).iterdir()):
+                return
+            sleep(POLL_SECONDS)
+            continue
+
+        job_name: str = claimed.name.split('.')[0]
+        result_path: Path = directory / RESULTS / f'{job_name}.json'
+        if not result_path.exists():
+            with open(claimed, 'r') as in_file:
+                job: dict = json.load(in_file)
+
+            strat_one, strat_two = match_pairs[job['pair_num']]
+            chunk: TrialChunk = TrialChunk(job['exp_num'], job['pair_num'], experiments[job['exp_num']], strat_one, strat_two,
+                                           job['num_trials'], manifest['engine'], job['seed'], job['first_trial'],
+                                           job['shell_seed'], job['antithetic'])
+
+            finished: threading.Event = threading.Event()
+            heartbeat: threading.Thread = threading.Thread(target=_heartbeat, args=(claimed, stale_seconds / 4, finished), daemon=True)
+            heartbeat.start()
+            try:
+                _, wins, tally = play_chunk(chunk)
+            finally:
+                finished.set()
+                heartbeat.join()
+
+            _write_json(result_path, {'exp_num': job['exp_num'], 'pair_num': job['pair_num'], 'trials': job['num_trials'],
+                                      'wins': wins, 'outcomes': tally.to_dict(), 'worker': worker_name})
+
+        claimed.unlink(missing_ok=True)
+
+
+def job_counts(directory: Path) -> dict[str, int]:
+    """Returns the number of jobs of the manifest in `directory` that are pending, claimed and done."""
+    return {name: sum(1 for _ in (directory / name).glob('*.json')) for name in (PENDING, CLAIMED, RESULTS)}
+
+
+def merge_results(directory: Path, folder: Path, out_format: str = 'both') -> None:
+    """
+    Sums the results of every job in `directory` per pairing, and writes
+    them to `folder` exactly like `gather_data` does.
+    """
+    manifest: dict = _read_manifest(directory)
+    stratagems: list[type[Stratagem]] = _manifest_stratagems(manifest)
+    if stratagems != STRATAGEMS:
+        raise ValueError('The manifest was created for a different set of stratagems.')
+
+    result_paths: list[Path] = sorted((directory / RESULTS).glob('*.json'))
+    if len(result_paths) < manifest['jobs']:
+        raise RuntimeError(f'Only {len(result_paths)} of {manifest["jobs"]} jobs have results; run more workers first.')
+
+    experiments: list[Experiment] = [Experiment(**experiment) for experiment in manifest['experiments']]
+    match_pairs: list[tuple[type[Stratagem], type[Stratagem]]] = list(combinations_with_replacement(stratagems, 2))
+    pairings: list[tuple[int, int]] = [(exp_num, pair_num) for exp_num in range(len(experiments)) for pair_num in range(len(match_pairs))]
+
+    wins: dict[tuple[int, int], int] = defaultdict(int)
+    trials: dict[tuple[int, int], int] = defaultdict(int)
+    outcomes: dict[tuple[int, int], OutcomeTally] = {key: OutcomeTally(experiments[key[0]].starting_health) for key in pairings}
+    for path in result_paths:
+        with open(path, 'r') as in_file:
+            result: dict = json.load(in_file)
+        key: tuple[int, int] = (result['exp_num'], result['pair_num'])
+        wins[key] += result['wins']
+        trials[key] += result['trials']
+        outcomes[key].merge(OutcomeTally.from_dict(result['outcomes'], experiments[key[0]].starting_health))
+
+    win_percentages: dict[tuple[int, int], float] = {key: wins[key] / trials[key] for key in pairings}
+
+    folder.mkdir(parents=True, exist_ok=True)
+    write_experiments(folder, experiments, stratagems, match_pairs, pairings, win_percentages, wins, trials, outcomes, dict(),
+                      manifest['trials'], manifest['seed'], shells=manifest['shells'], file_format=out_format)
+
+
+def _job_name(chunk: TrialChunk) -> str:
+    """Returns the name of the job playing `chunk`."""
+    return f'{chunk.exp_num:03d}-{chunk.pair_num:04d}-{chunk.first_trial // CHUNK_SIZE:04d}'
+
+
+def _read_manifest(directory: Path) -> dict:
+    """Reads the manifest in `directory`, checking its version."""
+    with open(directory / MANIFEST_NAME, 'r') as in_file:
+        manifest: dict = json.load(in_file)
+    if manifest['version'] != MANIFEST_VERSION:
+        raise ValueError(f'Unsupported manifest version {manifest["version"]} in "{directory}".')
+    return manifest
+
+
+def _manifest_stratagems(manifest: dict) -> list[type[Stratagem]]:
+    """
+    Returns the stratagems of `manifest` in order, checking that this
+    machine's source of each matches the source the manifest was created with.
+    """
+    for name in manifest['strats']:
+        if lookup(name) is None or stratagem_digest(lookup(name)) != manifest['sources'][name]:
+            raise ValueError(f'Stratagem "{name}" is missing or differs from the one the manifest was created with.')
+    return [lookup(name) for name in manifest['strats']]
+
+
+def _claim(directory: Path, worker_name: str) -> Path | None:
+    """
+    Claims the first pending job that no other worker claims first, and
+    returns the path of its claim, or `None` if there are no pending jobs.
+    """
+    for path in sorted((directory / PENDING).glob('*.json')):
+        claimed: Path = directory / CLAIMED / f'{path.stem}.{worker_name}.json'
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue
+
+        # The rename keeps the job's old modification time, so start its heartbeat now
+        os.utime(claimed)
+        return claimed
+
+    return None
+
+
+def _reclaim_stale(directory: Path, stale_seconds: float) -> None:
+    """Moves every claimed job whose heartbeat is older than `stale_seconds` back to pending."""
+    now: float = time()
+    for path in (directory / CLAIMED).glob('*.json'):
+        try:
+            if now - path.stat().st_mtime > stale_seconds:
+                os.rename(path, directory / PENDING / f'{path.name.split(".")[0]}.json')
+        except FileNotFoundError:
+            continue
+
+
+def _heartbeat(path: Path, interval: float, finished: threading.Event) -> None:
+    """Touches `path` every `interval` seconds until `finished` is set."""
+    while not finished.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+
+def _write_json(path: Path, contents: dict) -> None:
+    """Writes `contents` to `path` through a temporary file, so readers never see it half-written."""
+    temp_path: Path = path.with_name(f'.{path.name}.{socket.gethostname()}-{os.getpid()}.tmp')
+    with open(temp_path, 'w') as out_file:
+        json.dump(contents, out_file)
+    os.replace(temp_path, path)
+
+
+if __name__ == '__main__':
+    main()
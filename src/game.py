@@ -1,62 +1,252 @@
 # game.py
 #
 # Runs the game simulation and outputs the winner of two algorithms.
-from stratagem import Stratagem, Move, Outcome, GameState
-from random import shuffle
+import numpy as np
+
+from stratagem import Stratagem, Move, Outcome, GameState, shared
+from itertools import combinations
+from functools import lru_cache
+from math import comb
+from observer import MatchObserver
+from outcomes import OutcomeTally
+from policy import compile_policy, compile_policy_tuples, is_deterministic
+from rng import BlockRandom, default_random
+from shells import ShellStream
+from time import perf_counter_ns
+
+# Largest load BatchMatch can store as an int64 bitmask
+MAX_BATCH_LOAD: int = 62
+
+# Largest number of load arrangements BatchMatch will enumerate up front
+MAX_ARRANGEMENTS: int = 1 << 16
+
+# Integer codes of moves and outcomes, used by Match.play_fast. An outcome's 
+# code is always 2 * (move code) + (1 if the shell was live else 0).
+SHOOT_SELF: int = Move.SHOOT_SELF.value
+SHOOT_OPP: int = Move.SHOOT_OPP.value
+SHOOT_SELF_WITH_BLANK: int = Outcome.SHOOT_SELF_WITH_BLANK.value
+SHOOT_OPP_WITH_LIVE: int = Outcome.SHOOT_OPP_WITH_LIVE.value
 
 class Match:
-    """Represents a match between two players. Match completes when one player runs out of health."""
+    """
+    Represents a match between two players. Match completes when one player runs out of health.
+
+    The shotgun's load is stored as an integer bitmask (bit `i` set if the `i`th 
+    shell fired is live) with a cursor to the next shell. Call `reset` to play 
+    another game with the same players instead of building a new `Match`.
+    `shots_fired` and `reloads` count the shells fired and reloads since the 
+    last reset, and `first_blood` is `True` once player one has shot player 
+    two with a live shell first (`False` if player two did, `None` until then).
+
+    If given an `observer`, `play` reports every decision, shot, reload and 
+    result to it (see `observer.py`); without one, the hooks cost a single 
+    check per shot.
+
+    If given a `ShellStream`, loads are taken from it (for the trial number 
+    passed to `reset`) instead of shuffled, so that every pairing replaying 
+    the stream sees the same shells.
+
+    Shuffles and coin flips are drawn from `rng` (the process's shared 
+    `default_random()` if not given); seed it to replay the same games.
+
+    Stateless players move from their compiled policies. Stateful players 
+    (see `register`) are asked for every move through `get_move`, and are 
+    replaced by a fresh instance drawing from `rng` whenever the match is 
+    reset for another game.
+    """
     def __init__(self, num_blanks: int, num_live: int, 
                  starting_health: int,
                  player_one_strat: Stratagem, 
-                 player_two_strat: Stratagem) -> None:
-        self._state: GameState = GameState(num_blanks, num_live)
+                 player_two_strat: Stratagem,
+                 observer: MatchObserver | None = None,
+                 shells: ShellStream | None = None,
+                 rng: BlockRandom | None = None) -> None:
         self._p1: Stratagem = player_one_strat
         self._p2: Stratagem = player_two_strat
+        self._observer: MatchObserver | None = observer
+        self._stream: ShellStream | None = shells
+        self._rng: BlockRandom = rng if rng is not None else default_random()
 
-        self._p1_health: int = starting_health
-        self._p2_health: int = starting_health
-
+        self._starting_health: int = starting_health
         self._load: tuple[int, int] = (num_live, num_blanks)
+        self._arrangements: tuple[int, ...] | None = _load_arrangement_tuple(num_blanks, num_live)
+
+        # Compiled decisions, indexed by [blanks][lives][own health][opponent health] (None for stateful players)
+        self._p1_policy: tuple | None = None if player_one_strat.STATEFUL else \
+                                        compile_policy_tuples(type(player_one_strat), num_blanks, num_live, starting_health)
+        self._p2_policy: tuple | None = None if player_two_strat.STATEFUL else \
+                                        compile_policy_tuples(type(player_two_strat), num_blanks, num_live, starting_health)
 
-        self._shell_order: list[bool] = [True] * num_live + [False] * num_blanks
-        shuffle(self._shell_order)
+        self._state: GameState = GameState(num_blanks, num_live, load_blanks=num_blanks, 
+                                           load_lives=num_live, starting_health=starting_health)
+        self._games: int = 0
+        self.reset()
+
+
+    def reset(self, trial: int = 0) -> None:
+        """
+        Restores both players' health and loads a freshly shuffled shotgun.
+
+        :param int trial: The trial number whose loads to take from the 
+        `ShellStream`, if the match has one.
+        """
+        self._trial: int = trial
+        self._loads_drawn: int = 0
+        self._p1_health: int = self._starting_health
+        self._p2_health: int = self._starting_health
+        self.shots_fired: int = 0
+        self.reloads: int = 0
+        self.first_blood: bool | None = None
+        if self._games > 0 and self._p1_policy is None:
+            self._p1 = shared(type(self._p1), self._rng)
+        if self._games > 0 and self._p2_policy is None:
+            self._p2 = shared(type(self._p2), self._rng)
+        self._games += 1
+        self._reload()
+
+
+    def _shuffled_load(self) -> int:
+        """Returns a freshly shuffled load as a bitmask."""
+        if self._stream is not None:
+            self._loads_drawn += 1
+            return self._stream.load(self._trial, self._loads_drawn - 1)
+
+        if self._arrangements is not None:
+            return self._arrangements[self._rng.randrange(len(self._arrangements))]
+
+        shell_order: list[bool] = [True] * self._load[0] + [False] * self._load[1]
+        self._rng.shuffle(shell_order)
+        return sum(1 << i for i, is_live in enumerate(shell_order) if is_live)
 
 
     def _reload(self) -> None:
         """Reloads the shell order and shuffles."""
-        self._shell_order: list[bool] = [True] * self._load[0] + [False] * self._load[1]
-        shuffle(self._shell_order)
+        self._shells: int = self._shuffled_load()
+        self._cursor: int = 0
 
-        self._state = GameState(self._load[0], self._load[1])
+        self._state.blank_shells = self._load[1]
+        self._state.live_shells = self._load[0]
     
 
     def _get_outcome(self, move: Move) -> Outcome:
         """Get the outcome of a given move."""
-        shell_live: bool = self._shell_order.pop()
-
-        self._state.blank_shells -= 0 if shell_live else 1
-        self._state.live_shells -= 1 if shell_live else 0
-        
-        if shell_live and move == Move.SHOOT_SELF:
-            return Outcome.SHOOT_SELF_WITH_LIVE
-        if shell_live and move == Move.SHOOT_OPPO:
-            return Outcome.SHOOT_OPPO_WITH_LIVE
-        if not shell_live and move == Move.SHOOT_SELF:
-            return Outcome.SHOOT_SELF_WITH_BLANK
-        if not shell_live and move == Move.SHOOT_OPPO:
-            return Outcome.SHOOT_OPPO_WITH_BLANK
+        shell_live: int = (self._shells >> self._cursor) & 1
+        self._cursor += 1
+        self.shots_fired += 1
+
+        self._state.blank_shells -= 1 - shell_live
+        self._state.live_shells -= shell_live
+
+        return Outcome(2 * move.value + shell_live)
     
+    def _get_move(self, player1_turn: bool) -> Move:
+        """Get the move of the current player from their compiled policy, or from `get_move` if they are stateful."""
+        policy: tuple | None = self._p1_policy if player1_turn else self._p2_policy
+        if policy is None:
+            if player1_turn:
+                self._state.own_health, self._state.opp_health = self._p1_health, self._p2_health
+                return self._p1.get_move(self._state)
+            self._state.own_health, self._state.opp_health = self._p2_health, self._p1_health
+            return self._p2.get_move(self._state)
+
+        if player1_turn:
+            shoot_opp_prob: float = policy[self._state.blank_shells][self._state.live_shells][self._p1_health][self._p2_health]
+        else:
+            shoot_opp_prob: float = policy[self._state.blank_shells][self._state.live_shells][self._p2_health][self._p1_health]
+
+        if shoot_opp_prob == 1.0 or (shoot_opp_prob > 0.0 and self._rng.random() < shoot_opp_prob):
+            return Move.SHOOT_OPP
+        return Move.SHOOT_SELF
+
+
     def _print_load(self) -> None:
         """Prints the current load of the shotgun for debug purposes."""
-        for is_live in self._shell_order[::-1]:
-            if is_live:
+        for i in range(self._cursor, self._load[0] + self._load[1]):
+            if (self._shells >> i) & 1:
                 print('\x1b[31mL\x1b[0m', end='')
             else:
                 print('\x1b[34mB\x1b[0m', end='')
         print()
     
 
+    def play_fast(self) -> bool:
+        """
+        Runs the simulation without any output and outputs the result. 
+
+        Plays the same game as `play`, but keeps the state in local variables 
+        and codes moves and outcomes as integers (see `SHOOT_OPP` and 
+        `SHOOT_SELF_WITH_BLANK`) rather than building `Move` and `Outcome` enums
+        on every shot.
+
+        Stateful players cannot be looked up in a policy, so their games are 
+        played by `play` instead.
+
+        :returns bool: Returns `True` if player one wins, `False` if player two wins.
+        """
+        if self._p1_policy is None or self._p2_policy is None:
+            return self.play()
+
+        p1_policy: tuple = self._p1_policy
+        p2_policy: tuple = self._p2_policy
+        random = self._rng.random
+        num_live, num_blanks = self._load
+        load_size: int = num_live + num_blanks
+
+        p1_health: int = self._p1_health
+        p2_health: int = self._p2_health
+        blanks: int = self._state.blank_shells
+        lives: int = self._state.live_shells
+        shells: int = self._shells
+        cursor: int = self._cursor
+        start_cursor: int = cursor
+        reloads: int = 0
+        first_blood: bool | None = self.first_blood
+        player1_turn: bool = True
+
+        while p1_health > 0 and p2_health > 0:
+            # If shotgun empty, reload
+            if cursor == load_size:
+                shells = self._shuffled_load()
+                cursor = 0
+                blanks, lives = num_blanks, num_live
+                reloads += 1
+
+            if player1_turn:
+                shoot_opp_prob: float = p1_policy[blanks][lives][p1_health][p2_health]
+            else:
+                shoot_opp_prob: float = p2_policy[blanks][lives][p2_health][p1_health]
+            move: int = SHOOT_OPP if shoot_opp_prob == 1.0 or (shoot_opp_prob > 0.0 and random() < shoot_opp_prob) else SHOOT_SELF
+
+            shell_live: int = (shells >> cursor) & 1
+            cursor += 1
+            outcome: int = 2 * move + shell_live
+
+            if shell_live:
+                lives -= 1
+                # Player one is hurt by shooting self on their turn or being shot on player two's
+                if (outcome == SHOOT_OPP_WITH_LIVE) != player1_turn:
+                    p1_health -= 1
+                else:
+                    p2_health -= 1
+                if first_blood is None and outcome == SHOOT_OPP_WITH_LIVE:
+                    first_blood = player1_turn
+            else:
+                blanks -= 1
+
+            # If didn't shoot self with blank, change turns
+            if outcome != SHOOT_SELF_WITH_BLANK:
+                player1_turn = not player1_turn
+
+        self._p1_health, self._p2_health = p1_health, p2_health
+        self._state.blank_shells, self._state.live_shells = blanks, lives
+        self._shells, self._cursor = shells, cursor
+        self.shots_fired += reloads * load_size + cursor - start_cursor
+        self.reloads += reloads
+        self.first_blood = first_blood
+
+        return p1_health > 0
+
+
     def play(self, visual: bool = False, pause: bool = False) -> bool:
         """
         Runs the simulation and outputs the result.
@@ -66,14 +256,22 @@ class Match:
         :returns bool: Returns `True` if player one wins, `False` if player two wins.
         """
         player1_turn: bool = True
+        observer: MatchObserver | None = self._observer
+
+        if observer is not None:
+            observer.on_load(self._shells)
 
         if visual:
             print(f'\x1b[1m\x1b[32mSTARTING NEW GAME\x1b[0m: \x1b[31m{self._p1.__class__.__name__}\x1b[0m VS \x1b[34m{self._p2.__class__.__name__}\x1b[0m')
     
         while self._p1_health > 0 and self._p2_health > 0:
             # If shotgun empty, reload
-            if (len(self._shell_order) == 0):
+            if self._cursor == self._load[0] + self._load[1]:
                 self._reload()
+                self.reloads += 1
+                if observer is not None:
+                    observer.on_reload()
+                    observer.on_load(self._shells)
 
             if visual:
                 if player1_turn:
@@ -81,12 +279,22 @@ class Match:
                 else: 
                     print(f'===== \x1b[34mPlayer Two [{self._p2.__class__.__name__}] Turn\x1b[0m =====')
 
+                if player1_turn:
+                    self._state.own_health, self._state.opp_health = self._p1_health, self._p2_health
+                else:
+                    self._state.own_health, self._state.opp_health = self._p2_health, self._p1_health
                 print(self._state)
                 print('Current Load: ', end='')
                 self._print_load()
 
-            current_player: Stratagem = self._p1 if player1_turn else self._p2
-            outcome: Outcome = self._get_outcome(current_player.get_move(self._state))
+            if observer is None:
+                outcome: Outcome = self._get_outcome(self._get_move(player1_turn))
+            else:
+                start: int = perf_counter_ns()
+                move: Move = self._get_move(player1_turn)
+                observer.on_decision(player1_turn, perf_counter_ns() - start)
+                outcome: Outcome = self._get_outcome(move)
+                observer.on_shot(player1_turn, move, outcome)
 
             # Hurt player that shot self
             if outcome == Outcome.SHOOT_SELF_WITH_LIVE and player1_turn:
@@ -95,11 +303,14 @@ class Match:
                 self._p2_health -= 1
 
             # Hurt opponent shot
-            elif outcome == Outcome.SHOOT_OPPO_WITH_LIVE and player1_turn:
+            elif outcome == Outcome.SHOOT_OPP_WITH_LIVE and player1_turn:
                 self._p2_health -= 1
-            elif outcome == Outcome.SHOOT_OPPO_WITH_LIVE and not player1_turn:
+            elif outcome == Outcome.SHOOT_OPP_WITH_LIVE and not player1_turn:
                 self._p1_health -= 1
 
+            if self.first_blood is None and outcome == Outcome.SHOOT_OPP_WITH_LIVE:
+                self.first_blood = player1_turn
+
             if visual:
                 print(f'Player chooses: {outcome.name}')
                 print(f'\x1b[31mP1\x1b[0m Health: ' + 'X︎' * self._p1_health)
@@ -121,4 +332,266 @@ class Match:
             else:
                 print(f'\x1b[1m\x1b[34mPlayer Two ({self._p2.__class__.__name__}) Wins!\x1b[0m')
 
-        return self._p1_health > 0
\ No newline at end of file
+        if observer is not None:
+            observer.on_game_end(self._p1_health > 0)
+
+        return self._p1_health > 0
+
+
+    def record(self, tally: OutcomeTally) -> None:
+        """Counts the outcome of the game just played in `tally`."""
+        tally.add_game(self._p1_health, self._p2_health, self.shots_fired, self.reloads, self.first_blood)
+
+
+class BatchMatch:
+    """
+    Represents `num_games` independent matches between the same two players, 
+    stored as NumPy arrays and played in lockstep. Every step fires one shell 
+    in each unfinished game; finished games are dropped from the active set.
+
+    Each load is stored as an integer bitmask (bit `i` set if the `i`th shell 
+    is live) with a per-game cursor, so loads are limited to 62 shells.
+    After `play`, `shots_fired` holds the shells fired across every game.
+
+    If given a `ShellStream`, game `i` takes its loads from trial 
+    `first_trial + i` of the stream instead of shuffling them.
+    """
+    def __init__(self, num_blanks: int, num_live: int,
+                 starting_health: int,
+                 player_one_strat: Stratagem,
+                 player_two_strat: Stratagem,
+                 num_games: int,
+                 rng: np.random.Generator | None = None,
+                 shells: ShellStream | None = None,
+                 first_trial: int = 0) -> None:
+        if num_blanks + num_live > MAX_BATCH_LOAD:
+            raise ValueError(f'BatchMatch supports at most {MAX_BATCH_LOAD} shells per load.')
+
+        self._num_blanks: int = num_blanks
+        self._num_live: int = num_live
+        self._starting_health: int = starting_health
+        self._num_games: int = num_games
+        self._rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+        self._stream: ShellStream | None = shells
+        self._first_trial: int = first_trial
+
+        # Probability of shooting the opponent, indexed by [p1 turn, blanks, lives, own health, opponent health]
+        self._tables: np.ndarray = np.stack([
+            compile_policy(type(player_two_strat), num_blanks, num_live, starting_health),
+            compile_policy(type(player_one_strat), num_blanks, num_live, starting_health),
+        ])
+        self._deterministic: bool = is_deterministic(self._tables)
+        self._arrangements: np.ndarray | None = _load_arrangements(num_blanks, num_live)
+        self.shots_fired: int = 0
+
+
+    def _shuffled_loads(self, count: int) -> np.ndarray:
+        """Returns `count` freshly shuffled loads as bitmasks."""
+        if self._arrangements is not None:
+            return self._arrangements[self._rng.integers(0, self._arrangements.size, count)]
+
+        load_size: int = self._num_blanks + self._num_live
+        live: np.ndarray = np.argsort(self._rng.random((count, load_size)), axis=1) < self._num_live
+        return live @ (np.int64(1) << np.arange(load_size, dtype=np.int64))
+
+
+    def play(self, tally: OutcomeTally | None = None) -> np.ndarray:
+        """
+        Runs every simulation and outputs the results.
+
+        :param OutcomeTally tally: If given, the outcome of every game is 
+        counted in it as the game finishes.
+        :returns np.ndarray: Boolean array of length `num_games`, `True` where 
+        player one won.
+        """
+        load_size: int = self._num_blanks + self._num_live
+        n: int = self._num_games
+        flat_tables: np.ndarray = self._tables.ravel()
+        turn_stride, blank_stride, live_stride, health_stride, _ = (stride // self._tables.itemsize for stride in self._tables.strides)
+
+        p1_wins: np.ndarray = np.zeros(n, dtype=bool)
+        game_ids: np.ndarray = np.arange(n)
+        p1_health: np.ndarray = np.full(n, self._starting_health, dtype=np.int32)
+        p2_health: np.ndarray = np.full(n, self._starting_health, dtype=np.int32)
+        blanks: np.ndarray = np.zeros(n, dtype=np.int8)
+        lives: np.ndarray = np.zeros(n, dtype=np.int8)
+        shells: np.ndarray = np.zeros(n, dtype=np.int64)
+        cursor: np.ndarray = np.full(n, load_size, dtype=np.int8)
+        p1_turn: np.ndarray = np.ones(n, dtype=bool)
+        self.shots_fired = 0
+
+        # Loads (including the first), only tracked for `tally` or the shell stream, and 
+        # first blood (1 for player one, 2 for player two), only tracked for `tally`
+        track_loads: bool = tally is not None or self._stream is not None
+        loads: np.ndarray = np.zeros(n if track_loads else 0, dtype=np.int32)
+        first_blood: np.ndarray = np.zeros(n if tally is not None else 0, dtype=np.int8)
+
+        while game_ids.size > 0:
+            # If shotgun empty, reload
+            empty: np.ndarray = cursor == load_size
+            num_empty: int = int(np.count_nonzero(empty))
+            if num_empty > 0:
+                if self._stream is not None:
+                    shells[empty] = self._stream.loads(game_ids[empty] + self._first_trial, loads[empty])
+                else:
+                    shells[empty] = self._shuffled_loads(num_empty)
+                cursor[empty] = 0
+                blanks[empty] = self._num_blanks
+                lives[empty] = self._num_live
+                if track_loads:
+                    loads[empty] += 1
+
+            live: np.ndarray = ((shells >> cursor) & 1).astype(bool)
+            own_health: np.ndarray = np.where(p1_turn, p1_health, p2_health)
+            opp_health: np.ndarray = np.where(p1_turn, p2_health, p1_health)
+            shoot_opp_prob: np.ndarray = flat_tables[p1_turn * turn_stride + blanks.astype(np.intp) * blank_stride 
+                                                     + lives.astype(np.intp) * live_stride + own_health * health_stride + opp_health]
+            if self._deterministic:
+                shoot_opp: np.ndarray = shoot_opp_prob == 1.0
+            else:
+                shoot_opp: np.ndarray = self._rng.random(game_ids.size) < shoot_opp_prob
+
+            lives -= live
+            blanks -= ~live
+            cursor += 1
+            self.shots_fired += game_ids.size
+
+            # Player one is hurt by shooting self on their turn or being shot on player two's
+            p1_health -= live & (p1_turn != shoot_opp)
+            p2_health -= live & (p1_turn == shoot_opp)
+
+            if tally is not None:
+                first_blood = np.where((first_blood == 0) & live & shoot_opp, np.where(p1_turn, 1, 2), first_blood).astype(np.int8)
+
+            # If didn't shoot self with blank, change turns
+            p1_turn ^= live | shoot_opp
+
+            finished: np.ndarray = (p1_health <= 0) | (p2_health <= 0)
+            if finished.any():
+                p1_wins[game_ids[finished]] = p1_health[finished] > 0
+                if tally is not None:
+                    tally.add_games(p1_health[finished], p2_health[finished], 
+                                    (loads[finished] - 1) * load_size + cursor[finished],
+                                    loads[finished] - 1, first_blood[finished])
+                    first_blood = first_blood[~finished]
+                if track_loads:
+                    loads = loads[~finished]
+
+                keep: np.ndarray = ~finished
+                game_ids = game_ids[keep]
+                p1_health = p1_health[keep]
+                p2_health = p2_health[keep]
+                blanks = blanks[keep]
+                lives = lives[keep]
+                shells = shells[keep]
+                cursor = cursor[keep]
+                p1_turn = p1_turn[keep]
+
+        return p1_wins
+
+
+class ExactMatch:
+    """
+    Computes the exact probability that player one wins a match between two 
+    players, by dynamic programming over every (turn, blanks left, lives left, 
+    player one health, player two health) state instead of sampling games.
+
+    Mixed stratagems are weighted by their compiled policies, so the 
+    players must not keep any state of their own between moves.
+    """
+    def __init__(self, num_blanks: int, num_live: int,
+                 starting_health: int,
+                 player_one_strat: Stratagem,
+                 player_two_strat: Stratagem) -> None:
+        if num_live < 1:
+            raise ValueError('ExactMatch requires at least one live shell per load.')
+
+        self._num_blanks: int = num_blanks
+        self._num_live: int = num_live
+        self._starting_health: int = starting_health
+
+        # Probability of shooting the opponent, indexed by [p1 turn, blanks, lives, own health, opponent health]
+        self._tables: np.ndarray = np.stack([
+            compile_policy(type(player_two_strat), num_blanks, num_live, starting_health),
+            compile_policy(type(player_one_strat), num_blanks, num_live, starting_health),
+        ])
+
+
+    def win_probabilities(self) -> np.ndarray:
+        """
+        Returns the probability of player one winning from every state, indexed 
+        by [p1 turn, blanks left, lives left, p1 health, p2 health].
+
+        States are solved in order of total health, then with live shells left 
+        before without, then by blanks left; every transition (including the 
+        reload from an empty shotgun) only reaches states solved earlier.
+        """
+        num_blanks, num_live, health = self._num_blanks, self._num_live, self._starting_health
+        values: np.ndarray = np.zeros((2, num_blanks + 1, num_live + 1, health + 1, health + 1))
+        values[:, :, :, 1:, 0] = 1.0
+
+        for total_health in range(2, 2 * health + 1):
+            for p1_health in range(max(1, total_health - health), min(health, total_health - 1) + 1):
+                p2_health: int = total_health - p1_health
+                state_order: list[tuple[int, int]] = \
+                    [(blanks, lives) for lives in range(1, num_live + 1) for blanks in range(num_blanks + 1)] + \
+                    [(blanks, 0) for blanks in range(num_blanks + 1)]
+
+                for blanks, lives in state_order:
+                    # If shotgun empty, reload
+                    if blanks + lives == 0:
+                        values[:, 0, 0, p1_health, p2_health] = values[:, num_blanks, num_live, p1_health, p2_health]
+                        continue
+
+                    live_prob: float = lives / (blanks + lives)
+                    for p1_turn in (0, 1):
+                        own_health, opp_health = (p1_health, p2_health) if p1_turn else (p2_health, p1_health)
+                        shoot_opp: float = self._tables[p1_turn, blanks, lives, own_health, opp_health]
+                        value: float = 0.0
+
+                        if lives > 0:
+                            p1_shot: float = values[1 - p1_turn, blanks, lives - 1, p1_health - 1, p2_health]
+                            p2_shot: float = values[1 - p1_turn, blanks, lives - 1, p1_health, p2_health - 1]
+                            opp_shot, self_shot = (p2_shot, p1_shot) if p1_turn else (p1_shot, p2_shot)
+                            value += live_prob * (shoot_opp * opp_shot + (1 - shoot_opp) * self_shot)
+
+                        if blanks > 0:
+                            # Shooting self with a blank keeps the turn
+                            opp_blank: float = values[1 - p1_turn, blanks - 1, lives, p1_health, p2_health]
+                            self_blank: float = values[p1_turn, blanks - 1, lives, p1_health, p2_health]
+                            value += (1 - live_prob) * (shoot_opp * opp_blank + (1 - shoot_opp) * self_blank)
+
+                        values[p1_turn, blanks, lives, p1_health, p2_health] = value
+
+        return values
+
+
+    def win_probability(self) -> float:
+        """
+        Solves the match and outputs the result.
+
+        :returns float: The probability that player one wins from the start of 
+        the match (full load, full health, player one's turn).
+        """
+        values: np.ndarray = self.win_probabilities()
+        return float(values[1, self._num_blanks, self._num_live, self._starting_health, self._starting_health])
+
+
+def _load_arrangements(num_blanks: int, num_live: int) -> np.ndarray | None:
+    """
+    Returns every distinct arrangement of a load as a bitmask, so a shuffle is 
+    a single uniform draw. Returns `None` if there are too many to enumerate.
+    """
+    if comb(num_blanks + num_live, num_live) > MAX_ARRANGEMENTS:
+        return None
+
+    return np.array([sum(1 << i for i in live_positions)
+                     for live_positions in combinations(range(num_blanks + num_live), num_live)],
+                    dtype=np.int64)
+
+
+@lru_cache(maxsize=None)
+def _load_arrangement_tuple(num_blanks: int, num_live: int) -> tuple[int, ...] | None:
+    """Returns `_load_arrangements` as a tuple of Python ints, for scalar draws."""
+    arrangements: np.ndarray | None = _load_arrangements(num_blanks, num_live)
+    return None if arrangements is None else tuple(arrangements.tolist())
@@ -0,0 +1,245 @@
+# gamelog.py
+#
+# Compact binary logs of played games, appended as games finish and indexed
+# so any game can be read back without scanning the ones before it.
+import os
+import struct
+
+from dataclasses import dataclass
+from observer import MatchObserver
+from pathlib import Path
+from stratagem import Move, Outcome
+
+# First bytes of every game log
+MAGIC: bytes = b'BRGL'
+
+# Bump when the layout of game logs changes
+LOG_VERSION: int = 1
+
+# Log header: magic, version, blanks, lives, starting health
+HEADER_FORMAT: struct.Struct = struct.Struct('<4sBBBB')
+
+# Game record header: shots, loads, flags (bit 0 set if player one won)
+RECORD_FORMAT: struct.Struct = struct.Struct('<HHB')
+
+# Index entry: offset of a game record in the log
+INDEX_FORMAT: struct.Struct = struct.Struct('<Q')
+
+
+@dataclass
+class GameRecord:
+    """One logged game: every load as a bitmask, and every shot's outcome."""
+    loads: list[int]
+    outcomes: list[Outcome]
+    player_one_won: bool
+
+
+def index_path(path: Path) -> Path:
+    """Returns the path of the index of the game log at `path`."""
+    return path.with_name(path.name + '.idx')
+
+
+class GameLogWriter(MatchObserver):
+    """
+    Observes a `Match` and appends every game it plays to a binary log.
+
+    A log starts with a header (load, starting health and both players'
+    names), followed by one record per game: a `RECORD_FORMAT` header, each
+    load as a little-endian bitmask (bit `i` set if the `i`th shell fired is
+    live), then every shot's outcome code packed two bits per shot. A shot's
+    move and shell are both recovered from its outcome, so a game of `n` shots
+    and `k` loads takes `5 + k * ceil(load size / 8) + ceil(n / 4)` bytes.
+
+    The offset of every record is appended to a separate index file, so game
+    `K` is found with two seeks. A record is flushed to the log before its
+    index entry is written, so an interrupted writer can leave a game out of
+    the index but never index a game that is not in the log. Opening an
+    existing log appends to it, as long as it was written for the same load,
+    health and players, after dropping any index entries that point at or
+    past the end of the log. If the log's index is missing, it is rebuilt
+    from the log's records first (see `rebuild_index`).
+    """
+    def __init__(self, path: Path, num_blanks: int, num_live: int, starting_health: int,
+                 player_one_name: str, player_two_name: str) -> None:
+        path = Path(path)
+        header: bytes = HEADER_FORMAT.pack(MAGIC, LOG_VERSION, num_blanks, num_live, starting_health) \
+                        + _pack_name(player_one_name) + _pack_name(player_two_name)
+
+        if path.is_file() and path.stat().st_size > 0:
+            with open(path, 'rb') as in_file:
+                if in_file.read(len(header)) != header:
+                    raise ValueError(f'Game log "{path}" was written for a different match.')
+
+        self._load_bytes: int = (num_blanks + num_live + 7) // 8
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if index_path(path).is_file():
+            os.truncate(index_path(path), _indexed_games(path) * INDEX_FORMAT.size)
+        elif path.is_file() and path.stat().st_size > 0:
+            rebuild_index(path, len(header), self._load_bytes)
+        self._log = open(path, 'ab')
+        self._index = open(index_path(path), 'ab')
+        if self._log.tell() == 0:
+            self._log.write(header)
+
+        self._loads: list[int] = list()
+        self._outcomes: list[int] = list()
+
+
+    def on_load(self, shells: int) -> None:
+        self._loads.append(shells)
+
+
+    def on_shot(self, player1_turn: bool, move: Move, outcome: Outcome) -> None:
+        self._outcomes.append(outcome.value)
+
+
+    def on_game_end(self, player_one_won: bool) -> None:
+        offset: int = self._log.tell()
+        self._log.write(RECORD_FORMAT.pack(len(self._outcomes), len(self._loads), int(player_one_won)))
+        for load in self._loads:
+            self._log.write(load.to_bytes(self._load_bytes, 'little'))
+        self._log.write(_pack_outcomes(self._outcomes))
+        self._log.flush()
+        self._index.write(INDEX_FORMAT.pack(offset))
+
+        self._loads.clear()
+        self._outcomes.clear()
+
+
+    def close(self) -> None:
+        """Flushes and closes the log and its index."""
+        self._log.close()
+        self._index.close()
+
+
+    def __enter__(self) -> 'GameLogWriter':
+        return self
+
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class GameLogReader:
+    """
+    Reads games from a log written by `GameLogWriter`. Only the index entry
+    and record of a requested game are read, so reading game `K` costs the
+    same for any `K`. Index entries pointing at or past the end of the log
+    (left by an interrupted writer) are ignored.
+    """
+    def __init__(self, path: Path) -> None:
+        path = Path(path)
+        self._log = open(path, 'rb')
+        self._index = open(index_path(path), 'rb')
+
+        magic, version, self.num_blanks, self.num_live, self.starting_health = HEADER_FORMAT.unpack(self._log.read(HEADER_FORMAT.size))
+        if magic != MAGIC:
+            raise ValueError(f'"{path}" is not a game log.')
+        if version != LOG_VERSION:
+            raise ValueError(f'Unsupported game log version {version} in "{path}".')
+
+        self.player_one_name: str = _read_name(self._log)
+        self.player_two_name: str = _read_name(self._log)
+        self._load_bytes: int = (self.num_blanks + self.num_live + 7) // 8
+        self._num_games: int = _indexed_games(path)
+
+
+    def __len__(self) -> int:
+        return self._num_games
+
+
+    def game(self, game_num: int) -> GameRecord:
+        """Returns game `game_num` (counting from 0) of the log."""
+        if not 0 <= game_num < self._num_games:
+            raise IndexError(f'Game {game_num} is not in the log (it holds {self._num_games} games).')
+
+        self._index.seek(game_num * INDEX_FORMAT.size)
+        self._log.seek(INDEX_FORMAT.unpack(self._index.read(INDEX_FORMAT.size))[0])
+
+        num_shots, num_loads, flags = RECORD_FORMAT.unpack(self._log.read(RECORD_FORMAT.size))
+        loads: list[int] = [int.from_bytes(self._log.read(self._load_bytes), 'little') for _ in range(num_loads)]
+        packed: bytes = self._log.read((num_shots + 3) // 4)
+        outcomes: list[Outcome] = [Outcome((packed[i // 4] >> (2 * (i % 4))) & 3) for i in range(num_shots)]
+
+        return GameRecord(loads, outcomes, bool(flags & 1))
+
+
+    def close(self) -> None:
+        """Closes the log and its index."""
+        self._log.close()
+        self._index.close()
+
+
+    def __enter__(self) -> 'GameLogReader':
+        return self
+
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def rebuild_index(path: Path, header_size: int, load_bytes: int) -> int:
+    """
+    Rewrites the index of the game log at `path` by scanning its records,
+    which start after its `header_size` byte header and store each load in
+    `load_bytes` bytes. A record torn off at the end of the log is cut off,
+    so records appended afterwards can be scanned again.
+
+    :returns: The number of games indexed.
+    """
+    log_size: int = path.stat().st_size
+    offsets: list[int] = list()
+
+    with open(path, 'rb+') as log:
+        offset: int = header_size
+        while offset + RECORD_FORMAT.size <= log_size:
+            log.seek(offset)
+            num_shots, num_loads, _ = RECORD_FORMAT.unpack(log.read(RECORD_FORMAT.size))
+            end: int = offset + RECORD_FORMAT.size + num_loads * load_bytes + (num_shots + 3) // 4
+            if end > log_size:
+                break
+            offsets.append(offset)
+            offset = end
+        log.truncate(offset)
+
+    with open(index_path(path), 'wb') as index_file:
+        index_file.write(b''.join(INDEX_FORMAT.pack(offset) for offset in offsets))
+    return len(offsets)
+
+
+def _indexed_games(path: Path) -> int:
+    """
+    Returns the number of leading entries of the index of the game log at
+    `path` that point inside the log. Offsets only grow, so only the entries
+    at the end of the index are checked.
+    """
+    log_size: int = path.stat().st_size if path.is_file() else 0
+    with open(index_path(path), 'rb') as index_file:
+        index_file.seek(0, 2)
+        num_games: int = index_file.tell() // INDEX_FORMAT.size
+        while num_games > 0:
+            index_file.seek((num_games - 1) * INDEX_FORMAT.size)
+            if INDEX_FORMAT.unpack(index_file.read(INDEX_FORMAT.size))[0] < log_size:
+                break
+            num_games -= 1
+    return num_games
+
+
+def _pack_name(name: str) -> bytes:
+    """Returns `name` as a length-prefixed UTF-8 string."""
+    encoded: bytes = name.encode()[:255]
+    return bytes([len(encoded)]) + encoded
+
+
+def _read_name(in_file) -> str:
+    """Reads a length-prefixed UTF-8 string from `in_file`."""
+    return in_file.read(in_file.read(1)[0]).decode()
+
+
+def _pack_outcomes(outcomes: list[int]) -> bytes:
+    """Packs outcome codes two bits each, four to a byte."""
+    packed: bytearray = bytearray((len(outcomes) + 3) // 4)
+    for i, outcome in enumerate(outcomes):
+        packed[i // 4] |= outcome << (2 * (i % 4))
+    return bytes(packed)
@@ -1,36 +1,39 @@
 # gather_data.py
 # 
 # Gathers data by playing matches.
+import argparse
+import numpy as np
 import stratagem as strat
 import json
 
-from dataclasses import dataclass
+from cache import ResultCache, pairing_key, stratagem_digest
+from collections import defaultdict
+from contextlib import nullcontext
+from dataclasses import asdict
 from datetime import datetime
-from enum import Enum
-from game import Match
+from game import ExactMatch, Match
 from itertools import combinations_with_replacement
-from inspect import getmembers, isclass
+from multiprocessing.pool import Pool
+from observer import MatchStats
+from outcomes import OutcomeTally
 from pathlib import Path
+from results import calculate_win_percentages, empty_store_arrays, fill_store_arrays, record_pairing, write_experiments
+from rng import BlockRandom
+from store import ResultStore, is_store, write_store
 from time import time
 from tqdm import tqdm
+from trials import (CONFIDENCE_Z, Experiment, TrialChunk, chunk_seed, chunk_shells, make_chunks, play_chunk, root_seed,
+                    wilson_interval)
 
-@dataclass
-class Experiment:
-    num_blanks: int
-    num_lives: int
-    starting_health: int
 
 # Modify these constants to change the testing parameters
 # BEGIN CONSTANTS =============================================================
 
-# Uncomment the line below and comment out lines 28-33 to select Stratagems
-# STRATAGEMS = [Greedy, Safe, Balanced, Random, Reckless, Scared]
-STRATAGEMS = list()
+# Uncomment the line below and comment out the next one to select Stratagems
+# STRATAGEMS = [strat.Greedy, strat.Safe, strat.Balanced, strat.Random, strat.Reckless, strat.Scared]
 
-# Import all stratagems from src/stratagem.py except base class and enums
-for name, stratagem in getmembers(strat):
-    if isclass(stratagem) and name not in ('Stratagem', 'ABC', 'GameState') and not issubclass(stratagem, Enum):
-        STRATAGEMS.append(stratagem)
+# Every stratagem registered in src/stratagem.py (see `register`), by class name
+STRATAGEMS = sorted(strat.REGISTRY.values(), key=lambda stratagem: stratagem.__name__)
 
 # Number of trials to calculate average win rate
 NUM_TRIALS: int = 100000
@@ -45,11 +48,61 @@ EXPERIMENTS = [
     Experiment(1, 4, 5),
 ]
 
+# Number of trials played by one job; every chunk gets its own seed
+CHUNK_SIZE: int = 25000
+
+# Trials given to a pairing in its first round of adaptive sampling (--precision)
+ADAPTIVE_BATCH: int = 2000
+
+# Games played per pairing with a MatchStats observer (--stats)
+STATS_TRIALS: int = 10000
+
+# Root seed for every chunk's random stream, unless --seed is given (None draws 
+# a fresh one per run, which also means results are never served from the cache)
+SEED: int | None = 0
+
 # Where to output the data generated
 OUT_DIRECTORY = "./data/"
 
 # END CONSTANTS ================================================================
 
+parser = argparse.ArgumentParser(
+    prog="GatherBuckshotData",
+    description="Gathers win-rate data by playing matches of Buckshot Roulette between Stratagems."
+)
+
+parser.add_argument('-e', '--engine', choices=('batch', 'fast', 'match'), default='batch',
+                    help='simulate games in NumPy batches (default), on one reused Match with its fast path, '
+                         'or on a new Match per trial')
+parser.add_argument('-x', '--exact', action='store_true',
+                    help='compute exact win probabilities instead of simulating trials')
+parser.add_argument('-j', '--workers', type=int, default=1,
+                    help='number of worker processes to play trial chunks on (default 1)')
+parser.add_argument('--no-cache', action='store_true',
+                    help='neither read nor write cached pairing results')
+parser.add_argument('-r', '--refresh', action='append', default=[], metavar='STRATEGY',
+                    help='replay (and re-cache) every pairing involving STRATEGY; may be repeated')
+parser.add_argument('-f', '--format', choices=('both', 'binary', 'json'), default='both',
+                    help='write results as a binary store, JSON experiment files, or both (default)')
+parser.add_argument('-u', '--update', metavar='FOLDER',
+                    help='update the experiments in FOLDER in place, only playing pairings of new or changed stratagems')
+parser.add_argument('-p', '--precision', type=float,
+                    help='sample each pairing until its 95%% confidence interval is within +/- PRECISION, '
+                         'sharing a budget of NUM_TRIALS per pairing')
+parser.add_argument('--shells', choices=('independent', 'common', 'antithetic'), default='independent',
+                    help='shuffle every trial\'s loads independently (default), replay the same loads for trial N of every '
+                         'pairing in an experiment, or also pair each trial with one whose loads are reversed')
+parser.add_argument('--seed', type=int, 
+                    help='root seed of every random stream (default SEED); runs with the same seed give identical results '
+                         'for any number of workers')
+parser.add_argument('--log', action='store_true',
+                    help='play every trial on the match engine and append it to a binary game log in the output folder '
+                         '(replay them with play_game.py --replay)')
+parser.add_argument('--stats', action='store_true',
+                    help='also play STATS_TRIALS observed games per pairing and record histograms of turns, reloads, '
+                         'shots, blanks kept and decision times')
+
+
 def main() -> None:
     """
     Run experiments defined in `EXPERIMENTS`.
@@ -58,56 +111,311 @@ def main() -> None:
     It labels the experiments from `[0, # of experiments - 1]`.
     For example, a file it would produce would be `./data/2024-12-17/23-02/experiment-0.json`.
     """
+    args = parser.parse_args()
+    if args.log and (args.exact or args.precision is not None):
+        parser.error('--log cannot be combined with --exact or --precision')
+    if args.log:
+        args.engine = 'match'
+
+    if args.update:
+        _update_folder(Path(args.update), args)
+        return
+
     day: str = datetime.fromtimestamp(time()).strftime('%Y-%m-%d')
     current_time: str = datetime.fromtimestamp(time()).strftime('%H-%M')
-    Path(f'{OUT_DIRECTORY}{day}/{current_time}').mkdir(parents=True, exist_ok=True)
+    folder: Path = Path(f'{OUT_DIRECTORY}{day}/{current_time}')
+    folder.mkdir(parents=True, exist_ok=True)
+
+    match_pairs: list[tuple[strat.Stratagem, strat.Stratagem]] = list(combinations_with_replacement(STRATAGEMS, 2))
+    seed: int = root_seed(args.seed, SEED)
+
+    pairings: list[tuple[int, int]] = [(exp_num, pair_num) for exp_num in range(len(EXPERIMENTS)) for pair_num in range(len(match_pairs))]
+    win_percentages, wins, trials, outcomes = _play_pairings(EXPERIMENTS, match_pairs, pairings, NUM_TRIALS, seed, args,
+                                                             folder / 'logs' if args.log else None)
+    stats: dict[tuple[int, int], MatchStats] = _gather_stats(EXPERIMENTS, match_pairs, pairings, seed, args.workers) if args.stats else dict()
+
+    write_experiments(folder, EXPERIMENTS, STRATAGEMS, match_pairs, pairings, win_percentages, wins, trials, outcomes, stats,
+                      NUM_TRIALS, seed, exact=args.exact, precision=args.precision, shells=args.shells,
+                      with_stats=args.stats, file_format=args.format)
+
+
+def _update_folder(folder: Path, args: argparse.Namespace) -> None:
+    """
+    Brings the experiments in `folder` up to date with `STRATAGEMS`, in place.
+
+    Only pairings involving a stratagem that is new, or whose source changed 
+    since the folder was written (per its recorded `sources`), are played, 
+    using the folder's own trial count, seed and mode. Their results are 
+    merged into the existing matrix, stratagems no longer in `STRATAGEMS` are 
+    dropped, and only rows with a changed entry get their overall win rate 
+    recalculated. Adding an Nth stratagem therefore costs N pairings.
+
+    If `folder` also holds a binary store, it is rewritten with the merged 
+    results, keeping the full precision of the pairings that were not replayed.
+    """
+    paths: list[Path] = sorted(folder.glob('experiment-*.json'), key=lambda path: int(path.stem.split('-')[1]))
+    if len(paths) == 0:
+        raise FileNotFoundError(f'No JSON experiment files found in "{folder}"; --update needs them to merge into.')
 
+    result_dicts: list[dict] = list()
+    for path in paths:
+        with open(path, 'r') as in_file:
+            result_dicts.append(json.load(in_file))
+
+    params: dict = result_dicts[0]['params']
+    args.exact = params.get('exact', False)
+    args.precision = params.get('precision')
+    args.shells = params.get('shells') or 'independent'
+    seed: int = params.get('seed') if params.get('seed') is not None else SEED
+    num_trials: int = params['trials']
+
+    experiments: list[Experiment] = [Experiment(result_dict['params']['blanks'], result_dict['params']['lives'], 
+                                                result_dict['params']['health']) for result_dict in result_dicts]
     match_pairs: list[tuple[strat.Stratagem, strat.Stratagem]] = list(combinations_with_replacement(STRATAGEMS, 2))
+    digests: dict[str, str] = {stratagem.__name__.lower(): stratagem_digest(stratagem) for stratagem in STRATAGEMS}
+
+    pairings: list[tuple[int, int]] = list()
+    for exp_num, result_dict in enumerate(result_dicts):
+        recorded: dict[str, str] = result_dict.get('sources', dict())
+        stale: set[str] = {name for name, digest in digests.items() if recorded.get(name) != digest}
+        for pair_num, (strat_one, strat_two) in enumerate(match_pairs):
+            if {strat_one.__name__.lower(), strat_two.__name__.lower()} & stale:
+                pairings.append((exp_num, pair_num))
+
+    win_percentages, wins, trials, outcomes = _play_pairings(experiments, match_pairs, pairings, num_trials, seed, args,
+                                                             folder / 'logs' if args.log else None)
+    stats: dict[tuple[int, int], MatchStats] = dict()
+    if 'stats' in result_dicts[0]:
+        stats = _gather_stats(experiments, match_pairs, pairings, seed, args.workers)
+
+    names: list[str] = list(digests)
+    arrays: tuple[np.ndarray, np.ndarray, np.ndarray] = empty_store_arrays(len(experiments), len(names))
+    if is_store(folder):
+        store: ResultStore = ResultStore(folder)
+        kept: list[str] = [name for name in names if name in store.names]
+        new_indices: list[int] = [names.index(name) for name in kept]
+        old_indices: list[int] = [store.index(name) for name in kept]
+        for array, stored in zip(arrays, (store.winrates, store.wins, store.trials)):
+            array[:, *np.ix_(new_indices, new_indices)] = stored[:, *np.ix_(old_indices, old_indices)]
+        del store
 
-    for exp_num, experiment in enumerate(tqdm(EXPERIMENTS, 'Experiments')):
-        result_dict: dict = dict()
-        result_dict['params'] = {'blanks': experiment.num_blanks, 
-                                 'lives': experiment.num_lives, 
-                                 'health': experiment.starting_health,
-                                 'trials': NUM_TRIALS}
-        result_dict['strats'] = dict()
-
-        for strat_one, strat_two in tqdm(match_pairs, 'Pairings', colour='blue', leave=False):
-            if (strat_one.__name__.lower() not in result_dict['strats']):
-                result_dict['strats'][strat_one.__name__.lower()] = dict()
-            if (strat_two.__name__.lower() not in result_dict['strats']):
-                result_dict['strats'][strat_two.__name__.lower()] = dict()
-
-            wins: int = 0
-            for _ in tqdm(range(NUM_TRIALS), f'{strat_one.__name__} VS {strat_two.__name__}', colour='red', leave=False):
-                new_match: Match = Match(experiment.num_blanks, experiment.num_lives, experiment.starting_health, strat_one(), strat_two())
-                wins += 1 if new_match.play() else 0
-            
-            win_percentage: float = (wins/NUM_TRIALS)
-
-            result_dict['strats'][strat_one.__name__.lower()][strat_two.__name__.lower()] = f'{win_percentage:0.3f}'
-
-            if strat_one is not strat_two:
-                result_dict['strats'][strat_two.__name__.lower()][strat_one.__name__.lower()] = f'{(1-win_percentage):0.3f}'
-
-        _calculate_win_percentages(result_dict)
-                
-        with open(f'{OUT_DIRECTORY}{day}/{current_time}/experiment-{exp_num}.json', 'w+') as out_file:
+    for exp_num, (path, result_dict) in enumerate(zip(paths, result_dicts)):
+        removed: set[str] = set(result_dict['strats']) - set(digests)
+        changed_rows: set[str] = set(digests) if removed else set()
+
+        for table in [result_dict[key] for key in ('strats', 'trials', 'ci', 'stats', 'outcomes') if key in result_dict]:
+            for name in removed:
+                table.pop(name, None)
+            for row in table.values():
+                for name in removed:
+                    row.pop(name, None)
+
+        for key in [key for key in pairings if key[0] == exp_num]:
+            strat_one, strat_two = match_pairs[key[1]]
+            record_pairing(result_dict, strat_one, strat_two, win_percentages[key], wins.get(key), trials.get(key),
+                           stats.get(key), outcomes.get(key))
+            changed_rows |= {strat_one.__name__.lower(), strat_two.__name__.lower()}
+
+        result_dict['sources'] = digests
+        calculate_win_percentages(result_dict, changed_rows)
+
+        with open(path, 'w') as out_file:
             json.dump(result_dict, out_file)
 
+    if is_store(folder):
+        fill_store_arrays(arrays, names, match_pairs, pairings, win_percentages, wins, trials)
+        write_store(folder, names, [result_dict['params'] for result_dict in result_dicts], *arrays, sources=digests)
+
+
+def _play_pairings(experiments: list[Experiment], match_pairs: list[tuple[type[strat.Stratagem], type[strat.Stratagem]]],
+                   pairings: list[tuple[int, int]], num_trials: int, seed: int, args: argparse.Namespace,
+                   log_directory: Path | None = None) -> tuple[dict[tuple[int, int], float], dict[tuple[int, int], int], 
+                                                      dict[tuple[int, int], int], dict[tuple[int, int], OutcomeTally]]:
+    """
+    Plays (or solves, with `--exact`) every (experiment #, pairing #) in 
+    `pairings` according to the command line `args`, appending every trial 
+    to a game log in `log_directory` if given.
+
+    :returns: The win rate of the first stratagem of each pairing, and for 
+    sampled runs the wins and trials behind it and the tally of their 
+    outcomes, each keyed by (experiment #, pairing #).
+    """
+    win_percentages: dict[tuple[int, int], float] = dict()
+    wins: dict[tuple[int, int], int] = defaultdict(int)
+    trials: dict[tuple[int, int], int] = defaultdict(int)
+    outcomes: dict[tuple[int, int], OutcomeTally] = {key: OutcomeTally(experiments[key[0]].starting_health) for key in pairings}
+
+    if args.exact:
+        for exp_num, pair_num in tqdm(pairings, 'Pairings'):
+            experiment: Experiment = experiments[exp_num]
+            strat_one, strat_two = match_pairs[pair_num]
+            win_percentages[(exp_num, pair_num)] = ExactMatch(experiment.num_blanks, experiment.num_lives, experiment.starting_health,
+                                                              strat.shared(strat_one), strat.shared(strat_two)).win_probability()
+        return win_percentages, dict(), dict(), dict()
+
+    budget: int = len(pairings) * num_trials
+
+    with Pool(args.workers) if args.workers > 1 else nullcontext() as pool, \
+         tqdm(total=budget, desc='Trials', unit='game', unit_scale=True) as progress:
+        if args.precision is None:
+            result_cache: ResultCache | None = None if args.no_cache or log_directory is not None else ResultCache()
+            refresh: set[str] = {_canonical_name(name) for name in args.refresh}
+            cache_keys: dict[tuple[int, int], str] = dict()
+            uncached: list[tuple[int, int]] = list()
+
+            for key in pairings:
+                strat_one, strat_two = match_pairs[key[1]]
+                cached: dict | None = None
+
+                if result_cache is not None:
+                    cache_keys[key] = pairing_key(strat_one, strat_two, {'experiment': asdict(experiments[key[0]]), 'trials': num_trials, 
+                                                                         'chunk_size': CHUNK_SIZE, 'seed': seed, 'engine': args.engine,
+                                                                         'shells': args.shells})
+                    if not refresh & {strat_one.__name__.lower(), strat_two.__name__.lower()}:
+                        cached = result_cache.get(cache_keys[key])
+
+                if cached is None:
+                    uncached.append(key)
+                else:
+                    wins[key], trials[key] = cached['wins'], cached['trials']
+                    outcomes[key] = OutcomeTally.from_dict(cached['outcomes'], experiments[key[0]].starting_health)
+                    progress.update(cached['trials'])
+
+            chunks: list[TrialChunk] = make_chunks(experiments, match_pairs, uncached, num_trials, CHUNK_SIZE, args.engine, seed,
+                                                   args.shells, log_directory)
+            _run_chunks(chunks, pool, wins, trials, outcomes, progress)
+
+            if result_cache is not None:
+                for key in uncached:
+                    result_cache.put(cache_keys[key], {'wins': wins[key], 'trials': trials[key], 'outcomes': outcomes[key].to_dict()})
+        else:
+            _run_adaptive(experiments, match_pairs, pairings, budget, args.precision, args.engine, seed, args.shells, 
+                          pool, wins, trials, outcomes, progress)
+
+    for key in pairings:
+        win_percentages[key] = wins[key] / trials[key]
+
+    return win_percentages, wins, trials, outcomes
+
+
+def _run_chunks(chunks: list[TrialChunk], pool: Pool | None, wins: dict[tuple[int, int], int],
+                trials: dict[tuple[int, int], int], outcomes: dict[tuple[int, int], OutcomeTally], progress: tqdm) -> None:
+    """
+    Plays every chunk in `chunks`, in this process if `pool` is `None` and on 
+    `pool` otherwise, adding its wins, trials and outcomes to the totals of its 
+    (experiment, pairing) in `wins`, `trials` and `outcomes`.
+    """
+    results = map(play_chunk, chunks) if pool is None else pool.imap_unordered(play_chunk, chunks)
+
+    for chunk, chunk_wins, chunk_outcomes in results:
+        wins[(chunk.exp_num, chunk.pair_num)] += chunk_wins
+        trials[(chunk.exp_num, chunk.pair_num)] += chunk.num_trials
+        outcomes[(chunk.exp_num, chunk.pair_num)].merge(chunk_outcomes)
+        progress.update(chunk.num_trials)
+
+
+def _run_adaptive(experiments: list[Experiment], match_pairs: list[tuple[type[strat.Stratagem], type[strat.Stratagem]]], 
+                  pairings: list[tuple[int, int]], budget: int, precision: float, engine: str, seed: int, shells: str, pool: Pool | None, 
+                  wins: dict[tuple[int, int], int], trials: dict[tuple[int, int], int], 
+                  outcomes: dict[tuple[int, int], OutcomeTally], progress: tqdm) -> None:
+    """
+    Plays rounds of chunks until every pairing in `pairings` has a confidence interval within 
+    +/- `precision` or `budget` trials have been played in total.
+
+    Each round, every pairing that has not converged gets one chunk sized to 
+    the trials its current estimate says it still needs, widest interval first,
+    so whatever budget is left goes to the pairings that are least certain. 
+    Chunk sizes and seeds only depend on earlier rounds' results, so the run 
+    is as reproducible as `make_chunks`.
+    """
+    chunk_counts: dict[tuple[int, int], int] = defaultdict(int)
+
+    def half_width(key: tuple[int, int]) -> float:
+        if trials[key] == 0:
+            return 1.0
+        low, high = wilson_interval(wins[key], trials[key])
+        return (high - low) / 2
+
+    while budget > 0:
+        pending: list[tuple[int, int]] = sorted((key for key in pairings if half_width(key) > precision), key=half_width, reverse=True)
+        if len(pending) == 0:
+            break
+
+        chunks: list[TrialChunk] = list()
+        for exp_num, pair_num in pending:
+            num_trials: int = min(_trials_needed(wins[(exp_num, pair_num)], trials[(exp_num, pair_num)], precision), budget)
+            if num_trials == 0:
+                break
+
+            strat_one, strat_two = match_pairs[pair_num]
+            chunks.append(TrialChunk(exp_num, pair_num, experiments[exp_num], strat_one, strat_two, num_trials, engine,
+                                     chunk_seed(seed, experiments[exp_num], strat_one, strat_two, chunk_counts[(exp_num, pair_num)]),
+                                     trials[(exp_num, pair_num)], *chunk_shells(seed, experiments[exp_num], shells)))
+            chunk_counts[(exp_num, pair_num)] += 1
+            budget -= num_trials
+
+        _run_chunks(chunks, pool, wins, trials, outcomes, progress)
+
+    progress.total = progress.n
+    progress.refresh()
+
+
+def _trials_needed(wins: int, num_trials: int, precision: float) -> int:
+    """
+    Returns how many more trials a pairing with `wins` out of `num_trials` 
+    needs for its confidence interval to be within +/- `precision`, clamped 
+    to between `ADAPTIVE_BATCH` and `CHUNK_SIZE`.
+    """
+    if num_trials == 0:
+        return ADAPTIVE_BATCH
+
+    win_rate: float = (wins + 0.5) / (num_trials + 1)
+    total_needed: float = CONFIDENCE_Z ** 2 * win_rate * (1 - win_rate) / precision ** 2
+    return int(min(max(total_needed - num_trials, ADAPTIVE_BATCH), CHUNK_SIZE))
+
+
+def _canonical_name(name: str) -> str:
+    """Returns the lowercase class name of the stratagem called `name` or one of its aliases (`name` if none is)."""
+    stratagem: type[strat.Stratagem] | None = strat.lookup(name)
+    return name.lower() if stratagem is None else stratagem.__name__.lower()
+
+
+def _gather_stats(experiments: list[Experiment], match_pairs: list[tuple[type[strat.Stratagem], type[strat.Stratagem]]],
+                  pairings: list[tuple[int, int]], seed: int, workers: int) -> dict[tuple[int, int], MatchStats]:
+    """
+    Plays `STATS_TRIALS` games of every (experiment #, pairing #) in `pairings`
+    with a `MatchStats` observer and returns their statistics. These games are 
+    played separately from the trials behind the win rates, so gathering 
+    statistics never slows down or changes the main run.
+    """
+    stats: dict[tuple[int, int], MatchStats] = defaultdict(MatchStats)
+    chunks: list[TrialChunk] = make_chunks(experiments, match_pairs, pairings, STATS_TRIALS, CHUNK_SIZE, 'match', seed)
+
+    with Pool(workers) if workers > 1 else nullcontext() as pool, \
+         tqdm(total=len(pairings) * STATS_TRIALS, desc='Stats', unit='game', unit_scale=True) as progress:
+        results = map(_play_stats_chunk, chunks) if pool is None else pool.imap_unordered(_play_stats_chunk, chunks)
+
+        for chunk, chunk_stats in results:
+            stats[(chunk.exp_num, chunk.pair_num)].merge(chunk_stats)
+            progress.update(chunk.num_trials)
+
+    return stats
+
+
+def _play_stats_chunk(chunk: TrialChunk) -> tuple[TrialChunk, MatchStats]:
+    """Plays the trials of `chunk` on one observed `Match` and returns it with their statistics."""
+    experiment: Experiment = chunk.experiment
+    stats: MatchStats = MatchStats()
+    rng: BlockRandom = BlockRandom(np.random.default_rng(chunk.seed))
+    observed_match: Match = Match(experiment.num_blanks, experiment.num_lives, experiment.starting_health, 
+                                  strat.shared(chunk.strat_one), strat.shared(chunk.strat_two), stats, rng=rng)
+
+    for _ in range(chunk.num_trials):
+        observed_match.reset()
+        observed_match.play()
 
-def _calculate_win_percentages(result_dict: dict) -> None:
-        """
-        Calculates the overall average win rates of the stratagems in 
-        `result_dict`.
-        """
-        for strat in STRATAGEMS:
-            overall_sum: float = 0.0
-            for win_percentage in result_dict['strats'][strat.__name__.lower()].values():
-                overall_sum += float(win_percentage)
+    return chunk, stats
 
-            result_dict['strats'][strat.__name__.lower()]['overall'] = f'{(overall_sum/len(STRATAGEMS)):.3f}'
 
-    
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,154 @@
+# observer.py
+#
+# Observers that Match.play reports each game's events to.
+from stratagem import Move, Outcome
+
+
+class MatchObserver:
+    """
+    Receives the events of every game a `Match` plays. Every hook does nothing
+    by default, so subclasses only override the events they count.
+
+    A `Match` without an observer skips every hook, and `Match.play_fast`
+    never calls them.
+    """
+    def on_decision(self, player1_turn: bool, nanoseconds: int) -> None:
+        """Called after a player decides their move, with the time the decision took."""
+
+
+    def on_shot(self, player1_turn: bool, move: Move, outcome: Outcome) -> None:
+        """Called after every shot, before turns change."""
+
+
+    def on_reload(self) -> None:
+        """Called whenever the shotgun is reloaded during a game (not for the first load)."""
+
+
+    def on_load(self, shells: int) -> None:
+        """
+        Called with every load a game uses, including the first, as a bitmask 
+        (bit `i` set if the `i`th shell fired is live).
+        """
+
+
+    def on_game_end(self, player_one_won: bool) -> None:
+        """Called once a game is over."""
+
+
+class MatchStats(MatchObserver):
+    """
+    Counts what happens in every game a `Match` plays, as histograms over
+    games (index `i` holds the number of games with a count of `i`).
+
+    Counts per player are stored as `[player one, player two]`. A blank is
+    "kept" when a player shoots themself with a blank and so keeps the gun.
+    """
+    # Histograms counted once per game
+    GAME_COUNTS: tuple[str, ...] = ('turns', 'reloads')
+
+    # Histograms counted once per player per game
+    PLAYER_COUNTS: tuple[str, ...] = ('self_shots', 'opp_shots', 'blanks_kept')
+
+    def __init__(self) -> None:
+        self.games: int = 0
+        self.p1_wins: int = 0
+        self.histograms: dict[str, list[int]] = {name: list() for name in self.GAME_COUNTS}
+        self.player_histograms: dict[str, tuple[list[int], list[int]]] = {name: (list(), list()) for name in self.PLAYER_COUNTS}
+        self.decisions: list[int] = [0, 0]
+        self.decision_ns: list[int] = [0, 0]
+        self._start_game()
+
+
+    def _start_game(self) -> None:
+        """Zeroes the counters of the game in progress."""
+        self._counts: dict[str, int] = {name: 0 for name in self.GAME_COUNTS}
+        self._player_counts: dict[str, list[int]] = {name: [0, 0] for name in self.PLAYER_COUNTS}
+        self._last_turn: bool | None = None
+
+
+    def on_decision(self, player1_turn: bool, nanoseconds: int) -> None:
+        player: int = 0 if player1_turn else 1
+        self.decisions[player] += 1
+        self.decision_ns[player] += nanoseconds
+
+
+    def on_shot(self, player1_turn: bool, move: Move, outcome: Outcome) -> None:
+        player: int = 0 if player1_turn else 1
+
+        if player1_turn != self._last_turn:
+            self._counts['turns'] += 1
+            self._last_turn = player1_turn
+
+        if move == Move.SHOOT_SELF:
+            self._player_counts['self_shots'][player] += 1
+            if outcome == Outcome.SHOOT_SELF_WITH_BLANK:
+                self._player_counts['blanks_kept'][player] += 1
+        else:
+            self._player_counts['opp_shots'][player] += 1
+
+
+    def on_reload(self) -> None:
+        self._counts['reloads'] += 1
+
+
+    def on_game_end(self, player_one_won: bool) -> None:
+        self.games += 1
+        self.p1_wins += player_one_won
+
+        for name, count in self._counts.items():
+            _add_to_histogram(self.histograms[name], count)
+        for name, counts in self._player_counts.items():
+            for histogram, count in zip(self.player_histograms[name], counts):
+                _add_to_histogram(histogram, count)
+
+        self._start_game()
+
+
+    def merge(self, other: 'MatchStats') -> None:
+        """Adds the games counted by `other` (between the same players) to this one's."""
+        self.games += other.games
+        self.p1_wins += other.p1_wins
+
+        for name, histogram in other.histograms.items():
+            _merge_histograms(self.histograms[name], histogram)
+        for name, histograms in other.player_histograms.items():
+            for mine, theirs in zip(self.player_histograms[name], histograms):
+                _merge_histograms(mine, theirs)
+
+        for player in range(2):
+            self.decisions[player] += other.decisions[player]
+            self.decision_ns[player] += other.decision_ns[player]
+
+
+    def to_dict(self, player_one: bool = True) -> dict:
+        """
+        Returns the statistics as a JSON-ready dictionary from the perspective
+        of player one (or of player two if `player_one` is `False`): counts per
+        player are split into the `own` player's and the `opponent`'s.
+        """
+        own, opponent = (0, 1) if player_one else (1, 0)
+        wins: int = self.p1_wins if player_one else self.games - self.p1_wins
+
+        result: dict = {'games': self.games, 'wins': wins}
+        result.update(self.histograms)
+        for name, histograms in self.player_histograms.items():
+            result[name] = {'own': histograms[own], 'opponent': histograms[opponent]}
+        result['decision_ns'] = {'own': self.decision_ns[own] / max(1, self.decisions[own]),
+                                 'opponent': self.decision_ns[opponent] / max(1, self.decisions[opponent])}
+
+        return result
+
+
+def _add_to_histogram(histogram: list[int], value: int) -> None:
+    """Counts one more `value` in `histogram`, growing it as needed."""
+    if value >= len(histogram):
+        histogram.extend([0] * (value + 1 - len(histogram)))
+    histogram[value] += 1
+
+
+def _merge_histograms(histogram: list[int], other: list[int]) -> None:
+    """Adds the counts of `other` to `histogram`, growing it as needed."""
+    if len(other) > len(histogram):
+        histogram.extend([0] * (len(other) - len(histogram)))
+    for value, count in enumerate(other):
+        histogram[value] += count
@@ -0,0 +1,139 @@
+# outcomes.py
+#
+# Streaming tallies of how games between two players end, kept in constant
+# memory no matter how many games are played.
+import numpy as np
+
+# Games longer than this many shots are counted in the last bin of the length histogram
+MAX_LENGTH: int = 255
+
+# Games with more reloads than this are counted in the last bin of the reload histogram
+MAX_RELOADS: int = 63
+
+
+class OutcomeTally:
+    """
+    Histograms of the outcomes of games between two players, from player
+    one's perspective, updated as games finish:
+
+    - margin: player one's health minus player two's at the end of the game,
+      from `-starting_health` to `starting_health`
+    - length: shots fired in the game
+    - reloads: times the shotgun was reloaded after the first load
+    - first blood: who first shot their opponent with a live shell, if anyone
+
+    Game lengths and reloads beyond `MAX_LENGTH` and `MAX_RELOADS` are counted
+    in the last bin of their histogram, but their totals stay exact.
+    """
+    def __init__(self, starting_health: int) -> None:
+        self.starting_health: int = starting_health
+        self.games: int = 0
+        self.margins: list[int] = [0] * (2 * starting_health + 1)
+        self.lengths: list[int] = [0] * (MAX_LENGTH + 1)
+        self.reloads: list[int] = [0] * (MAX_RELOADS + 1)
+        self.length_total: int = 0
+        self.reload_total: int = 0
+
+        # Games in which player one, player two or neither drew first blood
+        self.first_blood: list[int] = [0, 0, 0]
+        self.first_blood_wins: int = 0
+
+
+    def add_game(self, p1_health: int, p2_health: int, shots: int, reloads: int, first_blood: bool | None) -> None:
+        """
+        Counts one finished game.
+
+        :param bool first_blood: `True` if player one drew first blood, `False`
+        if player two did, `None` if neither did.
+        """
+        self.games += 1
+        self.margins[p1_health - p2_health + self.starting_health] += 1
+        self.lengths[min(shots, MAX_LENGTH)] += 1
+        self.reloads[min(reloads, MAX_RELOADS)] += 1
+        self.length_total += shots
+        self.reload_total += reloads
+
+        if first_blood is None:
+            self.first_blood[2] += 1
+        else:
+            self.first_blood[0 if first_blood else 1] += 1
+            self.first_blood_wins += first_blood == (p1_health > 0)
+
+
+    def add_games(self, p1_health: np.ndarray, p2_health: np.ndarray, shots: np.ndarray,
+                  reloads: np.ndarray, first_blood: np.ndarray) -> None:
+        """
+        Counts a batch of finished games, given as arrays. `first_blood` is 1
+        where player one drew first blood, 2 where player two did and 0 where
+        neither did.
+        """
+        self.games += p1_health.size
+        _add_counts(self.margins, np.bincount(p1_health - p2_health + self.starting_health, minlength=len(self.margins)))
+        _add_counts(self.lengths, np.bincount(np.minimum(shots, MAX_LENGTH), minlength=len(self.lengths)))
+        _add_counts(self.reloads, np.bincount(np.minimum(reloads, MAX_RELOADS), minlength=len(self.reloads)))
+        self.length_total += int(shots.sum())
+        self.reload_total += int(reloads.sum())
+
+        counts: np.ndarray = np.bincount(first_blood, minlength=3)
+        self.first_blood[0] += int(counts[1])
+        self.first_blood[1] += int(counts[2])
+        self.first_blood[2] += int(counts[0])
+        self.first_blood_wins += int(np.count_nonzero(((first_blood == 1) & (p1_health > 0)) | ((first_blood == 2) & (p2_health > 0))))
+
+
+    def merge(self, other: 'OutcomeTally') -> None:
+        """Adds the games counted by `other` (between the same players) to this one's."""
+        self.games += other.games
+        for mine, theirs in ((self.margins, other.margins), (self.lengths, other.lengths),
+                             (self.reloads, other.reloads), (self.first_blood, other.first_blood)):
+            _add_counts(mine, theirs)
+        self.length_total += other.length_total
+        self.reload_total += other.reload_total
+        self.first_blood_wins += other.first_blood_wins
+
+
+    def to_dict(self, player_one: bool = True) -> dict:
+        """
+        Returns the tally as a JSON-ready dictionary from the perspective of
+        player one (or of player two if `player_one` is `False`). Trailing
+        empty bins of the length and reload histograms are dropped.
+        """
+        own, opponent = (0, 1) if player_one else (1, 0)
+
+        return {'games': self.games,
+                'margin': self.margins if player_one else self.margins[::-1],
+                'length': _trimmed(self.lengths),
+                'length_total': self.length_total,
+                'reloads': _trimmed(self.reloads),
+                'reload_total': self.reload_total,
+                'first_blood': {'own': self.first_blood[own], 'opponent': self.first_blood[opponent], 'none': self.first_blood[2]},
+                'first_blood_wins': self.first_blood_wins}
+
+
+    @classmethod
+    def from_dict(cls, data: dict, starting_health: int) -> 'OutcomeTally':
+        """Returns the tally written by `to_dict()` (from player one's perspective)."""
+        tally: OutcomeTally = cls(starting_health)
+        tally.games = data['games']
+        tally.margins = list(data['margin'])
+        _add_counts(tally.lengths, data['length'])
+        _add_counts(tally.reloads, data['reloads'])
+        tally.length_total = data['length_total']
+        tally.reload_total = data['reload_total']
+        tally.first_blood = [data['first_blood']['own'], data['first_blood']['opponent'], data['first_blood']['none']]
+        tally.first_blood_wins = data['first_blood_wins']
+        return tally
+
+
+def _add_counts(counts: list[int], other) -> None:
+    """Adds the counts of `other` to the (at least as long) histogram `counts`."""
+    for value, count in enumerate(other):
+        counts[value] += int(count)
+
+
+def _trimmed(counts: list[int]) -> list[int]:
+    """Returns `counts` without its trailing empty bins."""
+    end: int = len(counts)
+    while end > 0 and counts[end - 1] == 0:
+        end -= 1
+    return counts[:end]
@@ -1,27 +1,33 @@
 # play_game.py
 #
-# For testing the game. Run this module as main if you want to pit two algorithms 
-# against one another.
+# For testing the game. Run this module as main if you want to pit two algorithms
+# against one another, or to replay a game from a game log.
+import argparse
+
 from game import Match
+from gamelog import GameLogReader, GameLogWriter, GameRecord
 from stratagem import *
 
-NAME_TO_ALG = {
-    "g": Greedy,
-    "greed": Greedy,
-    "greedy": Greedy,
-    "safe": Safe,
-    "b": Balanced,
-    "balanced": Balanced,
-    "rand": Random,
-    "random": Random,
-    "reckless": Reckless,
-    "scared": Scared,
-    "trigger": TriggerHappy,
-    "suicide": Suicidal,
-    "suicidal": Suicidal
-}
+parser = argparse.ArgumentParser(
+    prog="PlayBuckshotGame",
+    description="Plays a game of Buckshot Roulette between two Stratagems, or replays one from a game log."
+)
+
+parser.add_argument('-r', '--replay', metavar='LOG', help='replay a game from the game log LOG instead of playing one')
+parser.add_argument('-g', '--game', type=int, default=0, help='number of the game to replay, counting from 0 (default 0)')
+parser.add_argument('-l', '--log', metavar='LOG', help='append the game played to the game log LOG')
+parser.add_argument('--no-pause', action='store_true', help='do not pause after every action')
+
+
+def main() -> None:
+    args = parser.parse_args()
+
+    if args.replay:
+        with GameLogReader(args.replay) as reader:
+            print(f'Game {args.game} of {len(reader)} in "{args.replay}"')
+            replay(reader, args.game, not args.no_pause)
+        return
 
-if __name__ == '__main__':
     alg1: Stratagem = None
     alg2: Stratagem = None
 
@@ -32,9 +38,89 @@ if __name__ == '__main__':
         print('Player 2: ', end='')
         input2: str = input('').strip().lower()
 
-        alg1 = NAME_TO_ALG.get(input1)
-        alg2 = NAME_TO_ALG.get(input2)
+        alg1 = lookup(input1)
+        alg2 = lookup(input2)
+        if alg1 == None or alg2 == None:
+            print(f'Choose from: {", ".join(_stratagem_names())}')
+
+    if args.log:
+        with GameLogWriter(args.log, 4, 4, 3, alg1.__name__, alg2.__name__) as log:
+            Match(4, 4, 3, shared(alg1), shared(alg2), log).play(True, not args.no_pause)
+    else:
+        Match(4, 4, 3, shared(alg1), shared(alg2)).play(True, not args.no_pause)
+
+
+def _stratagem_names() -> list[str]:
+    """Returns every registered stratagem's name, with its aliases in parentheses."""
+    return [f'{name} ({", ".join(stratagem.ALIASES)})' if stratagem.ALIASES else name 
+            for name, stratagem in REGISTRY.items()]
+
+
+def replay(reader: GameLogReader, game_num: int, pause: bool = False) -> None:
+    """
+    Prints the play-by-play of a logged game, in the same format as a
+    `Match` played with `visual=True`.
+
+    :param GameLogReader reader: The game log to read from.
+    :param int game_num: The number of the game to replay, counting from 0.
+    :param bool pause: Whether or not to pause after every action.
+    """
+    record: GameRecord = reader.game(game_num)
+    player_one_name: str = reader.player_one_name
+    player_two_name: str = reader.player_two_name
+    load_size: int = reader.num_blanks + reader.num_live
 
-    new_match: Match = Match(4, 4, 3, alg1(), alg2())
+    p1_health: int = reader.starting_health
+    p2_health: int = reader.starting_health
+    player1_turn: bool = True
+    loads = iter(record.loads)
+    shells: int = 0
+    cursor: int = load_size
 
-    new_match.play(True, True)
\ No newline at end of file
+    print(f'\x1b[1m\x1b[32mSTARTING NEW GAME\x1b[0m: \x1b[31m{player_one_name}\x1b[0m VS \x1b[34m{player_two_name}\x1b[0m')
+
+    for outcome in record.outcomes:
+        if cursor == load_size:
+            shells, cursor = next(loads), 0
+
+        if player1_turn:
+            print(f'===== \x1b[31mPlayer One [{player_one_name}] Turn\x1b[0m =====')
+        else:
+            print(f'===== \x1b[34mPlayer Two [{player_two_name}] Turn\x1b[0m =====')
+
+        remaining: list[bool] = [bool((shells >> i) & 1) for i in range(cursor, load_size)]
+        own_health, opp_health = (p1_health, p2_health) if player1_turn else (p2_health, p1_health)
+        print(GameState(remaining.count(False), remaining.count(True), own_health, opp_health, 
+                        reader.num_blanks, reader.num_live, reader.starting_health))
+        print('Current Load: ' + ''.join('\x1b[31mL\x1b[0m' if is_live else '\x1b[34mB\x1b[0m' for is_live in remaining))
+        cursor += 1
+
+        # Player one is hurt by shooting self on their turn or being shot on player two's
+        if outcome in (Outcome.SHOOT_SELF_WITH_LIVE, Outcome.SHOOT_OPP_WITH_LIVE):
+            if (outcome == Outcome.SHOOT_OPP_WITH_LIVE) != player1_turn:
+                p1_health -= 1
+            else:
+                p2_health -= 1
+
+        print(f'Player chooses: {outcome.name}')
+        print(f'\x1b[31mP1\x1b[0m Health: ' + 'X︎' * p1_health)
+        print(f'\x1b[34mP2\x1b[0m Health: ' + 'X︎' * p2_health)
+        print()
+
+        if pause:
+            print('Press Enter to Continue... ', end='')
+            input()
+            print()
+
+        # If didn't shoot self with blank, change turns
+        if outcome != Outcome.SHOOT_SELF_WITH_BLANK:
+            player1_turn = not player1_turn
+
+    if record.player_one_won:
+        print(f'\x1b[1m\x1b[31mPlayer One ({player_one_name}) Wins!\x1b[0m')
+    else:
+        print(f'\x1b[1m\x1b[34mPlayer Two ({player_two_name}) Wins!\x1b[0m')
+
+
+if __name__ == '__main__':
+    main()
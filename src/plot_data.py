@@ -1,47 +1,68 @@
 # plot_data.py
 #
 # Uses matplotlib to plot the data of win-rates for each scenario.
+#
+# matplotlib, NumPy, colorama and the result store are only imported once a
+# plot needs them, so the command line starts quickly.
 import argparse
-import matplotlib.pyplot as plt
-import numpy as np
-from io import TextIOWrapper
-from colorama import Fore, Style
-from json import load
-from pathlib import Path
+import json
 
-ERROR_STR: str = Fore.RED + Style.BRIGHT + 'ERROR' + Style.RESET_ALL + ': '
+from hashlib import sha256
+from itertools import combinations
+from pathlib import Path
 
 BLANK_BLUE: str = '#1293E7'
 RAGEFUL_RED: str = '#EC3436'
 PLOT_COLORS = [BLANK_BLUE, RAGEFUL_RED]
 
+# Bump to re-render every chart of --render-all (e.g. after changing how charts look)
+PLOT_VERSION: int = 1
+
+# Name of the file, in a --render-all output folder, of the hashes of each chart's inputs
+RENDERED_NAME: str = 'rendered.json'
+
 parser = argparse.ArgumentParser(
     prog="PlotBuckshotData",
     description="Plots the data gathered from matches of Buckshot Roulette played by Stratagems."
 )
 
 parser.add_argument('foldername', help='name of folder with experiment .json files')
-parser.add_argument('experiment', help='experiment number')
+parser.add_argument('experiment', nargs='?', help='experiment number (not needed with --render-all)')
 parser.add_argument('-w', '--winrate', help='plot the winrate of a specific stratagem')
 parser.add_argument('-a', '--all', help='plot the overall winrates of all stratagems', action='store_true')
 parser.add_argument('-c', '--compone', help='compare algorithm one to algorithm two')
 parser.add_argument('-x', '--comptwo', help='add algorithm two')
-
-args = parser.parse_args()
-
-
-def plot_winrate(results_json: dict, name: str) -> None:
+parser.add_argument('-j', '--json', help='read the JSON experiment files even if the folder has a binary store', action='store_true')
+parser.add_argument('-m', '--margin', nargs=2, metavar=('STRATEGY', 'OPPONENT'), 
+                    help='plot the distribution of final health margins of STRATEGY against OPPONENT')
+parser.add_argument('-l', '--length', nargs=2, metavar=('STRATEGY', 'OPPONENT'), 
+                    help='plot the distribution of game lengths (in shots) of STRATEGY against OPPONENT')
+parser.add_argument('-r', '--reloads', nargs=2, metavar=('STRATEGY', 'OPPONENT'), 
+                    help='plot the distribution of reloads per game of STRATEGY against OPPONENT')
+parser.add_argument('-f', '--firstblood', metavar='STRATEGY', 
+                    help='plot how often STRATEGY and each opponent draw first blood')
+parser.add_argument('--render-all', action='store_true',
+                    help='write every win rate, overall and comparison chart of every experiment in the folder to files, '
+                         'skipping charts whose data has not changed')
+parser.add_argument('-o', '--output', metavar='FOLDER', help='where --render-all writes charts (default [folder]/plots)')
+parser.add_argument('--formats', nargs='+', choices=('png', 'svg', 'pdf'), default=['png'],
+                    help='file formats --render-all writes each chart in (default png)')
+parser.add_argument('--workers', type=int, default=1, help='number of processes --render-all renders on (default 1)')
+
+
+def plot_winrate(results_json: dict, name: str, out_paths: list[Path] | None = None) -> None:
     """
     Plots the win rate of a specific stratagem with name `name`.
 
     :param dict results_json: The result dictionary to read from.
     :param str name: The name of the stratagem to plot.
+    :param list[Path] out_paths: Files to save the chart to instead of showing it.
     """
+    plt = _pyplot()
     name = name.lower()
 
     if (name not in results_json['strats']):
-        print(f'{ERROR_STR}Stratagem "{name}" not found.')
-        exit()
+        _error(f'Stratagem "{name}" not found.')
     
     strats: list[str] = list(results_json['strats'][name].keys())
     win_rates: list[float] = [float(i) for i in results_json['strats'][name].values()]
@@ -57,16 +78,18 @@ def plot_winrate(results_json: dict, name: str) -> None:
     fig.suptitle(f'{name.title()} Player\'s Win Rates in Buckshot Roulette')
     plt.ylabel('Percentage of Matches Won')
     plt.xlabel('Opponent Algorithm')
-    plt.title(f'{params['blanks']} Blanks, {params['lives']} Lives, {params['health']} HP, {params['trials']//1000}k Trials', fontsize=8)
-    plt.show()
+    plt.title(_params_subtitle(params), fontsize=8)
+    _finish(fig, out_paths)
 
 
-def plot_overall_winrates(results_json: dict) -> None:
+def plot_overall_winrates(results_json: dict, out_paths: list[Path] | None = None) -> None:
     """
     Plot all overall win rates from an experiment in a bar chart.
 
     :param dict results_json: The result dictionary to read from.
+    :param list[Path] out_paths: Files to save the chart to instead of showing it.
     """
+    plt = _pyplot()
     strats: list[str] = list(results_json['strats'].keys())
     win_rates: list[float] = list(float(results_json['strats'][strat_name]['overall']) for strat_name in strats)
 
@@ -80,30 +103,26 @@ def plot_overall_winrates(results_json: dict) -> None:
     fig.suptitle(f'All Stratagems\' Overall Win Rates in Buckshot Roulette')
     plt.ylabel('Percentage of Matches Won')
     plt.xlabel('Opponent Algorithm')
-    plt.title(f'{params['blanks']} Blanks, {params['lives']} Lives, {params['health']} HP, {params['trials']//1000}k Trials', fontsize=8)
-    plt.show()
+    plt.title(_params_subtitle(params), fontsize=8)
+    _finish(fig, out_paths)
 
 
-def plot_winrate_comparison(results_json: dict, alg_one: str, alg_two: str) -> None:
+def plot_winrate_comparison(results_json: dict, alg_one: str, alg_two: str, out_paths: list[Path] | None = None) -> None:
     """
     Plot the comparison of two algorithms from an experiment in a bar chart.
 
     :param dict results_json: The result dictionary to read from.
     :param str alg_one: The name of the first algorithm to compare.
     :param str alg_two: The name of the second algorithm to compare.
+    :param list[Path] out_paths: Files to save the chart to instead of showing it.
     """
+    import numpy as np
+    plt = _pyplot()
+
     if alg_one.lower() not in results_json['strats']:
-        print(f'{ERROR_STR}Stratagem "{alg_one}" not found.')
-        exit()
+        _error(f'Stratagem "{alg_one}" not found.')
     if alg_two.lower() not in results_json['strats']:
-        print(f'{ERROR_STR}Stratagem "{alg_two}" not found.')
-        exit()
-
-    strats = ('balanced', 'greedy', 'random', 'reckless')
-    versus_data = {
-        'reckless': (0.1, 0.2, 0.3, 0.4),
-        'scared': (0.2, 0.4, 0.6, 0.8)
-    }
+        _error(f'Stratagem "{alg_two}" not found.')
 
     strats = list(results_json['strats'][alg_one.lower()].keys())
     alg_one_data: list[float] = [float(i) for i in results_json['strats'][alg_one.lower()].values()]
@@ -120,12 +139,6 @@ def plot_winrate_comparison(results_json: dict, alg_one: str, alg_two: str) -> N
     ax.bar_label(alg_one_rects, labels=[f'{i * 100:0.1f}%' for i in alg_one_data])
     ax.bar_label(alg_two_rects, labels=[f'{i * 100:0.1f}%' for i in alg_two_data])
 
-    # for strategy, winrate in versus_data.items():
-    #     offset = width * multiplier
-    #     rects = ax.bar(x + offset, winrate, width, label=strategy)
-    #     ax.bar_label(rects)
-    #     multiplier += 1
-
     ax.set_xticks(x + (width/2), strats)
     ax.legend(loc='upper left', ncols=2)
     ax.set_ylim(0, 1.2)
@@ -134,11 +147,103 @@ def plot_winrate_comparison(results_json: dict, alg_one: str, alg_two: str) -> N
 
     params: dict = results_json['params']
     fig.suptitle(f'Comparison of {alg_one.title()} and {alg_two.title()} Players\'s winrates')
-    plt.title(f'{params['blanks']} Blanks, {params['lives']} Lives, {params['health']} HP, {params['trials']//1000}k Trials', fontsize=8)
+    plt.title(_params_subtitle(params), fontsize=8)
     plt.ylabel('Percentage of Matches Won')
     plt.xlabel('Opponent Algorithm')
-    plt.show()
+    _finish(fig, out_paths)
+
+
+
+def plot_outcome_distribution(results_json: dict, outcome: str, name: str, opponent: str) -> None:
+    """
+    Plots the distribution of one outcome (`'margin'`, `'length'` or 
+    `'reloads'`) of the games between two stratagems.
 
+    :param dict results_json: The result dictionary to read from.
+    :param str outcome: The outcome to plot.
+    :param str name: The name of the stratagem whose perspective to plot from.
+    :param str opponent: The name of its opponent.
+    """
+    plt = _pyplot()
+    tally: dict = _get_outcomes(results_json, name, opponent)
+    counts: list[int] = tally[outcome]
+    shares: list[float] = [count / tally['games'] for count in counts]
+
+    if outcome == 'margin':
+        values: list[int] = list(range(-(len(counts) // 2), len(counts) // 2 + 1))
+        colors: list[str] = [RAGEFUL_RED if value > 0 else BLANK_BLUE for value in values]
+        title: str = f'Final Health Margin of {name.title()} against {opponent.title()}'
+        x_label: str = f'{name.title()}\'s Health minus {opponent.title()}\'s Health'
+        mean: float = sum(value * count for value, count in zip(values, counts)) / tally['games']
+    else:
+        values: list[int] = list(range(len(counts)))
+        colors: list[str] = [PLOT_COLORS[i % 2] for i in range(len(counts))]
+        title: str = f'{'Length' if outcome == 'length' else 'Reloads'} of {name.title()} vs {opponent.title()} Games'
+        x_label: str = 'Shots Fired' if outcome == 'length' else 'Reloads'
+        mean: float = tally[f'{'length' if outcome == 'length' else 'reload'}_total'] / tally['games']
+
+    fig, ax = plt.subplots()
+    ax.bar(values, shares, color=colors)
+    ax.axvline(mean, color='black', linestyle='--', linewidth=1, label=f'Mean {mean:0.2f}')
+    ax.legend(loc='upper right')
+
+    fig.suptitle(title)
+    plt.ylabel('Percentage of Matches')
+    plt.xlabel(x_label)
+    plt.title(_params_subtitle(results_json['params']), fontsize=8)
+    _finish(fig)
+
+
+def plot_first_blood(results_json: dict, name: str) -> None:
+    """
+    Plots, against every opponent, how often a stratagem and its opponent 
+    draw first blood (first shoot the other with a live shell).
+
+    :param dict results_json: The result dictionary to read from.
+    :param str name: The name of the stratagem to plot.
+    """
+    import numpy as np
+    plt = _pyplot()
+    opponents: list[str] = [opponent for opponent in results_json['strats'] if opponent != 'overall']
+    tallies: list[dict] = [_get_outcomes(results_json, name, opponent) for opponent in opponents]
+    own: np.ndarray = np.array([tally['first_blood']['own'] / tally['games'] for tally in tallies])
+    opp: np.ndarray = np.array([tally['first_blood']['opponent'] / tally['games'] for tally in tallies])
+
+    fig, ax = plt.subplots()
+    own_bars = ax.bar(opponents, own, label=name.title(), color=RAGEFUL_RED)
+    ax.bar(opponents, opp, bottom=own, label='Opponent', color=BLANK_BLUE)
+    ax.bar_label(own_bars, labels=[f'{i * 100:0.1f}%' for i in own], label_type='center')
+    ax.legend(loc='upper left', ncols=2)
+    ax.set_ylim(0, 1.2)
+
+    fig.suptitle(f'{name.title()} Player\'s First Blood in Buckshot Roulette')
+    plt.ylabel('Percentage of Matches')
+    plt.xlabel('Opponent Algorithm')
+    plt.title(_params_subtitle(results_json['params']), fontsize=8)
+    _finish(fig)
+
+
+def _get_outcomes(results_json: dict, name: str, opponent: str) -> dict:
+    """Returns the outcome tally of stratagem `name` against `opponent`, exiting if there is none."""
+    name, opponent = name.lower(), opponent.lower()
+
+    if 'outcomes' not in results_json:
+        _error('Experiment has no outcomes (exact experiments, or gathered before they were recorded).')
+    if name not in results_json['outcomes'] or opponent not in results_json['outcomes'][name]:
+        _error(f'No outcomes of "{name}" against "{opponent}" found.')
+
+    return results_json['outcomes'][name][opponent]
+
+
+def _params_subtitle(params: dict) -> str:
+    """Returns the subtitle describing the experiment parameters in `params`."""
+    if params.get('exact'):
+        trials: str = 'Exact'
+    elif params.get('precision'):
+        trials: str = f'\u00b1{params['precision']} 95% CI'
+    else:
+        trials: str = f'{params['trials']//1000}k Trials'
+    return f'{params['blanks']} Blanks, {params['lives']} Lives, {params['health']} HP, {trials}'
 
 
 def get_result_json_dict(filename: str) -> dict:
@@ -149,16 +254,175 @@ def get_result_json_dict(filename: str) -> dict:
     """
 
     with open(filename, 'r') as in_file:
-        return load(in_file)
+        return json.load(in_file)
 
 
-def main() -> None:
-    file_path: Path = Path.cwd() / Path(f'{args.foldername}/experiment-{args.experiment}.json')
-    
-    if not file_path.is_file():
-        print(ERROR_STR + f'Folder "{file_path}" not found.')
+def get_result_store_dict(folder: Path, experiment: int, names: list[str] | None = None) -> dict:
+    """
+    Returns the result dict of an experiment from the binary store in `folder`.
+    The store is memory-mapped, so only the rows of the stratagems in `names` 
+    (or of every stratagem if `None`) are read from disk.
+
+    :param Path folder: The folder holding the store.
+    :param int experiment: The experiment number.
+    :param list[str] names: The stratagems whose rows are needed.
+    """
+    from store import ResultStore
+    return ResultStore(folder).experiment_dict(experiment, names)
+
 
-    results: dict = get_result_json_dict(file_path)
+def render_all(folder: Path, out_folder: Path, formats: list[str], workers: int = 1, use_json: bool = False) -> tuple[int, int]:
+    """
+    Writes every chart of every experiment in `folder` to `out_folder`: each
+    stratagem's win rates (`experiment-N/winrate-[name]`), the overall win
+    rates (`experiment-N/overall`) and every pair of stratagems compared
+    (`experiment-N/compare-[name]-[name]`), once per format in `formats`.
+
+    Charts are rendered headlessly on `workers` processes. A hash of each
+    chart's inputs is kept in `out_folder/rendered.json`, and charts whose
+    inputs have not changed since they were last written are skipped.
+
+    :returns: The number of charts rendered and skipped.
+    """
+    from store import ResultStore, is_store
+
+    experiments: list[tuple[int, dict]] = list()
+    if is_store(folder) and not use_json:
+        store: ResultStore = ResultStore(folder)
+        experiments = [(exp_num, store.experiment_dict(exp_num)) for exp_num in range(len(store.params))]
+    else:
+        for path in sorted(folder.glob('experiment-*.json'), key=lambda path: int(path.stem.split('-')[1])):
+            experiments.append((int(path.stem.split('-')[1]), get_result_json_dict(path)))
+
+    rendered_path: Path = out_folder / RENDERED_NAME
+    rendered: dict[str, str] = dict()
+    if rendered_path.is_file():
+        with open(rendered_path, 'r') as in_file:
+            rendered = json.load(in_file)
+
+    charts: list[tuple[str, tuple, dict, list[Path]]] = list()
+    skipped: int = 0
+    for exp_num, results in experiments:
+        names: list[str] = list(results['strats'])
+        specs: list[tuple[str, str, tuple]] = [(f'winrate-{name}', 'winrate', (name,)) for name in names]
+        specs.append(('overall', 'overall', ()))
+        specs += [(f'compare-{one}-{two}', 'compare', (one, two)) for one, two in combinations(names, 2)]
+
+        for stem, kind, names_used in specs:
+            inputs: dict = _chart_inputs(results, kind, names_used)
+            digest: str = sha256(json.dumps([PLOT_VERSION, kind, names_used, inputs], sort_keys=True).encode()).hexdigest()
+            out_paths: list[Path] = [out_folder / f'experiment-{exp_num}' / f'{stem}.{out_format}' for out_format in formats]
+            key: str = f'experiment-{exp_num}/{stem}'
+
+            if rendered.get(key) == digest and all(path.is_file() for path in out_paths):
+                skipped += 1
+                continue
+            rendered[key] = digest
+            charts.append((kind, names_used, inputs, out_paths))
+
+    for chart in charts:
+        chart[3][0].parent.mkdir(parents=True, exist_ok=True)
+
+    if workers > 1 and len(charts) > 1:
+        from multiprocessing import Pool
+        with Pool(workers) as pool:
+            pool.map(_render_chart, charts, chunksize=max(1, len(charts) // (4 * workers)))
+    else:
+        for chart in charts:
+            _render_chart(chart)
+
+    out_folder.mkdir(parents=True, exist_ok=True)
+    with open(rendered_path, 'w') as out_file:
+        json.dump(rendered, out_file, indent=4, sort_keys=True)
+
+    return len(charts), skipped
+
+
+def _chart_inputs(results: dict, kind: str, names: tuple) -> dict:
+    """Returns the part of an experiment's `results` that a chart of `kind` about `names` is drawn from."""
+    if kind == 'overall':
+        return {'params': results['params'],
+                'strats': {name: {'overall': row['overall']} for name, row in results['strats'].items()}}
+    return {'params': results['params'], 'strats': {name: results['strats'][name] for name in names}}
+
+
+def _render_chart(chart: tuple[str, tuple, dict, list[Path]]) -> None:
+    """Renders one chart of `render_all` to its files."""
+    kind, names, inputs, out_paths = chart
+    _pyplot(headless=True)
+
+    if kind == 'winrate':
+        plot_winrate(inputs, *names, out_paths=out_paths)
+    elif kind == 'overall':
+        plot_overall_winrates(inputs, out_paths=out_paths)
+    else:
+        plot_winrate_comparison(inputs, *names, out_paths=out_paths)
+
+
+def _pyplot(headless: bool = False):
+    """
+    Returns `matplotlib.pyplot`, importing it on first use. If `headless`,
+    the non-interactive Agg backend is selected first, so no GUI toolkit is
+    loaded.
+    """
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _finish(fig, out_paths: list[Path] | None = None) -> None:
+    """Shows `fig`, or saves it to every path in `out_paths` and closes it."""
+    plt = _pyplot()
+    if out_paths is None:
+        plt.show()
+        return
+
+    for path in out_paths:
+        fig.savefig(path)
+    plt.close(fig)
+
+
+def _error(message: str) -> None:
+    """Prints `message` as an error and exits."""
+    from colorama import Fore, Style
+    print(Fore.RED + Style.BRIGHT + 'ERROR' + Style.RESET_ALL + ': ' + message)
+    exit()
+
+
+def main() -> None:
+    args = parser.parse_args()
+    folder: Path = Path.cwd() / Path(args.foldername)
+
+    if args.render_all:
+        out_folder: Path = Path(args.output) if args.output else folder / 'plots'
+        num_rendered, num_skipped = render_all(folder, out_folder, args.formats, args.workers, args.json)
+        print(f'Rendered {num_rendered} charts ({num_skipped} unchanged) to "{out_folder}"')
+        return
+    if args.experiment is None:
+        parser.error('an experiment number is required unless --render-all is given')
+
+    from store import is_store
+
+    # Outcomes are only written to the JSON experiment files
+    plots_outcomes: bool = bool(args.margin or args.length or args.reloads or args.firstblood)
+
+    if is_store(folder) and not args.json and not plots_outcomes:
+        names: list[str] | None = None
+        if args.winrate:
+            names = [args.winrate]
+        elif args.compone and args.comptwo:
+            names = [args.compone, args.comptwo]
+
+        results: dict = get_result_store_dict(folder, int(args.experiment), names)
+    else:
+        file_path: Path = folder / f'experiment-{args.experiment}.json'
+        
+        if not file_path.is_file():
+            _error(f'Folder "{file_path}" not found.')
+
+        results: dict = get_result_json_dict(file_path)
 
     if args.winrate:
         plot_winrate(results, args.winrate)
@@ -166,6 +430,14 @@ def main() -> None:
         plot_overall_winrates(results)
     elif args.compone and args.comptwo:
         plot_winrate_comparison(results, args.compone, args.comptwo)
+    elif args.margin:
+        plot_outcome_distribution(results, 'margin', *args.margin)
+    elif args.length:
+        plot_outcome_distribution(results, 'length', *args.length)
+    elif args.reloads:
+        plot_outcome_distribution(results, 'reloads', *args.reloads)
+    elif args.firstblood:
+        plot_first_blood(results, args.firstblood)
 
 
 
@@ -0,0 +1,94 @@
+# policy.py
+#
+# Compiles stratagems into dense lookup tables of their decisions.
+import numpy as np
+
+from cache import stratagem_digest
+from functools import lru_cache
+from optimal import solve
+from stratagem import STATE_FIELDS, Stratagem, GameState, Move, shared
+
+@lru_cache(maxsize=None)
+def compile_policy(stratagem: type[Stratagem], num_blanks: int, num_live: int, 
+                   starting_health: int) -> np.ndarray:
+    """
+    Returns the probability of `stratagem` shooting the opponent in every 
+    state of a game, indexed by [blanks left, lives left, own health, 
+    opponent health]. Tables are built once per (stratagem, load, health) and 
+    shared, so they are read-only.
+
+    Every state is probed in one call to the stratagem's `get_moves` on its 
+    shared instance. Stratagems registered as not HP-aware are probed at full 
+    health only, and their decisions repeated across every health. The empty 
+    shotgun is never probed since it is always reloaded before a move.
+
+    :param type[Stratagem] stratagem: The stratagem class to compile.
+    :param int num_blanks: The number of blank shells in a full load.
+    :param int num_live: The number of live shells in a full load.
+    :param int starting_health: The health each player starts with.
+    """
+    if stratagem.STATEFUL:
+        raise ValueError(f'{stratagem.__name__} keeps state between moves, so it cannot be compiled into a policy.')
+
+    healths: int = starting_health + 1 if stratagem.HP_AWARE else 1
+    shape: tuple[int, ...] = (num_blanks + 1, num_live + 1, healths, healths)
+    states: np.ndarray = np.empty(shape + (len(STATE_FIELDS),), dtype=np.int64)
+    states[..., :4] = np.stack(np.indices(shape), axis=-1)
+    if not stratagem.HP_AWARE:
+        states[..., 2:4] = starting_health
+    states[..., 4:] = (num_blanks, num_live, starting_health)
+
+    loaded: np.ndarray = (states[..., 0] + states[..., 1] > 0).reshape(-1)
+    probed: np.ndarray = np.zeros(loaded.shape)
+    probed[loaded] = shared(stratagem).get_moves(states.reshape(-1, len(STATE_FIELDS))[loaded])
+
+    table: np.ndarray = np.broadcast_to(probed.reshape(shape), (num_blanks + 1, num_live + 1) + (starting_health + 1,) * 2).copy()
+    if stratagem.DETERMINISTIC and not is_deterministic(table):
+        raise ValueError(f'{stratagem.__name__} is registered as deterministic but flips coins.')
+
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=None)
+def compile_policy_tuples(stratagem: type[Stratagem], num_blanks: int, num_live: int, 
+                          starting_health: int) -> tuple:
+    """
+    Returns `compile_policy` as nested tuples, for fast scalar lookups like 
+    `policy[blanks][lives][own_health][opp_health]` from plain Python.
+    """
+    return tuple(tuple(tuple(tuple(row) for row in plane) for plane in block)
+                 for block in compile_policy(stratagem, num_blanks, num_live, starting_health).tolist())
+
+
+def is_deterministic(policy: np.ndarray) -> bool:
+    """Returns whether every decision in `policy` is certain (no coin flips)."""
+    return bool(np.all((policy == 0.0) | (policy == 1.0)))
+
+
+@lru_cache(maxsize=None)
+def best_response(opponent: type[Stratagem]) -> type[Stratagem]:
+    """
+    Returns a stratagem class that plays the best response to `opponent`: 
+    every move maximizes its chance of winning against `opponent`'s compiled 
+    policy. Like `Optimal`, it needs the load and starting health in the game 
+    state, and each (load, health) is solved once and cached on disk.
+
+    :param type[Stratagem] opponent: The stratagem class to exploit.
+    """
+    key: str = f'vs-{opponent.__name__}-{stratagem_digest(opponent)[:16]}'
+
+    class BestResponse(Stratagem):
+        def get_move(self, game_state: GameState) -> Move:
+            if game_state.load_lives == 0:
+                raise ValueError(f'{type(self).__name__} needs the load and starting health of the match in the game state.')
+
+            load: tuple[int, int, int] = (game_state.load_blanks, game_state.load_lives, game_state.starting_health)
+            policy, _ = solve(*load, compile_policy(opponent, *load), key)
+            shoot_opp: float = policy[game_state.blank_shells, game_state.live_shells, 
+                                      game_state.own_health, game_state.opp_health]
+            return Move.SHOOT_OPP if shoot_opp else Move.SHOOT_SELF
+
+    BestResponse.__name__ = BestResponse.__qualname__ = f'BestResponseTo{opponent.__name__}'
+    BestResponse.__doc__ = f'Plays the best response to {opponent.__name__}.'
+    return BestResponse
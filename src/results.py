@@ -0,0 +1,170 @@
+# results.py
+#
+# Records the results of pairings into experiment dictionaries, and writes
+# them as JSON experiment files and binary stores.
+import json
+import numpy as np
+import stratagem as strat
+
+from cache import stratagem_digest
+from observer import MatchStats
+from outcomes import OutcomeTally
+from pathlib import Path
+from store import write_store
+from trials import Experiment, wilson_interval
+
+
+def write_experiments(folder: Path, experiments: list[Experiment], stratagems: list[type[strat.Stratagem]],
+                      match_pairs: list[tuple[type[strat.Stratagem], type[strat.Stratagem]]], pairings: list[tuple[int, int]],
+                      win_percentages: dict[tuple[int, int], float], wins: dict[tuple[int, int], int],
+                      trials: dict[tuple[int, int], int], outcomes: dict[tuple[int, int], OutcomeTally],
+                      stats: dict[tuple[int, int], MatchStats], num_trials: int, seed: int, exact: bool = False,
+                      precision: float | None = None, shells: str = 'independent', with_stats: bool = False,
+                      file_format: str = 'both') -> None:
+    """
+    Writes the results of every pairing of every experiment to `folder`, as
+    `experiment-N.json` files and/or a binary store.
+
+    :param list[type[Stratagem]] stratagems: Every stratagem of the run, in row order.
+    :param int num_trials: The trials played per pairing (ignored if `exact`).
+    :param int seed: The root seed of the run (ignored if `exact`).
+    :param bool exact: Whether the win rates are exact rather than sampled.
+    :param float precision: The target precision of an adaptive run, if it was one.
+    :param str shells: How loads were shared between pairings.
+    :param bool with_stats: Whether `stats` were gathered, so a `stats` table is written.
+    :param str file_format: `'json'`, `'binary'` or `'both'`.
+    """
+    names: list[str] = [stratagem.__name__.lower() for stratagem in stratagems]
+    sources: dict[str, str] = {stratagem.__name__.lower(): stratagem_digest(stratagem) for stratagem in stratagems}
+    all_params: list[dict] = list()
+
+    for exp_num, experiment in enumerate(experiments):
+        result_dict: dict = dict()
+        result_dict['params'] = {'blanks': experiment.num_blanks,
+                                 'lives': experiment.num_lives,
+                                 'health': experiment.starting_health,
+                                 'trials': 0 if exact else num_trials,
+                                 'exact': exact,
+                                 'precision': precision,
+                                 'shells': None if exact else shells,
+                                 'seed': None if exact else seed}
+        result_dict['strats'] = dict()
+        if not exact:
+            result_dict['trials'] = dict()
+            result_dict['ci'] = dict()
+            result_dict['outcomes'] = dict()
+        result_dict['sources'] = sources
+        if with_stats:
+            result_dict['stats'] = dict()
+        all_params.append(result_dict['params'])
+
+        if file_format == 'binary':
+            continue
+
+        for pair_num, (strat_one, strat_two) in enumerate(match_pairs):
+            key: tuple[int, int] = (exp_num, pair_num)
+            record_pairing(result_dict, strat_one, strat_two, win_percentages[key], wins.get(key), trials.get(key),
+                           stats.get(key), outcomes.get(key))
+
+        calculate_win_percentages(result_dict)
+
+        with open(folder / f'experiment-{exp_num}.json', 'w+') as out_file:
+            json.dump(result_dict, out_file)
+
+    if file_format != 'json':
+        arrays: tuple[np.ndarray, np.ndarray, np.ndarray] = empty_store_arrays(len(experiments), len(names))
+        fill_store_arrays(arrays, names, match_pairs, pairings, win_percentages, wins, trials)
+        write_store(folder, names, all_params, *arrays, sources=sources)
+
+
+def record_pairing(result_dict: dict, strat_one: type[strat.Stratagem], strat_two: type[strat.Stratagem],
+                   win_percentage: float, wins: int | None = None, trials: int | None = None,
+                   stats: MatchStats | None = None, outcomes: OutcomeTally | None = None) -> None:
+    """
+    Records the result of a pairing in both stratagems' rows of `result_dict`,
+    along with its trials, confidence interval and tally of outcomes if it was
+    sampled and its statistics if they were gathered.
+    """
+    name_one: str = strat_one.__name__.lower()
+    name_two: str = strat_two.__name__.lower()
+    for table in [result_dict[key] for key in ('strats', 'trials', 'ci', 'stats', 'outcomes') if key in result_dict]:
+        table.setdefault(name_one, dict())
+        table.setdefault(name_two, dict())
+
+    result_dict['strats'][name_one][name_two] = f'{win_percentage:0.3f}'
+
+    if strat_one is not strat_two:
+        result_dict['strats'][name_two][name_one] = f'{(1-win_percentage):0.3f}'
+
+    if trials is not None and 'trials' in result_dict:
+        low, high = wilson_interval(wins, trials)
+        result_dict['trials'][name_one][name_two] = trials
+        result_dict['ci'][name_one][name_two] = [f'{low:0.4f}', f'{high:0.4f}']
+
+        if strat_one is not strat_two:
+            result_dict['trials'][name_two][name_one] = trials
+            result_dict['ci'][name_two][name_one] = [f'{(1-high):0.4f}', f'{(1-low):0.4f}']
+
+    if outcomes is not None and 'outcomes' in result_dict:
+        result_dict['outcomes'][name_one][name_two] = outcomes.to_dict()
+
+        if strat_one is not strat_two:
+            result_dict['outcomes'][name_two][name_one] = outcomes.to_dict(player_one=False)
+
+    if stats is not None and 'stats' in result_dict:
+        result_dict['stats'][name_one][name_two] = stats.to_dict()
+
+        if strat_one is not strat_two:
+            result_dict['stats'][name_two][name_one] = stats.to_dict(player_one=False)
+
+
+def calculate_win_percentages(result_dict: dict, names: set[str] | None = None) -> None:
+    """
+    Calculates the overall average win rates of the stratagems in
+    `result_dict`, or only of those named in `names` if given.
+    """
+    rows: dict[str, dict] = result_dict['strats']
+
+    for name, row in rows.items():
+        if names is not None and name not in names:
+            continue
+
+        # Keep 'overall' as the last entry of the row
+        row.pop('overall', None)
+
+        overall_sum: float = 0.0
+        for win_percentage in row.values():
+            overall_sum += float(win_percentage)
+
+        row['overall'] = f'{(overall_sum/len(rows)):.3f}'
+
+
+def empty_store_arrays(num_experiments: int, num_strats: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns zeroed win rate, win and trial tensors for a binary store."""
+    shape: tuple[int, int, int] = (num_experiments, num_strats, num_strats)
+    return np.zeros(shape), np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64)
+
+
+def fill_store_arrays(arrays: tuple[np.ndarray, np.ndarray, np.ndarray], names: list[str],
+                      match_pairs: list[tuple[type[strat.Stratagem], type[strat.Stratagem]]], pairings: list[tuple[int, int]],
+                      win_percentages: dict[tuple[int, int], float], wins: dict[tuple[int, int], int],
+                      trials: dict[tuple[int, int], int]) -> None:
+    """
+    Writes the full-precision results of every pairing in `pairings` into the
+    binary store `arrays`, for both stratagems' rows.
+    """
+    winrates_array, wins_array, trials_array = arrays
+
+    for key in pairings:
+        exp_num, pair_num = key
+        strat_one, strat_two = match_pairs[pair_num]
+        one: int = names.index(strat_one.__name__.lower())
+        two: int = names.index(strat_two.__name__.lower())
+
+        winrates_array[exp_num, two, one] = 1 - win_percentages[key]
+        winrates_array[exp_num, one, two] = win_percentages[key]
+
+        if key in trials:
+            wins_array[exp_num, two, one] = trials[key] - wins[key]
+            wins_array[exp_num, one, two] = wins[key]
+            trials_array[exp_num, one, two] = trials_array[exp_num, two, one] = trials[key]
@@ -0,0 +1,76 @@
+# rng.py
+#
+# Seeded random number streams for the simulators and stratagems.
+import numpy as np
+
+from functools import partial
+from itertools import chain
+from typing import Iterator
+
+# Random numbers a BlockRandom draws from its generator at once
+BLOCK_SIZE: int = 1 << 12
+
+
+def stream_seed(root_seed: int, *key: int) -> int:
+    """
+    Returns the seed of the stream identified by `key` under `root_seed`. The
+    same root seed and key always give the same seed, and different keys give
+    independent streams.
+    """
+    return int(np.random.SeedSequence(root_seed, spawn_key=key).generate_state(1)[0])
+
+
+def stream(root_seed: int, *key: int) -> np.random.Generator:
+    """Returns a PCG64 `Generator` for the stream identified by `key` under `root_seed`."""
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(root_seed, spawn_key=key)))
+
+
+class BlockRandom:
+    """
+    Scalar random numbers for code that plays one game at a time, drawn from a
+    NumPy `Generator` in blocks of `block_size` so each draw only costs a call
+    to `next`.
+
+    `random()` returns floats in [0, 1), like `random.random`.
+    """
+    def __init__(self, generator: np.random.Generator | None = None, block_size: int = BLOCK_SIZE) -> None:
+        self._generator: np.random.Generator = generator if generator is not None else np.random.default_rng()
+        self._block_size: int = block_size
+        self.random = partial(next, chain.from_iterable(self._blocks()))
+
+
+    def _blocks(self) -> Iterator[list[float]]:
+        """Yields blocks of uniform floats forever."""
+        while True:
+            yield self._generator.random(self._block_size).tolist()
+
+
+    def randrange(self, stop: int) -> int:
+        """Returns a uniform integer in [0, `stop`)."""
+        return int(self.random() * stop)
+
+
+    def coin_flip(self) -> bool:
+        """Returns `True` or `False` with equal probability."""
+        return self.random() < 0.5
+
+
+    def shuffle(self, items: list) -> None:
+        """Shuffles `items` in place (Fisher-Yates)."""
+        for i in range(len(items) - 1, 0, -1):
+            j: int = self.randrange(i + 1)
+            items[i], items[j] = items[j], items[i]
+
+
+_default: BlockRandom | None = None
+
+
+def default_random() -> BlockRandom:
+    """
+    Returns this process's shared `BlockRandom`, seeded from fresh entropy, for
+    matches and stratagems that are not given one.
+    """
+    global _default
+    if _default is None:
+        _default = BlockRandom()
+    return _default
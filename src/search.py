@@ -0,0 +1,253 @@
+# search.py
+#
+# Searches for strong stratagems by evolving or hill-climbing policy tables,
+# scored exactly against a pool of existing stratagems.
+import argparse
+import numpy as np
+
+from gather_data import OUT_DIRECTORY, SEED, STRATAGEMS
+from optimal import evaluate
+from pathlib import Path
+from policy import compile_policy
+from stratagem import Stratagem, resolve
+from textwrap import wrap
+from tqdm import tqdm
+from trials import root_seed
+
+# Fraction of each generation kept unchanged by the evolutionary search
+ELITE_FRACTION: float = 0.125
+
+parser = argparse.ArgumentParser(
+    prog="SearchBuckshotStratagems",
+    description="Searches for strong deterministic stratagems for one load and starting health, "
+                "and exports the best one as a Stratagem subclass."
+)
+
+parser.add_argument('-b', '--blanks', type=int, default=4, help='blanks per load (default 4)')
+parser.add_argument('-l', '--lives', type=int, default=4, help='lives per load (default 4)')
+parser.add_argument('-hp', '--health', type=int, default=3, help='starting health (default 3)')
+parser.add_argument('-m', '--method', choices=('evolve', 'climb'), default='evolve',
+                    help='evolve a population, or hill-climb from the best stratagem in the pool (default evolve)')
+parser.add_argument('-p', '--population', type=int, default=256, help='candidates scored per generation (default 256)')
+parser.add_argument('-g', '--generations', type=int, default=100, help='generations to run (default 100)')
+parser.add_argument('--mutation', type=float, default=0.02,
+                    help='chance of flipping each decision of a child when evolving (default 0.02)')
+parser.add_argument('-s', '--strats', nargs='+', metavar='STRATEGY',
+                    help='stratagems to score candidates against (default every stratagem)')
+parser.add_argument('--seed', type=int, help='seed of the search (default SEED in gather_data.py)')
+parser.add_argument('-n', '--name', default='Searched', help='name of the exported stratagem class (default Searched)')
+parser.add_argument('-o', '--output', metavar='FILE',
+                    help='where to write the exported stratagem (default ./data/search/[name].py)')
+
+
+def main() -> None:
+    """
+    Runs a search and writes its best policy as a Python module holding a
+    single `Stratagem` subclass, which can be copied into `stratagem.py`.
+    """
+    args = parser.parse_args()
+
+    pool: list[type[Stratagem]] = STRATAGEMS if args.strats is None else resolve(args.strats)
+    names: list[str] = [stratagem.__name__.lower() for stratagem in pool]
+
+    search: PolicySearch = PolicySearch(args.blanks, args.lives, args.health, pool)
+    rng: np.random.Generator = np.random.default_rng(root_seed(args.seed, SEED))
+
+    if args.method == 'evolve':
+        best, score = search.evolve(args.population, args.generations, args.mutation, rng)
+    else:
+        best, score = search.climb(args.population, args.generations, rng)
+
+    print(f'Best score: {score:.6f} (mean win probability over both seats against {len(names)} stratagems)')
+    for name, (first, second) in zip(names, search.breakdown(best)):
+        print(f'  vs {name:<16} {first:.4f} moving first, {second:.4f} moving second')
+
+    out_path: Path = Path(args.output if args.output else f'{OUT_DIRECTORY}search/{args.name}.py')
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    description: str = (f'Found by search.py ({args.method}, {args.generations} generations of {args.population}) '
+                        f'for {args.blanks} blanks, {args.lives} lives and {args.health} health, scoring '
+                        f'{score:.4f} against {", ".join(names)}.')
+    with open(out_path, 'w') as out_file:
+        out_file.write(export_stratagem(search.expand(best[np.newaxis])[0], args.name, description))
+    print(f'Wrote {args.name} to "{out_path}"')
+
+
+class PolicySearch:
+    """
+    Scores deterministic policies for one load and starting health against a
+    pool of stratagems, a whole population at a time.
+
+    A candidate is a vector of decisions (1 to shoot the opponent) over every
+    state a player can move in, expanded into the same [blanks, lives, own
+    health, opponent health] tables `compile_policy` builds. Scores are exact:
+    the mean win probability against every stratagem of the pool, moving first
+    and second, from `optimal.evaluate`.
+    """
+    def __init__(self, num_blanks: int, num_live: int, starting_health: int,
+                 pool: list[type[Stratagem]]) -> None:
+        self.num_blanks: int = num_blanks
+        self.num_live: int = num_live
+        self.starting_health: int = starting_health
+        self.pool: list[type[Stratagem]] = pool
+        self._opponents: list[np.ndarray] = [compile_policy(stratagem, num_blanks, num_live, starting_health)
+                                             for stratagem in pool]
+
+        # States a player moves in: a loaded gun and both players alive
+        self._moves: np.ndarray = np.zeros((num_blanks + 1, num_live + 1, starting_health + 1, starting_health + 1), dtype=bool)
+        self._moves[:, :, 1:, 1:] = True
+        self._moves[0, 0] = False
+        self.num_genes: int = int(self._moves.sum())
+
+
+    def expand(self, genes: np.ndarray) -> np.ndarray:
+        """Returns the policy tables of a population of gene vectors ([candidate, gene])."""
+        policies: np.ndarray = np.zeros((len(genes),) + self._moves.shape)
+        policies[:, self._moves] = genes
+        return policies
+
+
+    def breakdown(self, genes: np.ndarray) -> np.ndarray:
+        """Returns the win probabilities of one candidate against each stratagem, as [stratagem, seat]."""
+        policies: np.ndarray = self.expand(genes[np.newaxis])
+        return np.stack([evaluate(self.num_blanks, self.num_live, self.starting_health, policies, opponent)[0]
+                         for opponent in self._opponents])
+
+
+    def score(self, genes: np.ndarray) -> np.ndarray:
+        """Returns the score of every candidate of a population of gene vectors."""
+        policies: np.ndarray = self.expand(genes)
+        total: np.ndarray = np.zeros(len(genes))
+        for opponent in self._opponents:
+            total += evaluate(self.num_blanks, self.num_live, self.starting_health, policies, opponent).mean(axis=1)
+        return total / len(self._opponents)
+
+
+    def seeds(self) -> np.ndarray:
+        """Returns the genes of every deterministic stratagem of the pool, to start searches from."""
+        seeds: list[np.ndarray] = [opponent[self._moves].astype(np.int8) for opponent in self._opponents
+                                   if np.all((opponent == 0.0) | (opponent == 1.0))]
+        return np.stack(seeds) if seeds else np.zeros((0, self.num_genes), dtype=np.int8)
+
+
+    def evolve(self, population_size: int, generations: int, mutation: float,
+               rng: np.random.Generator) -> tuple[np.ndarray, float]:
+        """
+        Evolves a population seeded with the pool's deterministic stratagems
+        and filled with random candidates. Each generation keeps its best
+        `ELITE_FRACTION`, and breeds the rest by uniform crossover of parents
+        picked by binary tournament, flipping each child's genes with
+        probability `mutation`.
+
+        :returns: The best candidate found and its score.
+        """
+        seeds: np.ndarray = self.seeds()[:population_size]
+        population: np.ndarray = np.concatenate((seeds, rng.integers(0, 2, (population_size - len(seeds), self.num_genes), dtype=np.int8)))
+        num_elite: int = max(1, int(population_size * ELITE_FRACTION))
+        scores: np.ndarray = self.score(population)
+
+        with tqdm(range(generations), desc='Evolving') as progress:
+            for _ in progress:
+                order: np.ndarray = np.argsort(-scores)
+                elite: np.ndarray = population[order[:num_elite]]
+
+                num_children: int = population_size - num_elite
+                contenders: np.ndarray = rng.integers(0, population_size, (2, num_children, 2))
+                parents: np.ndarray = np.where(scores[contenders[:, :, 0]] >= scores[contenders[:, :, 1]],
+                                               contenders[:, :, 0], contenders[:, :, 1])
+                crossover: np.ndarray = rng.random((num_children, self.num_genes)) < 0.5
+                children: np.ndarray = np.where(crossover, population[parents[0]], population[parents[1]])
+                children ^= rng.random((num_children, self.num_genes)) < mutation
+
+                population = np.concatenate((elite, children))
+                scores = np.concatenate((scores[order[:num_elite]], self.score(children)))
+                progress.set_postfix(best=f'{scores[0]:.6f}')
+
+        best: int = int(np.argmax(scores))
+        return population[best], float(scores[best])
+
+
+    def climb(self, population_size: int, generations: int, rng: np.random.Generator) -> tuple[np.ndarray, float]:
+        """
+        Hill-climbs from the pool's best deterministic stratagem (or a random
+        candidate if there are none): each
+        generation scores `population_size` neighbours of the current
+        candidate, each with one to three genes flipped, and moves to the best
+        of them if it scores higher.
+
+        :returns: The best candidate found and its score.
+        """
+        seeds: np.ndarray = self.seeds()
+        if len(seeds) == 0:
+            seeds = rng.integers(0, 2, (1, self.num_genes), dtype=np.int8)
+        seed_scores: np.ndarray = self.score(seeds)
+        current: np.ndarray = seeds[int(np.argmax(seed_scores))]
+        current_score: float = float(np.max(seed_scores))
+
+        with tqdm(range(generations), desc='Climbing') as progress:
+            for _ in progress:
+                neighbours: np.ndarray = np.repeat(current[np.newaxis], population_size, axis=0)
+                for flips in range(3):
+                    genes: np.ndarray = rng.integers(0, self.num_genes, population_size)
+                    flipped: np.ndarray = np.arange(population_size) if flips == 0 else \
+                                          np.flatnonzero(rng.random(population_size) < 0.5)
+                    neighbours[flipped, genes[flipped]] ^= 1
+
+                scores: np.ndarray = self.score(neighbours)
+                best: int = int(np.argmax(scores))
+                if scores[best] > current_score:
+                    current, current_score = neighbours[best], float(scores[best])
+                progress.set_postfix(best=f'{current_score:.6f}')
+
+        return current, current_score
+
+
+def export_stratagem(policy: np.ndarray, name: str, description: str) -> str:
+    """
+    Returns the source of a module defining a `Stratagem` subclass called
+    `name` that plays a deterministic policy table ([blanks, lives, own
+    health, opponent health], 1 to shoot the opponent). States beyond the
+    table (a bigger load or more health) are looked up at its edge. The
+    class is registered (see `stratagem.register`), so importing the module,
+    or copying the class into `stratagem.py`, makes it playable by name.
+
+    :param np.ndarray policy: The policy table to play.
+    :param str name: The name of the class.
+    :param str description: The docstring of the class.
+    """
+    table: list = policy.astype(int).tolist()
+
+    lines: list[str] = ['# Generated by search.py.',
+                        'import numpy as np',
+                        '',
+                        'from stratagem import GameState, Move, Stratagem, register',
+                        '',
+                        '',
+                        '@register(deterministic=True, hp_aware=True)',
+                        f'class {name}(Stratagem):',
+                        '    """',
+                        *('    ' + line for line in wrap(description, 76)),
+                        '    """',
+                        '    # Decisions by [blanks][lives][own health][opponent health]: 1 to shoot the opponent',
+                        '    POLICY: tuple = (']
+    for block in table:
+        lines.append('        (')
+        for plane in block:
+            lines.append(f'            {tuple(tuple(row) for row in plane)},')
+        lines.append('        ),')
+    lines += ['    )',
+              '',
+              '    def get_move(self, game_state: GameState) -> Move:',
+              '        block: tuple = self.POLICY[min(game_state.blank_shells, len(self.POLICY) - 1)]',
+              '        plane: tuple = block[min(game_state.live_shells, len(block) - 1)]',
+              '        row: tuple = plane[min(game_state.own_health, len(plane) - 1)]',
+              '        return Move.SHOOT_OPP if row[min(game_state.opp_health, len(row) - 1)] else Move.SHOOT_SELF',
+              '',
+              '    def get_moves(self, states: np.ndarray) -> np.ndarray:',
+              '        table: np.ndarray = np.array(self.POLICY, dtype=float)',
+              '        return table[tuple(np.minimum(states[:, field], table.shape[field] - 1) for field in range(4))]',
+              '']
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    main()
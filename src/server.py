@@ -0,0 +1,402 @@
+# server.py
+#
+# Local HTTP service that serves gathered results and plays new pairings in
+# the background, streaming their win rates as they come in.
+import argparse
+import asyncio
+import json
+
+from cache import ResultCache, pairing_key
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from functools import lru_cache
+from gather_data import CHUNK_SIZE, NUM_TRIALS, OUT_DIRECTORY, SEED, STRATAGEMS
+from outcomes import OutcomeTally
+from pathlib import Path
+from store import HEADER_NAME, ResultStore, is_store
+from stratagem import Stratagem, resolve
+from trials import Experiment, TrialChunk, make_chunks, play_chunk, root_seed, wilson_interval
+from urllib.parse import unquote, urlsplit
+
+# Experiments kept in memory, least recently used first out
+RESULT_CACHE_SIZE: int = 256
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES: int = 1 << 16
+
+# Most trials one job may play
+MAX_JOB_TRIALS: int = 10_000_000
+
+# Most shells (blanks and lives) in a job's load, and most starting health; compiled
+# policies take (blanks + 1) * (lives + 1) * (health + 1) ** 2 entries per player
+MAX_JOB_LOAD: int = 64
+MAX_JOB_HEALTH: int = 50
+
+# Finished jobs kept for clients to look up, oldest evicted first (their results stay in the result cache)
+MAX_FINISHED_JOBS: int = 1024
+
+# Reasons sent with each status code
+STATUS_REASONS: dict[int, str] = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+                                  405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+parser = argparse.ArgumentParser(
+    prog="ServeBuckshotData",
+    description="Serves gathered Buckshot Roulette results over HTTP, and plays new pairings on request, "
+                "streaming their win rates as server-sent events."
+)
+
+parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default 127.0.0.1)')
+parser.add_argument('--port', type=int, default=8000, help='port to listen on (default 8000)')
+parser.add_argument('-d', '--data', default=OUT_DIRECTORY, help=f'folder of results to serve (default {OUT_DIRECTORY})')
+parser.add_argument('-j', '--workers', type=int, default=1, help='number of worker processes to play jobs on (default 1)')
+parser.add_argument('--no-cache', action='store_true', help='neither read nor write cached pairing results')
+
+
+class HTTPError(Exception):
+    """An error answered with `status` and a JSON body holding `message`."""
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status: int = status
+
+
+def main() -> None:
+    """
+    Runs the service until interrupted. Its endpoints are:
+
+    - `GET /stratagems`: the names of every stratagem.
+    - `GET /runs`: every folder under the data folder holding results.
+    - `GET /runs/[folder]/experiments/[N]`: experiment N of a folder, from
+      its JSON experiment file or its binary store.
+    - `POST /jobs`: plays a pairing (a JSON object with `blanks`, `lives`,
+      `health`, `strat_one`, `strat_two`, and optionally `trials`, `engine`,
+      `shells` and `seed`), or joins the identical job already running.
+    - `GET /jobs/[id]`: a job's current estimate.
+    - `GET /jobs/[id]/events`: a job's estimates as server-sent events, one
+      per finished chunk of trials, ending with a `done` event.
+    """
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(args.workers) as pool:
+        service: Service = Service(Path(args.data), pool, None if args.no_cache else ResultCache())
+        try:
+            asyncio.run(service.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+
+
+class Job:
+    """
+    One pairing played in the background, chunk by chunk. Clients wait on
+    `changed`, which is set (and replaced) whenever the estimate changes.
+    """
+    def __init__(self, job_id: str, params: dict, chunks: list[TrialChunk], starting_health: int) -> None:
+        self.job_id: str = job_id
+        self.params: dict = params
+        self.chunks: list[TrialChunk] = chunks
+        self.wins: int = 0
+        self.trials: int = 0
+        self.outcomes: OutcomeTally = OutcomeTally(starting_health)
+        self.done: bool = False
+        self.error: str | None = None
+        self.changed: asyncio.Event = asyncio.Event()
+
+
+    def update(self) -> None:
+        """Wakes every client waiting for this job's next estimate."""
+        changed: asyncio.Event = self.changed
+        self.changed = asyncio.Event()
+        changed.set()
+
+
+    def snapshot(self) -> dict:
+        """Returns the job's current estimate as a JSON-ready dictionary."""
+        result: dict = {'id': self.job_id, 'params': self.params, 'done': self.done,
+                        'wins': self.wins, 'trials': self.trials}
+        if self.trials > 0:
+            low, high = wilson_interval(self.wins, self.trials)
+            result.update({'win_rate': self.wins / self.trials, 'ci': [low, high]})
+        if self.done and self.error is None:
+            result['outcomes'] = self.outcomes.to_dict()
+        if self.error is not None:
+            result['error'] = self.error
+        return result
+
+
+class Service:
+    """
+    The HTTP service. Requests are handled on one event loop; reading results
+    from disk happens on threads and playing trials in `pool`, so no request
+    blocks the others. Identical jobs share one entry in `jobs`, keyed by the
+    same hash `gather_data` caches pairings under. Only the latest 
+    `MAX_FINISHED_JOBS` finished jobs are kept.
+    """
+    def __init__(self, data_folder: Path, pool: ProcessPoolExecutor, result_cache: ResultCache | None) -> None:
+        self.data_folder: Path = data_folder.resolve()
+        self.pool: ProcessPoolExecutor = pool
+        self.result_cache: ResultCache | None = result_cache
+        self.jobs: dict[str, Job] = dict()
+        self._finished: deque[str] = deque()
+
+
+    async def serve(self, host: str, port: int) -> None:
+        """Accepts connections on `host`:`port` forever."""
+        server: asyncio.Server = await asyncio.start_server(self.handle, host, port)
+        print(f'Serving "{self.data_folder}" on http://{host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers one HTTP request, then closes the connection."""
+        try:
+            method, path, body = await _read_request(reader)
+            parts: list[str] = [unquote(part) for part in urlsplit(path).path.strip('/').split('/') if part]
+
+            if parts[-1:] == ['events'] and len(parts) == 3 and parts[0] == 'jobs':
+                await self._stream_job(self._job(parts[1]), writer)
+            else:
+                status, response = await self._route(method, parts, body)
+                _write_response(writer, status, 'application/json', json.dumps(response).encode())
+        except HTTPError as error:
+            _write_response(writer, error.status, 'application/json', json.dumps({'error': str(error)}).encode())
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as error:
+            _write_response(writer, 500, 'application/json', json.dumps({'error': f'{type(error).__name__}: {error}'}).encode())
+            raise
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+    async def _route(self, method: str, parts: list[str], body: bytes) -> tuple[int, object]:
+        """Returns the status and JSON body of the response to a request (other than event streams)."""
+        if method == 'POST' and parts == ['jobs']:
+            try:
+                params: dict = json.loads(body)
+            except json.JSONDecodeError as error:
+                raise HTTPError(400, f'Invalid JSON: {error}')
+            job: Job = await self._submit(params)
+            return 202 if not job.done else 200, job.snapshot()
+
+        if method != 'GET':
+            raise HTTPError(405, f'{method} is not supported here.')
+
+        if parts == ['stratagems']:
+            return 200, [stratagem.__name__.lower() for stratagem in STRATAGEMS]
+        if parts == ['runs']:
+            return 200, await asyncio.to_thread(self._list_runs)
+        if len(parts) >= 4 and parts[0] == 'runs' and parts[-2] == 'experiments':
+            folder: Path = self._run_folder('/'.join(parts[1:-2]))
+            try:
+                exp_num: int = int(parts[-1])
+            except ValueError:
+                raise HTTPError(404, f'No experiment "{parts[-1]}".')
+            return 200, await asyncio.to_thread(self._read_experiment, folder, exp_num)
+        if len(parts) == 2 and parts[0] == 'jobs':
+            return 200, self._job(parts[1]).snapshot()
+
+        raise HTTPError(404, f'Nothing at "/{"/".join(parts)}".')
+
+
+    def _list_runs(self) -> list[dict]:
+        """Returns every folder under the data folder holding experiment files or a store."""
+        folders: set[Path] = {path.parent for path in self.data_folder.rglob('experiment-*.json')}
+        folders |= {path.parent for path in self.data_folder.rglob(HEADER_NAME)}
+        runs: list[dict] = list()
+        for folder in sorted(folders):
+            experiments: int = len(list(folder.glob('experiment-*.json')))
+            if experiments == 0 and is_store(folder):
+                experiments = len(ResultStore(folder).params)
+            runs.append({'run': folder.relative_to(self.data_folder).as_posix(), 'experiments': experiments})
+        return runs
+
+
+    def _run_folder(self, run: str) -> Path:
+        """Returns the folder of `run`, refusing paths outside the data folder."""
+        folder: Path = (self.data_folder / run).resolve()
+        if not folder.is_relative_to(self.data_folder) or not folder.is_dir():
+            raise HTTPError(404, f'No run "{run}".')
+        return folder
+
+
+    def _read_experiment(self, folder: Path, exp_num: int) -> dict:
+        """
+        Returns experiment `exp_num` of `folder` through the LRU cache, which
+        is keyed by the file's modification time so rewritten results are
+        read again.
+        """
+        path: Path = folder / f'experiment-{exp_num}.json'
+        if not path.is_file():
+            path = folder / HEADER_NAME
+            if not path.is_file():
+                raise HTTPError(404, f'No experiment {exp_num} in "{folder.relative_to(self.data_folder)}".')
+
+        experiment: dict | None = _read_experiment(path, exp_num, path.stat().st_mtime_ns)
+        if experiment is None:
+            raise HTTPError(404, f'No experiment {exp_num} in "{folder.relative_to(self.data_folder)}".')
+        return experiment
+
+
+    def _job(self, job_id: str) -> Job:
+        """Returns the job `job_id`."""
+        if job_id not in self.jobs:
+            raise HTTPError(404, f'No job "{job_id}".')
+        return self.jobs[job_id]
+
+
+    async def _submit(self, params: dict) -> Job:
+        """
+        Returns the job playing the pairing described by `params`, starting it
+        unless an identical job was already submitted. A pairing found in the
+        result cache finishes at once.
+        """
+        try:
+            experiment: Experiment = Experiment(int(params['blanks']), int(params['lives']), int(params['health']))
+            strat_one, strat_two = resolve([str(params['strat_one'])]) + resolve([str(params['strat_two'])])
+            num_trials: int = int(params.get('trials', NUM_TRIALS))
+            engine: str = params.get('engine', 'batch')
+            shells: str = params.get('shells', 'independent')
+            seed: int | None = params.get('seed')
+            if seed is not None and (type(seed) is not int or seed < 0):
+                raise ValueError('seed must be a non-negative integer')
+        except (KeyError, TypeError, ValueError) as error:
+            raise HTTPError(400, f'Invalid job: {error!r}')
+        if engine not in ('batch', 'fast', 'match') or shells not in ('independent', 'common', 'antithetic'):
+            raise HTTPError(400, 'Invalid job: unknown engine or shells.')
+        if experiment.num_lives < 1 or experiment.num_blanks < 0 or experiment.starting_health < 1 or num_trials < 1:
+            raise HTTPError(400, 'Invalid job: a load needs a live shell, and players health and trials.')
+        if num_trials > MAX_JOB_TRIALS:
+            raise HTTPError(400, f'Invalid job: at most {MAX_JOB_TRIALS} trials per job.')
+        if experiment.num_blanks + experiment.num_lives > MAX_JOB_LOAD or experiment.starting_health > MAX_JOB_HEALTH:
+            raise HTTPError(400, f'Invalid job: at most {MAX_JOB_LOAD} shells per load and {MAX_JOB_HEALTH} health.')
+        seed = root_seed(seed, SEED)
+
+        # Hashing the stratagems' sources reads files, so it runs off the event loop like the cache
+        key: str = await asyncio.to_thread(pairing_key, strat_one, strat_two,
+                                           {'experiment': asdict(experiment), 'trials': num_trials, 'chunk_size': CHUNK_SIZE,
+                                            'seed': seed, 'engine': engine, 'shells': shells})
+        job_id: str = key[:16]
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+
+        normalized: dict = {'blanks': experiment.num_blanks, 'lives': experiment.num_lives, 'health': experiment.starting_health,
+                            'strat_one': strat_one.__name__.lower(), 'strat_two': strat_two.__name__.lower(),
+                            'trials': num_trials, 'engine': engine, 'shells': shells, 'seed': seed}
+        chunks: list[TrialChunk] = make_chunks([experiment], [(strat_one, strat_two)], [(0, 0)], num_trials, CHUNK_SIZE, engine, seed, shells)
+        job: Job = Job(job_id, normalized, chunks, experiment.starting_health)
+        self.jobs[job_id] = job
+
+        cached: dict | None = None
+        if self.result_cache is not None:
+            cached = await asyncio.to_thread(self.result_cache.get, key)
+        if cached is not None:
+            job.wins, job.trials = cached['wins'], cached['trials']
+            job.outcomes = OutcomeTally.from_dict(cached['outcomes'], experiment.starting_health)
+            job.done = True
+            self._retire(job)
+        else:
+            asyncio.get_running_loop().create_task(self._run(job, key))
+        return job
+
+
+    async def _run(self, job: Job, key: str) -> None:
+        """Plays every chunk of `job` on the pool, updating its estimate as each finishes."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        try:
+            for result in asyncio.as_completed([loop.run_in_executor(self.pool, play_chunk, chunk) for chunk in job.chunks]):
+                chunk, wins, tally = await result
+                job.wins += wins
+                job.trials += chunk.num_trials
+                job.outcomes.merge(tally)
+                if job.trials < sum(chunk.num_trials for chunk in job.chunks):
+                    job.update()
+
+            if self.result_cache is not None:
+                await asyncio.to_thread(self.result_cache.put, key, {'wins': job.wins, 'trials': job.trials,
+                                                                     'outcomes': job.outcomes.to_dict()})
+        except Exception as error:
+            job.error = f'{type(error).__name__}: {error}'
+            del self.jobs[job.job_id]
+        finally:
+            job.done = True
+            job.update()
+            if job.error is None:
+                self._retire(job)
+
+
+    def _retire(self, job: Job) -> None:
+        """Records that `job` finished, evicting the oldest finished jobs beyond `MAX_FINISHED_JOBS`."""
+        self._finished.append(job.job_id)
+        while len(self._finished) > MAX_FINISHED_JOBS:
+            self.jobs.pop(self._finished.popleft(), None)
+
+
+    async def _stream_job(self, job: Job, writer: asyncio.StreamWriter) -> None:
+        """Sends `job`'s estimate as a server-sent event every time it changes, until it is done."""
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     b'Connection: close\r\n\r\n')
+        while True:
+            changed: asyncio.Event = job.changed
+            snapshot: dict = job.snapshot()
+            event: str = 'progress' if not job.done else 'error' if job.error is not None else 'done'
+            writer.write(f'event: {event}\ndata: {json.dumps(snapshot)}\n\n'.encode())
+            await writer.drain()
+            if job.done:
+                return
+            await changed.wait()
+
+
+@lru_cache(maxsize=RESULT_CACHE_SIZE)
+def _read_experiment(path: Path, exp_num: int, mtime_ns: int) -> dict | None:
+    """
+    Reads experiment `exp_num` from a JSON experiment file or from the store
+    whose header is at `path`, or returns `None` if the store does not hold
+    it. `mtime_ns` only keys the cache.
+    """
+    if path.name != HEADER_NAME:
+        with open(path, 'r') as in_file:
+            return json.load(in_file)
+
+    store: ResultStore = ResultStore(path.parent)
+    if not 0 <= exp_num < len(store.params):
+        return None
+    return store.experiment_dict(exp_num)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    """Reads an HTTP request, returning its method, path and body."""
+    request_line: bytes = await reader.readline()
+    try:
+        method, path, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, 'Malformed request line.')
+
+    content_length: int = 0
+    while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            try:
+                content_length = int(value)
+            except ValueError:
+                raise HTTPError(400, 'Malformed Content-Length.')
+
+    if content_length > MAX_BODY_BYTES:
+        raise HTTPError(413, f'Request bodies are limited to {MAX_BODY_BYTES} bytes.')
+    body: bytes = await reader.readexactly(content_length) if content_length > 0 else b''
+    return method.upper(), path, body
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes) -> None:
+    """Writes a complete HTTP response."""
+    writer.write(f'HTTP/1.1 {status} {STATUS_REASONS[status]}\r\nContent-Type: {content_type}\r\n'
+                 f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# shells.py
+#
+# Seeded streams of shotgun loads shared by every pairing of an experiment
+# (common random numbers).
+import numpy as np
+
+from functools import lru_cache
+from rng import stream
+
+# Trials and loads per trial generated at once by a ShellStream
+BLOCK_TRIALS: int = 1 << 12
+BLOCK_LOADS: int = 8
+
+# Blocks a ShellStream keeps around after generating them
+MAX_BLOCKS: int = 16
+
+
+class ShellStream:
+    """
+    The loads of every trial of an experiment, addressed by (trial #, load #):
+    load `n` of trial `t` is the same bitmask (bit `i` set if the `i`th shell
+    fired is live) for every pairing that replays the stream, so differences
+    between pairings are not buried under differences in shell luck.
+
+    Loads are generated lazily in blocks of `BLOCK_TRIALS` trials by
+    `BLOCK_LOADS` loads, each seeded from the stream's seed and the block's
+    position alone, so any trial can be looked up without generating the ones
+    before it.
+
+    If `antithetic`, every odd trial replays the loads of the trial before it
+    with each load's shell order reversed.
+    """
+    def __init__(self, num_blanks: int, num_live: int, seed: int, antithetic: bool = False) -> None:
+        self._num_blanks: int = num_blanks
+        self._num_live: int = num_live
+        self._seed: int = seed
+        self._antithetic: bool = antithetic
+        self._blocks: dict[tuple[int, int], np.ndarray] = dict()
+
+
+    def _block(self, trial_block: int, load_block: int) -> np.ndarray:
+        """Returns (generating if needed) the block of loads at (`trial_block`, `load_block`)."""
+        key: tuple[int, int] = (trial_block, load_block)
+        if key not in self._blocks:
+            if len(self._blocks) >= MAX_BLOCKS:
+                del self._blocks[next(iter(self._blocks))]
+
+            rng: np.random.Generator = stream(self._seed, *key)
+            load_size: int = self._num_blanks + self._num_live
+            live: np.ndarray = np.argsort(rng.random((BLOCK_TRIALS, BLOCK_LOADS, load_size)), axis=2) < self._num_live
+            self._blocks[key] = live @ (np.int64(1) << np.arange(load_size, dtype=np.int64))
+
+        return self._blocks[key]
+
+
+    def loads(self, trials: np.ndarray, load_nums: np.ndarray) -> np.ndarray:
+        """Returns load `load_nums[i]` of trial `trials[i]` for every `i`, as bitmasks."""
+        trials = np.asarray(trials, dtype=np.int64)
+        load_nums = np.asarray(load_nums, dtype=np.int64)
+        sources: np.ndarray = trials & ~1 if self._antithetic else trials
+        result: np.ndarray = np.empty(trials.size, dtype=np.int64)
+
+        trial_blocks: np.ndarray = sources // BLOCK_TRIALS
+        load_blocks: np.ndarray = load_nums // BLOCK_LOADS
+        for trial_block, load_block in set(zip(trial_blocks.tolist(), load_blocks.tolist())):
+            in_block: np.ndarray = (trial_blocks == trial_block) & (load_blocks == load_block)
+            result[in_block] = self._block(trial_block, load_block)[sources[in_block] % BLOCK_TRIALS, load_nums[in_block] % BLOCK_LOADS]
+
+        if self._antithetic:
+            odd: np.ndarray = (trials & 1).astype(bool)
+            result[odd] = _reversed_loads(result[odd], self._num_blanks + self._num_live)
+
+        return result
+
+
+    def load(self, trial: int, load_num: int) -> int:
+        """Returns load `load_num` of trial `trial` as a bitmask."""
+        source: int = trial & ~1 if self._antithetic else trial
+        load: int = int(self._block(source // BLOCK_TRIALS, load_num // BLOCK_LOADS)[source % BLOCK_TRIALS, load_num % BLOCK_LOADS])
+
+        if self._antithetic and trial & 1:
+            load_size: int = self._num_blanks + self._num_live
+            return int(f'{load:0{load_size}b}'[::-1], 2)
+        return load
+
+
+@lru_cache(maxsize=4)
+def shell_stream(num_blanks: int, num_live: int, seed: int, antithetic: bool = False) -> ShellStream:
+    """
+    Returns the `ShellStream` with these parameters, reusing it (and the blocks
+    it has generated) for every pairing a process plays from it.
+    """
+    return ShellStream(num_blanks, num_live, seed, antithetic)
+
+
+def _reversed_loads(loads: np.ndarray, load_size: int) -> np.ndarray:
+    """Returns `loads` with the order of their `load_size` shells reversed."""
+    result: np.ndarray = np.zeros_like(loads)
+    for i in range(load_size):
+        result |= ((loads >> i) & 1) << (load_size - 1 - i)
+    return result
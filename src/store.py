@@ -0,0 +1,129 @@
+# store.py
+#
+# Reads and writes results as a compact binary store: NumPy tensors over
+# (experiment, stratagem, opponent) plus a small JSON header.
+import json
+import numpy as np
+import os
+
+from pathlib import Path
+from time import time_ns
+
+# Name of the header file that marks a folder as a result store
+HEADER_NAME: str = 'store.json'
+
+# Bump when the layout of the store changes
+STORE_VERSION: int = 2
+
+# Store versions that can still be read (version 1 kept its arrays under fixed names)
+READABLE_VERSIONS: tuple[int, ...] = (1, 2)
+
+
+def is_store(folder: Path) -> bool:
+    """Returns whether `folder` holds a result store."""
+    return (folder / HEADER_NAME).is_file()
+
+
+def write_store(folder: Path, names: list[str], params: list[dict], winrates: np.ndarray,
+                wins: np.ndarray, trials: np.ndarray, sources: dict[str, str] | None = None) -> None:
+    """
+    Writes a result store to `folder`.
+
+    Every write puts its arrays in new files (`[array]-[generation].npy`) and 
+    then atomically replaces the header that names them, so a crash leaves 
+    either the old store or the new one, never a mix. Arrays of earlier 
+    writes are deleted afterwards; readers that have them memory-mapped keep 
+    reading the old store.
+
+    :param list[str] names: The (lowercase) stratagem names, in axis order.
+    :param list[dict] params: The `params` of each experiment, in axis order.
+    :param np.ndarray winrates: Win rate of each stratagem against each opponent.
+    :param np.ndarray wins: Matches won by each stratagem against each opponent
+    (zero for exact experiments).
+    :param np.ndarray trials: Matches played by each pairing (zero for exact
+    experiments).
+    :param dict sources: Hash of each stratagem's source code, if known.
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    arrays: dict[str, np.ndarray] = {'winrates': winrates.astype(np.float64),
+                                     'wins': wins.astype(np.int64),
+                                     'trials': trials.astype(np.int64)}
+
+    generation: str = f'{time_ns():x}-{os.getpid()}'
+    files: dict[str, str] = dict()
+    for name, array in arrays.items():
+        if array.shape != (len(params), len(names), len(names)):
+            raise ValueError(f'Store array "{name}" has shape {array.shape}, expected {(len(params), len(names), len(names))}.')
+        files[name] = f'{name}-{generation}.npy'
+        with open(folder / files[name], 'wb') as out_file:
+            np.save(out_file, array)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+
+    # Header last, so the store only switches to the new arrays once they are complete
+    header: dict = {'version': STORE_VERSION, 'strats': names, 'params': params, 'sources': sources or dict(),
+                    'axes': ['experiment', 'strat', 'opponent'], 'arrays': files}
+    temp_path: Path = folder / f'{HEADER_NAME}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as out_file:
+        json.dump(header, out_file)
+        out_file.flush()
+        os.fsync(out_file.fileno())
+    os.replace(temp_path, folder / HEADER_NAME)
+
+    for path in folder.glob('*.npy'):
+        if path.name not in files.values():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+class ResultStore:
+    """
+    A result store opened through memory maps: slicing one experiment or one
+    stratagem's row only reads those pages from disk, not the whole sweep.
+    """
+    def __init__(self, folder: Path) -> None:
+        with open(folder / HEADER_NAME, 'r') as in_file:
+            header: dict = json.load(in_file)
+
+        if header['version'] not in READABLE_VERSIONS:
+            raise ValueError(f'Unsupported store version {header['version']} in "{folder}".')
+        files: dict[str, str] = header.get('arrays', {name: f'{name}.npy' for name in ('winrates', 'wins', 'trials')})
+
+        self.names: list[str] = header['strats']
+        self.params: list[dict] = header['params']
+        self.sources: dict[str, str] = header['sources']
+        self._indices: dict[str, int] = {name: index for index, name in enumerate(self.names)}
+
+        self.winrates: np.ndarray = np.load(folder / files['winrates'], mmap_mode='r')
+        self.wins: np.ndarray = np.load(folder / files['wins'], mmap_mode='r')
+        self.trials: np.ndarray = np.load(folder / files['trials'], mmap_mode='r')
+
+
+    def index(self, name: str) -> int:
+        """Returns the axis index of the stratagem named `name`."""
+        return self._indices[name.lower()]
+
+
+    def row(self, exp_num: int, name: str) -> np.ndarray:
+        """Returns the win rates of stratagem `name` against every opponent in an experiment."""
+        return np.asarray(self.winrates[exp_num, self.index(name)])
+
+
+    def experiment_dict(self, exp_num: int, names: list[str] | None = None) -> dict:
+        """
+        Returns an experiment in the same layout as the JSON experiment files
+        (`params` and `strats`, including `overall`), as floats. Only the rows
+        of stratagems in `names` are read, if given.
+        """
+        result_dict: dict = {'params': self.params[exp_num], 'strats': dict()}
+
+        for name in (self.names if names is None else [name.lower() for name in names]):
+            if name not in self._indices:
+                continue
+            row: np.ndarray = self.row(exp_num, name)
+            result_dict['strats'][name] = {opponent: float(win_rate) for opponent, win_rate in zip(self.names, row)}
+            result_dict['strats'][name]['overall'] = float(row.mean())
+
+        return result_dict
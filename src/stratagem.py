@@ -1,16 +1,40 @@
 # stratagem.py
 #
-# Defines stratagems to play the game.
+# Defines stratagems to play the game, and the registry every command line 
+# finds them through.
+import numpy as np
+
 from abc import ABC
 from enum import Enum
-from random import randint
 from dataclasses import dataclass
+from functools import lru_cache
+from optimal import solve
+from rng import BlockRandom, default_random
+
+# Columns of the state arrays passed to `Stratagem.get_moves`, in the order of GameState's fields
+STATE_FIELDS: tuple[str, ...] = ('blank_shells', 'live_shells', 'own_health', 'opp_health',
+                                 'load_blanks', 'load_lives', 'starting_health')
+
+# Registered stratagems by lowercase class name, in the order they were registered
+REGISTRY: dict[str, type['Stratagem']] = dict()
 
-@dataclass
+# Lowercase class names of registered stratagems, by every name and alias they answer to
+_ALIASES: dict[str, str] = dict()
+
+@dataclass(slots=True)
 class GameState:
-    """Represents the state of the game (bullets remaining, items, etc.)"""
+    """
+    Represents the state of the game (bullets remaining, items, etc.) from the 
+    point of view of the player about to move. The load and starting health 
+    describe the match being played, and are 0 when unknown.
+    """
     blank_shells: int
     live_shells: int
+    own_health: int = 0
+    opp_health: int = 0
+    load_blanks: int = 0
+    load_lives: int = 0
+    starting_health: int = 0
 
 
 class Outcome(Enum):
@@ -27,11 +51,117 @@ class Move(Enum):
 
 
 class Stratagem(ABC):
+    # Declared by `register`: other names the stratagem answers to, whether 
+    # it never flips coins, whether it keeps state between moves, and whether 
+    # its moves depend on either player's health. Unregistered stratagems 
+    # assume the least.
+    ALIASES: tuple[str, ...] = ()
+    DETERMINISTIC: bool = False
+    STATEFUL: bool = False
+    HP_AWARE: bool = True
+
+    def __init__(self, rng: BlockRandom | None = None) -> None:
+        """
+        :param BlockRandom rng: Where the stratagem draws its coin flips from 
+        (the process's shared `default_random()` if not given).
+        """
+        self.rng: BlockRandom = rng if rng is not None else default_random()
+
     def get_move(self, game_state: GameState) -> None | Move:
         """Returns the move to be made based on the current game state."""
         pass
 
+    def get_shoot_opp_probability(self, game_state: GameState) -> float:
+        """
+        Returns the probability that this stratagem shoots the opponent in the
+        current game state. Stratagems that flip coins should override this;
+        by default it is derived from a single call to `get_move`.
+        """
+        return 1.0 if self.get_move(game_state) == Move.SHOOT_OPP else 0.0
+
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        """
+        Returns the probability that this stratagem shoots the opponent in 
+        every row of `states`, an integer array of [state, field] with the 
+        fields of `GameState` in order (see `STATE_FIELDS`). Stateless 
+        stratagems should override this with a vectorized version; by default 
+        each row is passed to `get_shoot_opp_probability`.
+        """
+        return np.array([self.get_shoot_opp_probability(GameState(*(int(field) for field in row))) 
+                         for row in states], dtype=float)
+
+
+def register(*aliases: str, deterministic: bool = False, stateful: bool = False, hp_aware: bool = True):
+    """
+    Returns a class decorator adding a stratagem to `REGISTRY`, so that every 
+    command line can play it by its lowercase class name or any of `aliases`.
+
+    :param str aliases: Other names the stratagem answers to.
+    :param bool deterministic: Whether the stratagem never flips coins.
+    :param bool stateful: Whether the stratagem keeps state between moves. 
+    Stateful stratagems cannot be compiled into a policy, so only `Match` 
+    plays them, through `get_move` on a new instance every game.
+    :param bool hp_aware: Whether the stratagem's moves depend on either 
+    player's health.
+    """
+    def decorator(stratagem: type[Stratagem]) -> type[Stratagem]:
+        name: str = stratagem.__name__.lower()
+        keys: list[str] = [name] + [alias.lower() for alias in aliases]
+        for key in keys:
+            if key in _ALIASES:
+                raise ValueError(f'Stratagem name "{key}" is already registered to {REGISTRY[_ALIASES[key]].__name__}.')
+
+        stratagem.ALIASES = tuple(keys[1:])
+        stratagem.DETERMINISTIC = deterministic
+        stratagem.STATEFUL = stateful
+        stratagem.HP_AWARE = hp_aware
+        REGISTRY[name] = stratagem
+        for key in keys:
+            _ALIASES[key] = name
+        return stratagem
+    return decorator
+
+
+def lookup(name: str) -> type[Stratagem] | None:
+    """Returns the registered stratagem called `name` or one of its aliases (in any case), or None."""
+    key: str | None = _ALIASES.get(name.strip().lower())
+    return None if key is None else REGISTRY[key]
 
+
+def resolve(names: list[str]) -> list[type[Stratagem]]:
+    """
+    Returns the registered stratagems called `names` or their aliases (in 
+    any case), in order and without repeats, for parsing command lines.
+
+    :raises ValueError: If a name is not registered.
+    """
+    stratagems: list[type[Stratagem]] = list()
+    for name in names:
+        stratagem: type[Stratagem] | None = lookup(name)
+        if stratagem is None:
+            raise ValueError(f'Stratagem "{name}" not found.')
+        stratagems.append(stratagem)
+    return list(dict.fromkeys(stratagems))
+
+
+def shared(stratagem: type[Stratagem], rng: BlockRandom | None = None) -> Stratagem:
+    """
+    Returns an instance of `stratagem` to play with. Stateless stratagems are 
+    shared singletons, so engines need not build one per trial; stateful ones 
+    get a new instance drawing from `rng` every call.
+    """
+    if stratagem.STATEFUL:
+        return stratagem(rng)
+    return _singleton(stratagem)
+
+
+@lru_cache(maxsize=None)
+def _singleton(stratagem: type[Stratagem]) -> Stratagem:
+    """Returns the shared instance of a stateless stratagem."""
+    return stratagem()
+
+
+@register('g', 'greed', deterministic=True, hp_aware=False)
 class Greedy(Stratagem):
     """
     This player shoots the opponent if the shell in the chamber is more likely 
@@ -47,7 +177,11 @@ class Greedy(Stratagem):
         else:
             return Move.SHOOT_SELF
 
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return (states[:, 1] > states[:, 0]).astype(float)
+
 
+@register(deterministic=True, hp_aware=False)
 class Safe(Stratagem):
     """
     Like Greedy, this player shoots the opponent if the shell in 
@@ -62,8 +196,12 @@ class Safe(Stratagem):
             return Move.SHOOT_SELF
         else:
             return Move.SHOOT_OPP
+
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return (states[:, 1] >= states[:, 0]).astype(float)
         
 
+@register('b', hp_aware=False)
 class Balanced(Stratagem):
     """
     Like Greedy and Safe, this player shoots the opponent if the shell in the 
@@ -78,10 +216,22 @@ class Balanced(Stratagem):
         elif (game_state.live_shells < game_state.blank_shells):
             return Move.SHOOT_SELF
         else:
-            heads: bool = bool(randint(0 ,1))
+            heads: bool = self.rng.coin_flip()
             return Move.SHOOT_OPP if heads else Move.SHOOT_SELF
 
+    def get_shoot_opp_probability(self, game_state: GameState) -> float:
+        if (game_state.live_shells > game_state.blank_shells):
+            return 1.0
+        elif (game_state.live_shells < game_state.blank_shells):
+            return 0.0
+        else:
+            return 0.5
 
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return np.sign(states[:, 1] - states[:, 0]) * 0.5 + 0.5
+
+
+@register('rand', hp_aware=False)
 class Random(Stratagem):
     """
     This player will flip a coin and shoot the opponent if the coin lands on 
@@ -89,10 +239,17 @@ class Random(Stratagem):
     """
 
     def get_move(self, game_state: GameState) -> Move:
-        heads: bool = bool(randint(0, 1))
+        heads: bool = self.rng.coin_flip()
         return Move.SHOOT_OPP if heads else Move.SHOOT_SELF
 
+    def get_shoot_opp_probability(self, _: GameState) -> float:
+        return 0.5
+
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return np.full(len(states), 0.5)
 
+
+@register(deterministic=True, hp_aware=False)
 class Reckless(Stratagem):
     """
     Opposite of Scared. This player will always shoot itself until it is sure that the gun only 
@@ -104,7 +261,11 @@ class Reckless(Stratagem):
             return Move.SHOOT_SELF
         return Move.SHOOT_OPP
 
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return (states[:, 0] == 0).astype(float)
+
 
+@register(deterministic=True, hp_aware=False)
 class Scared(Stratagem):
     """
     Opposite of Reckless. This player will always shoot the opponent until it is sure that the gun 
@@ -116,7 +277,43 @@ class Scared(Stratagem):
             return Move.SHOOT_OPP
         return Move.SHOOT_SELF
 
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return (states[:, 1] > 0).astype(float)
+
+
+@register(deterministic=True, hp_aware=True)
+class Conservative(Stratagem):
+    """
+    Plays the same as Safe until brought down to 1 HP. Then, it plays like 
+    Scared. A foil of Overzealous.
+    """
 
+    def get_move(self, game_state: GameState) -> Move:
+        if (game_state.own_health == 1):
+            return Move.SHOOT_OPP if game_state.live_shells > 0 else Move.SHOOT_SELF
+        return Move.SHOOT_OPP if game_state.live_shells >= game_state.blank_shells else Move.SHOOT_SELF
+
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return np.where(states[:, 2] == 1, states[:, 1] > 0, states[:, 1] >= states[:, 0]).astype(float)
+
+
+@register(deterministic=True, hp_aware=True)
+class Overzealous(Stratagem):
+    """
+    Plays the same as Reckless until brought down to 1 HP. Then, it plays 
+    like Scared. A foil of Conservative.
+    """
+
+    def get_move(self, game_state: GameState) -> Move:
+        if (game_state.own_health == 1):
+            return Move.SHOOT_OPP if game_state.live_shells > 0 else Move.SHOOT_SELF
+        return Move.SHOOT_OPP if game_state.blank_shells == 0 else Move.SHOOT_SELF
+
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return np.where(states[:, 2] == 1, states[:, 1] > 0, states[:, 0] == 0).astype(float)
+
+
+@register('trigger', deterministic=True, hp_aware=False)
 class TriggerHappy(Stratagem):
     """
     Always shoots the opponent.
@@ -125,11 +322,53 @@ class TriggerHappy(Stratagem):
     def get_move(self, _: GameState) -> Move:
         return Move.SHOOT_OPP
 
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return np.ones(len(states))
+
 
+@register('suicide', deterministic=True, hp_aware=False)
 class Suicidal(Stratagem):
     """
     Always shoots itself.
     """
 
     def get_move(self, _: GameState) -> Move:
-        return Move.SHOOT_SELF
\ No newline at end of file
+        return Move.SHOOT_SELF
+
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        return np.zeros(len(states))
+
+
+@register(deterministic=True, hp_aware=True)
+class Optimal(Stratagem):
+    """
+    Plays perfectly against a perfect opponent: every move maximizes its 
+    chance of winning, assuming the opponent does the same. Decisions are 
+    looked up from the game solved by backward induction (see `optimal.solve`), 
+    so the game state must describe the load and starting health.
+    """
+
+    def get_move(self, game_state: GameState) -> Move:
+        if game_state.load_lives == 0:
+            raise ValueError('Optimal needs the load and starting health of the match in the game state.')
+
+        policy, _ = solve(game_state.load_blanks, game_state.load_lives, game_state.starting_health)
+        shoot_opp: float = policy[game_state.blank_shells, game_state.live_shells, 
+                                  game_state.own_health, game_state.opp_health]
+        return Move.SHOOT_OPP if shoot_opp else Move.SHOOT_SELF
+
+    def get_moves(self, states: np.ndarray) -> np.ndarray:
+        if np.any(states[:, 5] == 0):
+            raise ValueError('Optimal needs the load and starting health of the match in the game state.')
+
+        if np.all(states[:, 4:] == states[0, 4:]):
+            policy, _ = solve(*(int(field) for field in states[0, 4:]))
+            return policy[tuple(states[:, :4].T)]
+
+        moves: np.ndarray = np.empty(len(states))
+        loads, load_of_state = np.unique(states[:, 4:], axis=0, return_inverse=True)
+        for load_num, load in enumerate(loads):
+            rows: np.ndarray = load_of_state.reshape(-1) == load_num
+            policy, _ = solve(*(int(field) for field in load))
+            moves[rows] = policy[tuple(states[rows, :4].T)]
+        return moves
@@ -0,0 +1,310 @@
+# sweep.py
+#
+# Runs resumable parameter sweeps over blanks, lives and starting health.
+import argparse
+import json
+import numpy as np
+import os
+
+from cache import stratagem_digest
+from hashlib import sha256
+from contextlib import nullcontext
+from datetime import datetime
+from game import ExactMatch
+from gather_data import CHUNK_SIZE, NUM_TRIALS, OUT_DIRECTORY, SEED, STRATAGEMS
+from itertools import combinations_with_replacement, product
+from multiprocessing.pool import Pool
+from pathlib import Path
+from results import empty_store_arrays, fill_store_arrays
+from store import write_store
+from stratagem import Stratagem, lookup, resolve, shared
+from time import time
+from tqdm import tqdm
+from trials import Experiment, make_chunks, play_chunk, root_seed
+
+# Name of the file describing a sweep's grid and settings
+SPEC_NAME: str = 'sweep.json'
+
+# Name of the append-only file of finished pairings
+CHECKPOINT_NAME: str = 'checkpoint.jsonl'
+
+parser = argparse.ArgumentParser(
+    prog="SweepBuckshotData",
+    description="Sweeps Buckshot Roulette experiments over ranges of blanks, lives and health, "
+                "checkpointing every finished pairing so the sweep can be resumed."
+)
+
+parser.add_argument('-b', '--blanks', type=int, nargs='+', default=[1, 4], metavar='N',
+                    help='blanks per load: VALUE, MIN MAX or MIN MAX STEP (inclusive, default 1 4)')
+parser.add_argument('-l', '--lives', type=int, nargs='+', default=[1, 4], metavar='N',
+                    help='lives per load: VALUE, MIN MAX or MIN MAX STEP (inclusive, default 1 4)')
+parser.add_argument('-hp', '--health', type=int, nargs='+', default=[1, 5], metavar='N',
+                    help='starting health: VALUE, MIN MAX or MIN MAX STEP (inclusive, default 1 5)')
+parser.add_argument('-s', '--strats', nargs='+', metavar='STRATEGY',
+                    help='stratagems to sweep (default all)')
+parser.add_argument('-t', '--trials', type=int, default=NUM_TRIALS, help=f'trials per pairing (default {NUM_TRIALS})')
+parser.add_argument('-e', '--engine', choices=('batch', 'fast', 'match'), default='batch',
+                    help='simulate games in NumPy batches (default), on one reused Match with its fast path, '
+                         'or on a new Match per trial')
+parser.add_argument('--shells', choices=('independent', 'common', 'antithetic'), default='independent',
+                    help='shuffle every trial\'s loads independently (default), replay the same loads for trial N of every '
+                         'pairing in a grid cell, or also pair each trial with one whose loads are reversed')
+parser.add_argument('--seed', type=int, help='root seed of every random stream (default SEED in gather_data.py)')
+parser.add_argument('-x', '--exact', action='store_true',
+                    help='compute exact win probabilities instead of simulating trials')
+parser.add_argument('-j', '--workers', type=int, default=1,
+                    help='number of worker processes to play trial chunks on (default 1)')
+parser.add_argument('-r', '--resume', metavar='FOLDER',
+                    help='resume the sweep in FOLDER where it stopped (other options are read from it)')
+
+
+def main() -> None:
+    """
+    Runs (or resumes) a sweep and writes it as a binary store.
+
+    A new sweep is written to `./data/sweeps/[year-month-day]-[hours-minutes]`
+    (with `-2`, `-3`, ... appended if that folder already exists).
+    Every pairing is appended to the folder's checkpoint as soon as all of its
+    trials finish, so a killed sweep resumed with `--resume` only replays the
+    pairings that were in flight.
+    """
+    args = parser.parse_args()
+
+    if args.resume:
+        folder: Path = Path(args.resume)
+        with open(folder / SPEC_NAME, 'r') as in_file:
+            spec: dict = json.load(in_file)
+    else:
+        stamp: str = datetime.fromtimestamp(time()).strftime('%Y-%m-%d-%H-%M')
+        try:
+            spec: dict = _make_spec(args)
+        except ValueError as error:
+            parser.error(str(error))
+        folder: Path = _new_folder(Path(f'{OUT_DIRECTORY}sweeps/{stamp}'))
+        with open(folder / SPEC_NAME, 'w') as out_file:
+            json.dump(spec, out_file)
+
+    run_sweep(folder, spec, args.workers)
+
+
+def _make_spec(args: argparse.Namespace) -> dict:
+    """
+    Returns the spec of a new sweep from the command line `args`. Raises a
+    ValueError if a range is malformed or reaches a load without a live shell,
+    a negative number of blanks or no starting health, as games of such cells
+    would never end.
+    """
+    stratagems: list[type[Stratagem]] = STRATAGEMS if args.strats is None else resolve(args.strats)
+    names: list[str] = [stratagem.__name__.lower() for stratagem in stratagems]
+
+    experiments: list[dict] = [{'num_blanks': blanks, 'num_lives': lives, 'starting_health': health}
+                               for blanks, lives, health in product(_expand_range(args.blanks, 'blanks'), _expand_range(args.lives, 'lives'),
+                                                                    _expand_range(args.health, 'health'))]
+    _check_experiments(experiments)
+
+    return {'experiments': experiments,
+            'strats': names,
+            'sources': {stratagem.__name__.lower(): stratagem_digest(stratagem) for stratagem in stratagems},
+            'trials': 0 if args.exact else args.trials,
+            'exact': args.exact,
+            'engine': args.engine,
+            'shells': args.shells,
+            'seed': root_seed(args.seed, SEED)}
+
+
+def _new_folder(folder: Path) -> Path:
+    """
+    Creates and returns `folder`, or `folder` with the first free suffix 
+    (`-2`, `-3`, ...) if it already exists, so a new sweep never shares a 
+    folder (and checkpoint) with another.
+    """
+    folder.parent.mkdir(parents=True, exist_ok=True)
+    candidate: Path = folder
+    suffix: int = 1
+    while True:
+        try:
+            candidate.mkdir()
+            return candidate
+        except FileExistsError:
+            suffix += 1
+            candidate = folder.with_name(f'{folder.name}-{suffix}')
+
+
+def spec_digest(spec: dict) -> str:
+    """Returns a hash of a sweep's spec, written at the top of its checkpoint."""
+    return sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def _expand_range(values: list[int], name: str) -> list[int]:
+    """Expands the `name` range `VALUE`, `MIN MAX` or `MIN MAX STEP` (inclusive) into a non-empty list of values."""
+    if len(values) not in (1, 2, 3):
+        raise ValueError(f'Expected VALUE, MIN MAX or MIN MAX STEP for {name}, got {values}.')
+    if len(values) == 1:
+        return values
+
+    step: int = values[2] if len(values) == 3 else 1
+    if step < 1:
+        raise ValueError(f'The step of the {name} range must be at least 1, got {step}.')
+    if values[1] < values[0]:
+        raise ValueError(f'The {name} range {values[0]} to {values[1]} is empty.')
+    return list(range(values[0], values[1] + 1, step))
+
+
+def _check_experiments(experiments: list[dict]) -> None:
+    """Raises a ValueError if any cell of a sweep has no live shells, negative blanks or no starting health."""
+    for experiment in experiments:
+        if experiment['num_lives'] < 1 or experiment['num_blanks'] < 0 or experiment['starting_health'] < 1:
+            raise ValueError(f'Every cell needs at least 1 live shell, 0 blanks and 1 health, got {experiment["num_lives"]} '
+                             f'lives, {experiment["num_blanks"]} blanks and {experiment["starting_health"]} health.')
+
+
+def read_checkpoint(folder: Path, digest: str | None = None) -> dict[tuple[int, int], dict]:
+    """
+    Returns the finished pairings recorded in `folder`'s checkpoint, keyed by
+    (experiment #, pairing #). A line torn by a crash mid-write is ignored.
+
+    :param str digest: If given, the `spec_digest` the checkpoint must have 
+    been started with; a checkpoint of any other sweep raises a ValueError.
+    """
+    finished: dict[tuple[int, int], dict] = dict()
+    path: Path = folder / CHECKPOINT_NAME
+    if not path.is_file():
+        return finished
+
+    checkpoint_digest: str | None = None
+    with open(path, 'r') as in_file:
+        for line in in_file:
+            try:
+                record: dict = json.loads(line)
+            except ValueError:
+                continue
+            if 'spec' in record:
+                checkpoint_digest = record['spec']
+            else:
+                finished[(record['exp'], record['pair'])] = record
+
+    if digest is not None and checkpoint_digest != digest and (checkpoint_digest is not None or finished):
+        raise ValueError(f'The checkpoint in "{folder}" belongs to a different sweep; start a new sweep.')
+    return finished
+
+
+def _open_checkpoint(folder: Path, digest: str):
+    """
+    Opens `folder`'s checkpoint for appending. A line torn by a crash 
+    mid-write is cut off first, so the next record starts on its own line, 
+    and an empty checkpoint is started with the spec's digest.
+    """
+    path: Path = folder / CHECKPOINT_NAME
+    path.touch()
+    with open(path, 'rb+') as repair:
+        end: int = repair.read().rfind(b'\n') + 1
+        repair.truncate(end)
+
+    checkpoint = open(path, 'a')
+    if end == 0:
+        checkpoint.write(json.dumps({'spec': digest}) + '\n')
+    return checkpoint
+
+
+def run_sweep(folder: Path, spec: dict, workers: int = 1) -> None:
+    """
+    Plays every pairing of the sweep described by `spec` that is not yet in
+    `folder`'s checkpoint, then writes the whole sweep to `folder` as a binary
+    store.
+
+    :param Path folder: The sweep's folder.
+    :param dict spec: The sweep's grid and settings (see `_make_spec`).
+    :param int workers: Number of worker processes to play trial chunks on.
+    """
+    for name, digest in spec['sources'].items():
+        if lookup(name) is None or stratagem_digest(lookup(name)) != digest:
+            raise ValueError(f'Stratagem "{name}" is missing or has changed since the sweep started; start a new sweep.')
+    _check_experiments(spec['experiments'])
+
+    experiments: list[Experiment] = [Experiment(**experiment) for experiment in spec['experiments']]
+    match_pairs: list[tuple[type[Stratagem], type[Stratagem]]] = list(combinations_with_replacement([lookup(name) for name in spec['strats']], 2))
+
+    digest: str = spec_digest(spec)
+    finished: dict[tuple[int, int], dict] = read_checkpoint(folder, digest)
+    remaining: list[tuple[int, int]] = [(exp_num, pair_num) for exp_num in range(len(experiments))
+                                        for pair_num in range(len(match_pairs)) if (exp_num, pair_num) not in finished]
+
+    with _open_checkpoint(folder, digest) as checkpoint:
+        def record(key: tuple[int, int], result: dict) -> None:
+            finished[key] = {'exp': key[0], 'pair': key[1], **result}
+            checkpoint.write(json.dumps(finished[key]) + '\n')
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+        if spec['exact']:
+            for exp_num, pair_num in tqdm(remaining, 'Pairings', initial=len(finished), total=len(finished) + len(remaining)):
+                experiment: Experiment = experiments[exp_num]
+                strat_one, strat_two = match_pairs[pair_num]
+                record((exp_num, pair_num), {'winrate': ExactMatch(experiment.num_blanks, experiment.num_lives, experiment.starting_health,
+                                                                   shared(strat_one), shared(strat_two)).win_probability()})
+        else:
+            _run_sampled(experiments, match_pairs, remaining, spec, workers, record, len(finished))
+
+    _write_sweep_store(folder, spec, experiments, match_pairs, finished)
+
+
+def _run_sampled(experiments: list[Experiment], match_pairs: list[tuple[type[Stratagem], type[Stratagem]]],
+                 remaining: list[tuple[int, int]], spec: dict, workers: int, record, num_finished: int) -> None:
+    """
+    Plays the trial chunks of every pairing in `remaining`, calling
+    `record(key, result)` as soon as all of a pairing's chunks are in. Chunks
+    are generated lazily, so huge sweeps do not build every job up front.
+    """
+    num_trials: int = spec['trials']
+    wins: dict[tuple[int, int], int] = dict()
+    trials: dict[tuple[int, int], int] = dict()
+    chunks = (chunk for key in remaining
+              for chunk in make_chunks(experiments, match_pairs, [key], num_trials, CHUNK_SIZE, spec['engine'], spec['seed'],
+                                              spec.get('shells', 'independent')))
+
+    with Pool(workers) if workers > 1 else nullcontext() as pool, \
+         tqdm(desc='Trials', unit='game', unit_scale=True, initial=num_finished * num_trials,
+              total=(num_finished + len(remaining)) * num_trials) as progress:
+        results = map(play_chunk, chunks) if pool is None else pool.imap_unordered(play_chunk, chunks)
+
+        for chunk, chunk_wins, _ in results:
+            key: tuple[int, int] = (chunk.exp_num, chunk.pair_num)
+            wins[key] = wins.get(key, 0) + chunk_wins
+            trials[key] = trials.get(key, 0) + chunk.num_trials
+            progress.update(chunk.num_trials)
+
+            if trials[key] == num_trials:
+                record(key, {'wins': wins.pop(key), 'trials': trials.pop(key)})
+
+
+def _write_sweep_store(folder: Path, spec: dict, experiments: list[Experiment],
+                       match_pairs: list[tuple[type[Stratagem], type[Stratagem]]], finished: dict[tuple[int, int], dict]) -> None:
+    """Writes every finished pairing of a sweep to `folder` as a binary store."""
+    pairings: list[tuple[int, int]] = list(finished)
+    win_percentages: dict[tuple[int, int], float] = dict()
+    wins: dict[tuple[int, int], int] = dict()
+    trials: dict[tuple[int, int], int] = dict()
+
+    for key, result in finished.items():
+        if 'winrate' in result:
+            win_percentages[key] = result['winrate']
+        else:
+            wins[key], trials[key] = result['wins'], result['trials']
+            win_percentages[key] = result['wins'] / result['trials']
+
+    arrays: tuple[np.ndarray, np.ndarray, np.ndarray] = empty_store_arrays(len(experiments), len(spec['strats']))
+    fill_store_arrays(arrays, spec['strats'], match_pairs, pairings, win_percentages, wins, trials)
+
+    params: list[dict] = [{'blanks': experiment.num_blanks,
+                           'lives': experiment.num_lives,
+                           'health': experiment.starting_health,
+                           'trials': spec['trials'],
+                           'exact': spec['exact'],
+                           'precision': None,
+                           'shells': None if spec['exact'] else spec.get('shells', 'independent'),
+                           'seed': None if spec['exact'] else spec['seed']} for experiment in experiments]
+    write_store(folder, spec['strats'], params, *arrays, sources=spec['sources'])
+
+
+if __name__ == '__main__':
+    main()
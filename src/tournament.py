@@ -0,0 +1,291 @@
+# tournament.py
+#
+# Ranks large pools of stratagems with Bradley-Terry ratings, scheduling games
+# between closely rated stratagems instead of playing every pairing.
+import argparse
+import importlib.util
+import json
+import numpy as np
+import sys
+
+from cache import stratagem_digest
+from contextlib import nullcontext
+from datetime import datetime
+from gather_data import OUT_DIRECTORY, SEED, STRATAGEMS
+from inspect import getmembers, isclass
+from math import log
+from multiprocessing.pool import Pool
+from pathlib import Path
+from stratagem import Stratagem, resolve
+from time import time
+from tqdm import tqdm
+from trials import Experiment, TrialChunk, chunk_seed, chunk_shells, play_chunk, root_seed
+
+# Elo points per unit of Bradley-Terry strength (a 400 point lead is 10:1 odds)
+ELO_SCALE: float = 400 / log(10)
+
+# Elo rating of the average stratagem
+BASE_RATING: float = 1500.0
+
+# Standard deviation (in Elo) of the prior on every rating, which keeps the
+# ratings of stratagems that never win or never lose finite
+PRIOR_SD: float = 400.0
+
+# Random opponents every stratagem plays before ratings are used to schedule
+INITIAL_OPPONENTS: int = 4
+
+# Stratagems either side in the rankings each stratagem may be scheduled against
+NEIGHBOURS: int = 8
+
+# Pairs whose favourite wins with at least this probability (even at the edge
+# of the ratings' 95% confidence interval) are never scheduled
+PRUNE_PROBABILITY: float = 0.99
+
+parser = argparse.ArgumentParser(
+    prog="RankBuckshotStratagems",
+    description="Ranks a pool of stratagems for one load and starting health with Bradley-Terry (Elo) ratings, "
+                "playing more games between closely rated stratagems and skipping clear mismatches."
+)
+
+parser.add_argument('-b', '--blanks', type=int, default=4, help='blanks per load (default 4)')
+parser.add_argument('-l', '--lives', type=int, default=4, help='lives per load (default 4)')
+parser.add_argument('-hp', '--health', type=int, default=3, help='starting health (default 3)')
+parser.add_argument('-s', '--strats', nargs='+', metavar='STRATEGY',
+                    help='stratagems of stratagem.py to rank (default every stratagem)')
+parser.add_argument('-i', '--include', nargs='+', default=[], metavar='PATH',
+                    help='also rank every stratagem defined in these Python files, or in the .py files of these '
+                         'folders (e.g. stratagems exported by search.py)')
+parser.add_argument('-g', '--games', type=int, default=256,
+                    help='games per scheduled pairing per round, split evenly between seats (default 256)')
+parser.add_argument('-n', '--rounds', type=int, default=50, help='most rounds to schedule (default 50)')
+parser.add_argument('-t', '--target', type=float, default=15.0,
+                    help='stop once every rating\'s standard error is below this many Elo points (default 15)')
+parser.add_argument('-e', '--engine', choices=('batch', 'fast', 'match'), default='batch',
+                    help='simulator that plays each pairing (default batch)')
+parser.add_argument('--shells', choices=('independent', 'common', 'antithetic'), default='independent',
+                    help='how shell sequences are shared between pairings (default independent)')
+parser.add_argument('--seed', type=int, help='root seed of every random stream (default SEED in gather_data.py)')
+parser.add_argument('-j', '--workers', type=int, default=1,
+                    help='number of worker processes to play pairings in (default 1)')
+
+
+def main() -> None:
+    """
+    Runs a tournament and writes its ratings to
+    `./data/tournaments/[year-month-day]-[hours-minutes].json`, best first.
+    """
+    args = parser.parse_args()
+
+    pool: list[type[Stratagem]] = (STRATAGEMS if args.strats is None else resolve(args.strats)) + load_stratagems(args.include)
+    if len(set(stratagem.__name__ for stratagem in pool)) < len(pool):
+        raise ValueError('Every stratagem in a tournament needs a unique name.')
+
+    tournament: Tournament = Tournament(pool, Experiment(args.blanks, args.lives, args.health),
+                                        args.games, args.engine, args.shells, root_seed(args.seed, SEED))
+
+    start: float = time()
+    with Pool(args.workers) if args.workers > 1 else nullcontext() as workers:
+        tournament.run(args.rounds, args.target, workers)
+    elapsed: float = time() - start
+
+    results: list[dict] = tournament.results()
+    print(f'Ranked {len(pool)} stratagems with {tournament.total_games()} games '
+          f'over {tournament.rounds_played} rounds in {elapsed:.1f}s')
+    for rank, result in enumerate(results[:20], 1):
+        print(f'{rank:>4}. {result["name"]:<24} {result["rating"]:7.1f} ± {result["stderr"]:5.1f} '
+              f'({result["games"]} games)')
+
+    stamp: str = datetime.fromtimestamp(start).strftime('%Y-%m-%d-%H-%M')
+    out_path: Path = Path(f'{OUT_DIRECTORY}tournaments/{stamp}.json')
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, 'w') as out_file:
+        json.dump({'params': {'blanks': args.blanks, 'lives': args.lives, 'health': args.health,
+                              'games': args.games, 'engine': args.engine, 'shells': args.shells,
+                              'seed': tournament.seed, 'rounds': tournament.rounds_played},
+                   'ratings': results,
+                   'sources': {stratagem.__name__.lower(): stratagem_digest(stratagem) for stratagem in pool}},
+                  out_file, indent=4)
+    print(f'Wrote ratings to "{out_path}"')
+
+
+def load_stratagems(paths: list[str]) -> list[type[Stratagem]]:
+    """
+    Returns every `Stratagem` subclass defined in the Python files at `paths`
+    (or in the .py files of folders at `paths`), in file and then name order.
+    Each file is imported as a module named `included_[file name]`, so worker
+    processes forked afterwards can unpickle its stratagems.
+    """
+    stratagems: list[type[Stratagem]] = list()
+
+    for path in map(Path, paths):
+        for file in sorted(path.glob('*.py')) if path.is_dir() else [path]:
+            module_name: str = f'included_{file.stem}'
+            spec = importlib.util.spec_from_file_location(module_name, file)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+
+            stratagems += [stratagem for _, stratagem in getmembers(module, isclass)
+                           if issubclass(stratagem, Stratagem) and stratagem.__module__ == module_name]
+
+    return stratagems
+
+
+class Tournament:
+    """
+    Rates a pool of stratagems by the Bradley-Terry model, in which
+    stratagem `i` beats stratagem `j` with probability
+    `1 / (1 + exp(strength[j] - strength[i]))`, reported on the Elo scale.
+
+    Every stratagem first plays `INITIAL_OPPONENTS` random opponents. Each
+    later round refits the ratings and schedules, among pairs of stratagems
+    at most `NEIGHBOURS` apart in the rankings, the pairs whose result is
+    most uncertain and most informative, skipping pairs that are clearly
+    mismatched (see `PRUNE_PROBABILITY`). A pool of `N` stratagems is ranked
+    with O(N) pairings per round instead of the O(N²) of a full matrix.
+    """
+    def __init__(self, pool: list[type[Stratagem]], experiment: Experiment, games_per_pair: int,
+                 engine: str = 'batch', shells: str = 'independent', seed: int = 0) -> None:
+        self.pool: list[type[Stratagem]] = pool
+        self.experiment: Experiment = experiment
+        self.games_per_pair: int = games_per_pair
+        self.engine: str = engine
+        self.seed: int = seed
+        self.rounds_played: int = 0
+        self._shell_seed, self._antithetic = chunk_shells(seed, experiment, shells)
+        self._rng: np.random.Generator = np.random.default_rng(seed)
+
+        # Games won by stratagem i against stratagem j (in either seat), and games between them
+        self.wins: np.ndarray = np.zeros((len(pool), len(pool)), dtype=np.int64)
+        self.games: np.ndarray = np.zeros((len(pool), len(pool)), dtype=np.int64)
+
+
+    def run(self, rounds: int, target: float, workers: Pool | None = None) -> None:
+        """
+        Plays up to `rounds` rounds, stopping early once every rating's
+        standard error is below `target` Elo points or no pair is left worth
+        scheduling.
+        """
+        with tqdm(range(rounds), desc='Rounds') as progress:
+            for _ in progress:
+                pairs: list[tuple[int, int]] = self.schedule()
+                if not pairs:
+                    break
+
+                self.play(pairs, workers)
+                _, stderr = self.ratings()
+                progress.set_postfix(pairs=len(pairs), stderr=f'{stderr.max():.1f}')
+                if stderr.max() < target:
+                    break
+
+
+    def schedule(self) -> list[tuple[int, int]]:
+        """Returns the pairs (i, j) of stratagems to play in the next round."""
+        num_strats: int = len(self.pool)
+        if self.rounds_played == 0:
+            pairs: set[tuple[int, int]] = set()
+            for _ in range(INITIAL_OPPONENTS):
+                order: np.ndarray = self._rng.permutation(num_strats)
+                pairs.update((int(min(i, j)), int(max(i, j))) for i, j in zip(order[0::2], order[1::2]))
+            return sorted(pairs)
+
+        strength, covariance = self._fit()
+        order: np.ndarray = np.argsort(-strength)
+        first: list[int] = list()
+        second: list[int] = list()
+        for offset in range(1, NEIGHBOURS + 1):
+            first += order[:-offset].tolist()
+            second += order[offset:].tolist()
+        first_ids: np.ndarray = np.array(first, dtype=np.int64)
+        second_ids: np.ndarray = np.array(second, dtype=np.int64)
+
+        # Outcome and uncertainty of the difference in strength of each candidate pair
+        difference: np.ndarray = np.abs(strength[first_ids] - strength[second_ids])
+        variance: np.ndarray = (covariance[first_ids, first_ids] + covariance[second_ids, second_ids]
+                                - 2 * covariance[first_ids, second_ids])
+        win_probability: np.ndarray = 1 / (1 + np.exp(-difference))
+
+        mismatched: np.ndarray = difference - 2 * np.sqrt(variance) > log(PRUNE_PROBABILITY / (1 - PRUNE_PROBABILITY))
+        priority: np.ndarray = np.where(mismatched, -1.0, win_probability * (1 - win_probability) * variance)
+
+        # Play the most informative pairs, as many pairs as there are stratagems
+        chosen: np.ndarray = np.argsort(-priority, kind='stable')[:num_strats]
+        chosen = chosen[priority[chosen] > 0]
+        return [(int(min(first_ids[k], second_ids[k])), int(max(first_ids[k], second_ids[k]))) for k in chosen]
+
+
+    def play(self, pairs: list[tuple[int, int]], workers: Pool | None = None) -> None:
+        """Plays `games_per_pair` games of every pair, half with each stratagem moving first."""
+        chunks: list[TrialChunk] = list()
+        num_strats: int = len(self.pool)
+        for i, j in pairs:
+            for one, two, num_games in ((i, j, self.games_per_pair // 2), (j, i, self.games_per_pair - self.games_per_pair // 2)):
+                strat_one, strat_two = self.pool[one], self.pool[two]
+                chunks.append(TrialChunk(0, one * num_strats + two, self.experiment, strat_one, strat_two, num_games,
+                                         self.engine, chunk_seed(self.seed, self.experiment, strat_one, strat_two, self.rounds_played),
+                                         self.rounds_played * self.games_per_pair, self._shell_seed, self._antithetic))
+
+        results = map(play_chunk, chunks) if workers is None else workers.imap_unordered(play_chunk, chunks, chunksize=8)
+        for chunk, chunk_wins, _ in results:
+            one, two = divmod(chunk.pair_num, num_strats)
+            self.wins[one, two] += chunk_wins
+            self.wins[two, one] += chunk.num_trials - chunk_wins
+            self.games[one, two] += chunk.num_trials
+            self.games[two, one] += chunk.num_trials
+
+        self.rounds_played += 1
+
+
+    def _fit(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the maximum a posteriori strengths of every stratagem (with a
+        normal prior of `PRIOR_SD` Elo) and their covariance, by Newton's
+        method on the Bradley-Terry likelihood.
+        """
+        num_strats: int = len(self.pool)
+        strength: np.ndarray = np.zeros(num_strats)
+        prior: float = (ELO_SCALE / PRIOR_SD) ** 2
+        total_wins: np.ndarray = self.wins.sum(axis=1)
+
+        for _ in range(100):
+            probability: np.ndarray = 1 / (1 + np.exp(strength[np.newaxis, :] - strength[:, np.newaxis]))
+            gradient: np.ndarray = total_wins - (self.games * probability).sum(axis=1) - prior * strength
+            information: np.ndarray = self.games * probability * (1 - probability)
+            hessian: np.ndarray = np.diag(information.sum(axis=1) + prior) - information
+            step: np.ndarray = np.linalg.solve(hessian, gradient)
+            strength += step
+            if np.abs(step).max() < 1e-9:
+                break
+
+        return strength, np.linalg.inv(hessian)
+
+
+    def ratings(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns every stratagem's Elo rating and its standard error. Ratings
+        are relative to the pool's average, so the errors are too.
+        """
+        strength, covariance = self._fit()
+        centering: np.ndarray = np.eye(len(strength)) - 1 / len(strength)
+        variance: np.ndarray = np.diag(centering @ covariance @ centering)
+        return BASE_RATING + ELO_SCALE * (strength - strength.mean()), ELO_SCALE * np.sqrt(variance)
+
+
+    def total_games(self) -> int:
+        """Returns the number of games played so far."""
+        return int(self.games.sum() // 2)
+
+
+    def results(self) -> list[dict]:
+        """Returns every stratagem's rating, standard error, games and wins, best rated first."""
+        rating, stderr = self.ratings()
+        return [{'name': self.pool[i].__name__.lower(),
+                 'rating': float(rating[i]),
+                 'stderr': float(stderr[i]),
+                 'games': int(self.games[i].sum()),
+                 'wins': int(self.wins[i].sum()),
+                 'opponents': int(np.count_nonzero(self.games[i]))} for i in np.argsort(-rating)]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# trials.py
+#
+# Splits pairings into seeded chunks of trials and plays them, for every
+# command line that samples games (gather_data, sweep, tournament,
+# distribute and server).
+import numpy as np
+import stratagem as strat
+
+from contextlib import nullcontext
+from dataclasses import dataclass
+from game import BatchMatch, Match
+from gamelog import GameLogWriter
+from math import sqrt
+from zlib import crc32
+from outcomes import OutcomeTally
+from pathlib import Path
+from rng import BlockRandom, stream_seed
+from shells import ShellStream, shell_stream
+
+# Z-score of the confidence intervals reported for win rates (95%)
+CONFIDENCE_Z: float = 1.96
+
+@dataclass
+class Experiment:
+    num_blanks: int
+    num_lives: int
+    starting_health: int
+
+
+@dataclass
+class TrialChunk:
+    """A chunk of trials of one pairing in one experiment, played as one job."""
+    exp_num: int
+    pair_num: int
+    experiment: Experiment
+    strat_one: type[strat.Stratagem]
+    strat_two: type[strat.Stratagem]
+    num_trials: int
+    engine: str
+    seed: int
+    first_trial: int = 0
+    shell_seed: int | None = None
+    antithetic: bool = False
+    log_path: str | None = None
+
+
+def make_chunks(experiments: list[Experiment], match_pairs: list[tuple[type[strat.Stratagem], type[strat.Stratagem]]],
+                pairings: list[tuple[int, int]], num_trials: int, chunk_size: int, engine: str, seed: int,
+                shells: str = 'independent', log_directory: Path | None = None) -> list[TrialChunk]:
+    """
+    Splits `num_trials` trials of every (experiment #, pairing #) in `pairings`
+    into chunks of at most `chunk_size` trials. Each chunk is seeded by
+    `chunk_seed`, so results do not depend on which worker plays it or in
+    what order. Unless `shells` is `'independent'`, every chunk also replays
+    the shell stream of its experiment (see `chunk_shells`) from its first
+    trial. If `log_directory` is given, every chunk appends its games to its own
+    game log under it, named after its experiment, pairing and chunk number.
+    """
+    chunks: list[TrialChunk] = list()
+
+    for exp_num, pair_num in pairings:
+        strat_one, strat_two = match_pairs[pair_num]
+        for chunk_num, chunk_start in enumerate(range(0, num_trials, chunk_size)):
+            chunks.append(TrialChunk(exp_num, pair_num, experiments[exp_num], strat_one, strat_two,
+                                     min(chunk_size, num_trials - chunk_start), engine,
+                                     chunk_seed(seed, experiments[exp_num], strat_one, strat_two, chunk_num),
+                                     chunk_start, *chunk_shells(seed, experiments[exp_num], shells),
+                                     None if log_directory is None else
+                                     str(log_directory / f'experiment-{exp_num}' / f'{strat_one.__name__.lower()}-{strat_two.__name__.lower()}-{chunk_num}.log')))
+
+    return chunks
+
+
+def chunk_seed(seed: int, experiment: Experiment, strat_one: type[strat.Stratagem],
+               strat_two: type[strat.Stratagem], chunk_num: int) -> int:
+    """
+    Returns the seed of a chunk, derived from the root `seed`, the experiment
+    parameters, the pairing's names and the chunk's number alone, so a pairing
+    gets the same trials no matter which other pairings are played.
+    """
+    spawn_key: tuple[int, ...] = (experiment.num_blanks, experiment.num_lives, experiment.starting_health,
+                                  crc32(strat_one.__name__.encode()), crc32(strat_two.__name__.encode()), chunk_num)
+    return stream_seed(seed, *spawn_key)
+
+
+def chunk_shells(seed: int, experiment: Experiment, shells: str) -> tuple[int | None, bool]:
+    """
+    Returns the shell stream seed (`None` for independent shuffles) and
+    whether the stream is antithetic, for a chunk of `experiment` in
+    `shells` mode. The seed only depends on the root `seed` and the load, so
+    every pairing of an experiment replays the same stream.
+    """
+    if shells == 'independent':
+        return None, False
+
+    spawn_key: tuple[int, ...] = (experiment.num_blanks, experiment.num_lives, crc32(b'shells'))
+    return stream_seed(seed, *spawn_key), shells == 'antithetic'
+
+
+def root_seed(seed: int | None, default: int | None) -> int:
+    """Returns `seed`, or `default` if it is `None`, or fresh entropy if both are."""
+    if seed is not None:
+        return seed
+    return default if default is not None else int(np.random.SeedSequence().entropy)
+
+
+def wilson_interval(wins: int, num_trials: int, z: float = CONFIDENCE_Z) -> tuple[float, float]:
+    """Returns the Wilson score interval (at z-score `z`) of a win rate of `wins` out of `num_trials`."""
+    z_squared: float = z ** 2
+    win_rate: float = wins / num_trials
+    center: float = (win_rate + z_squared / (2 * num_trials)) / (1 + z_squared / num_trials)
+    spread: float = z * sqrt(win_rate * (1 - win_rate) / num_trials + z_squared / (4 * num_trials ** 2)) / (1 + z_squared / num_trials)
+    return max(0.0, center - spread), min(1.0, center + spread)
+
+
+def play_chunk(chunk: TrialChunk) -> tuple[TrialChunk, int, OutcomeTally]:
+    """
+    Plays the trials of `chunk` and returns it with the number of matches won
+    by `chunk.strat_one` and the tally of their outcomes.
+
+    With the `'batch'` engine every trial is played at once by `BatchMatch`;
+    with `'fast'` they are played one at a time by a single `Match` that is
+    reset between trials; with `'match'` each trial gets a new `Match`. If the
+    chunk has a `shell_seed`, every engine takes its loads from that stream.
+    If it has a `log_path`, the `'match'` engine appends every game to that
+    game log.
+    Every engine draws from a PCG64 generator seeded with `chunk.seed`,
+    through a `BlockRandom` for the engines that play one game at a time.
+    Players are the stratagems' shared instances (see `strat.shared`), so no
+    engine builds them per trial, except for stateful stratagems, which `Match`
+    gives a fresh instance every game.
+    """
+    experiment: Experiment = chunk.experiment
+    tally: OutcomeTally = OutcomeTally(experiment.starting_health)
+    stream: ShellStream | None = None
+    if chunk.shell_seed is not None:
+        stream = shell_stream(experiment.num_blanks, experiment.num_lives, chunk.shell_seed, chunk.antithetic)
+
+    # Stateful stratagems cannot be compiled for BatchMatch, so their pairings are played by the fast engine
+    if chunk.engine == 'batch' and not (chunk.strat_one.STATEFUL or chunk.strat_two.STATEFUL):
+        batch: BatchMatch = BatchMatch(experiment.num_blanks, experiment.num_lives, experiment.starting_health,
+                                       strat.shared(chunk.strat_one), strat.shared(chunk.strat_two), chunk.num_trials,
+                                       np.random.default_rng(chunk.seed), stream, chunk.first_trial)
+        return chunk, int(batch.play(tally).sum()), tally
+
+    rng: BlockRandom = BlockRandom(np.random.default_rng(chunk.seed))
+    wins: int = 0
+
+    if chunk.engine != 'match':
+        reused_match: Match = Match(experiment.num_blanks, experiment.num_lives, experiment.starting_health,
+                                    strat.shared(chunk.strat_one), strat.shared(chunk.strat_two), shells=stream, rng=rng)
+        for trial in range(chunk.first_trial, chunk.first_trial + chunk.num_trials):
+            reused_match.reset(trial)
+            wins += reused_match.play_fast()
+            reused_match.record(tally)
+        return chunk, wins, tally
+
+    with nullcontext() if chunk.log_path is None else \
+         GameLogWriter(chunk.log_path, experiment.num_blanks, experiment.num_lives, experiment.starting_health,
+                       chunk.strat_one.__name__, chunk.strat_two.__name__) as log:
+        for trial in range(chunk.first_trial, chunk.first_trial + chunk.num_trials):
+            new_match: Match = Match(experiment.num_blanks, experiment.num_lives, experiment.starting_health,
+                                     strat.shared(chunk.strat_one), strat.shared(chunk.strat_two), log, shells=stream, rng=rng)
+            if stream is not None:
+                new_match.reset(trial)
+            wins += 1 if new_match.play() else 0
+            new_match.record(tally)
+    return chunk, wins, tally
@@ -0,0 +1,84 @@
+# test_cache.py
+#
+# Checks what cached pairing results are keyed on, and how the result cache
+# accounts for and evicts its entries.
+import os
+import pytest
+import sys
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import cache
+
+from cache import ResultCache, pairing_key, stratagem_digest
+from stratagem import Greedy, Safe
+
+# Parameters of a pairing, which the keys below each change one of
+PARAMS: dict = {'experiment': {'num_blanks': 4, 'num_lives': 4, 'starting_health': 3}, 'trials': 1000,
+                'chunk_size': 25000, 'seed': 0, 'engine': 'batch', 'shells': 'independent'}
+
+
+class Patient(Safe):
+    """A stratagem inheriting everything from `Safe`."""
+
+
+def _cached_bytes(directory: Path) -> int:
+    """Returns the size of every result cached in `directory`."""
+    return sum(entry.stat().st_size for entry in directory.glob('*/*.json'))
+
+
+@pytest.mark.parametrize('change', [{'trials': 2000}, {'chunk_size': 5000}, {'seed': 1}, {'engine': 'fast'},
+                                    {'shells': 'common'}, {'experiment': {'num_blanks': 4, 'num_lives': 4, 'starting_health': 5}}],
+                         ids=lambda change: next(iter(change)))
+def test_keys_depend_on_params(change: dict) -> None:
+    assert pairing_key(Greedy, Safe, {**PARAMS, **change}) != pairing_key(Greedy, Safe, PARAMS)
+
+
+def test_keys_depend_on_order_and_stratagems() -> None:
+    assert pairing_key(Greedy, Safe, PARAMS) != pairing_key(Safe, Greedy, PARAMS)
+    assert pairing_key(Greedy, Safe, PARAMS) != pairing_key(Greedy, Patient, PARAMS)
+
+
+def test_keys_depend_on_engine_sources(monkeypatch: pytest.MonkeyPatch) -> None:
+    key: str = pairing_key(Greedy, Safe, PARAMS)
+    monkeypatch.setattr(cache, 'engine_digest', lambda: 'edited')
+    assert pairing_key(Greedy, Safe, PARAMS) != key
+
+
+def test_digests_cover_base_classes() -> None:
+    # A subclass without code of its own still hashes differently from an empty class
+    assert stratagem_digest(Patient) != stratagem_digest(type('Patient', (Greedy,), {}))
+    assert stratagem_digest(Patient) == stratagem_digest(Patient)
+
+
+def test_results_round_trip(tmp_path: Path) -> None:
+    result_cache: ResultCache = ResultCache(tmp_path)
+    assert result_cache.get('ab' * 32) is None
+    result_cache.put('ab' * 32, {'wins': 1, 'trials': 2})
+    assert result_cache.get('ab' * 32) == {'wins': 1, 'trials': 2}
+
+
+def test_overwrites_do_not_inflate_the_total(tmp_path: Path) -> None:
+    result_cache: ResultCache = ResultCache(tmp_path)
+    result_cache.put('cd' * 32, {'wins': 0})
+    for wins in range(100):
+        result_cache.put('cd' * 32, {'wins': wins * 1000})
+    assert result_cache._total_bytes == _cached_bytes(tmp_path)
+
+
+def test_least_recently_used_results_are_evicted(tmp_path: Path) -> None:
+    keys: list[str] = [f'{num:064x}' for num in range(10)]
+    for num, key in enumerate(keys[:-1]):
+        ResultCache(tmp_path).put(key, {'padding': 'x' * 20})
+        os.utime(ResultCache(tmp_path)._path(key), (num, num))
+
+    # Reading the oldest result makes it the most recently used, then a write goes over the bound
+    result_cache: ResultCache = ResultCache(tmp_path, max_bytes=_cached_bytes(tmp_path))
+    assert result_cache.get(keys[0]) is not None
+    result_cache.put(keys[-1], {'padding': 'x' * 20})
+
+    assert _cached_bytes(tmp_path) <= result_cache._max_bytes * 3 // 4
+    assert result_cache.get(keys[0]) is not None and result_cache.get(keys[-1]) is not None
+    assert result_cache.get(keys[1]) is None
@@ -0,0 +1,91 @@
+# test_distribute.py
+#
+# Checks that jobs in a shared directory are claimed by one worker each,
+# taken back from dead workers, and all played before results are merged.
+import json
+import os
+import pytest
+import sys
+
+from itertools import combinations_with_replacement
+from pathlib import Path
+from time import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import distribute
+
+from distribute import CLAIMED, PENDING, RESULTS, create_manifest, job_counts, merge_results, work
+from stratagem import Greedy, Safe
+from trials import Experiment, make_chunks, play_chunk
+
+# Trials per pairing of every test manifest
+NUM_TRIALS: int = 200
+
+# Seconds after which claims are stale in these tests
+STALE_SECONDS: float = 60.0
+
+
+@pytest.fixture
+def directory(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A manifest of one small experiment between two stratagems, with one job per pairing."""
+    monkeypatch.setattr(distribute, 'EXPERIMENTS', [Experiment(2, 2, 2)])
+    monkeypatch.setattr(distribute, 'STRATAGEMS', [Greedy, Safe])
+    assert create_manifest(tmp_path, NUM_TRIALS, 'batch', 'independent', 1) == 3
+    return tmp_path
+
+
+def _age(path: Path, seconds: float) -> None:
+    """Makes the last heartbeat of `path` `seconds` old."""
+    then: float = time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_jobs_are_claimed_once(directory: Path) -> None:
+    claims: list[Path | None] = [distribute._claim(directory, f'worker{num}') for num in range(4)]
+    assert claims[-1] is None
+    assert len({claim.name.split('.')[0] for claim in claims[:-1]}) == 3
+    assert job_counts(directory) == {PENDING: 0, CLAIMED: 3, RESULTS: 0}
+
+
+def test_only_stale_claims_are_taken_back(directory: Path) -> None:
+    dead: Path = distribute._claim(directory, 'dead')
+    alive: Path = distribute._claim(directory, 'alive')
+    _age(dead, STALE_SECONDS * 2)
+    _age(alive, STALE_SECONDS / 2)
+
+    distribute._reclaim_stale(directory, STALE_SECONDS)
+    assert not dead.exists() and alive.exists()
+    assert (directory / PENDING / f'{dead.name.split(".")[0]}.json').exists()
+
+
+def test_work_plays_every_job(directory: Path) -> None:
+    # One worker died mid-job, another after writing its result but before removing its claim
+    _age(distribute._claim(directory, 'dead'), STALE_SECONDS * 2)
+    finished: Path = distribute._claim(directory, 'finished')
+    job_name: str = finished.name.split('.')[0]
+    with open(directory / RESULTS / f'{job_name}.json', 'w') as out_file:
+        json.dump({'wins': -1}, out_file)
+    _age(finished, STALE_SECONDS * 2)
+
+    work(directory, STALE_SECONDS)
+    assert job_counts(directory) == {PENDING: 0, CLAIMED: 0, RESULTS: 3}
+
+    # Finished results are kept, and the rest match playing the same chunks directly
+    match_pairs: list = list(combinations_with_replacement([Greedy, Safe], 2))
+    for chunk in make_chunks([Experiment(2, 2, 2)], match_pairs, [(0, pair_num) for pair_num in range(3)],
+                             NUM_TRIALS, distribute.CHUNK_SIZE, 'batch', 1, 'independent'):
+        name: str = distribute._job_name(chunk)
+        with open(directory / RESULTS / f'{name}.json', 'r') as in_file:
+            wins: int = json.load(in_file)['wins']
+        assert wins == (-1 if name == job_name else play_chunk(chunk)[1])
+
+
+def test_merging_needs_every_result(directory: Path, tmp_path_factory: pytest.TempPathFactory) -> None:
+    folder: Path = tmp_path_factory.mktemp('merged')
+    with pytest.raises(RuntimeError):
+        merge_results(directory, folder)
+
+    work(directory, STALE_SECONDS)
+    merge_results(directory, folder)
+    assert any(folder.iterdir())
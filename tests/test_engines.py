@@ -0,0 +1,126 @@
+# test_engines.py
+#
+# Checks every sampling engine against the exact solver, and the optimal
+# solver against the exact solver and best responses.
+import numpy as np
+import pytest
+import sys
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import optimal
+
+from game import BatchMatch, ExactMatch, Match
+from policy import best_response, compile_policy
+from rng import BlockRandom
+from stratagem import Balanced, Greedy, Optimal, Random, Safe, Stratagem, shared
+from trials import wilson_interval
+
+# Loads and starting healths (blanks, lives, health) every engine is checked on
+LOADS: list[tuple[int, int, int]] = [(4, 4, 3), (2, 4, 3), (1, 2, 2)]
+
+# Pairings every engine is checked on, covering deterministic, mixed and optimal players
+PAIRINGS: list[tuple[type[Stratagem], type[Stratagem]]] = [(Optimal, Optimal), (Greedy, Random), (Balanced, Safe)]
+
+# Games sampled per check by each engine
+NUM_GAMES: dict[str, int] = {
+    'batch': 100000,
+    'fast': 20000,
+    'match': 20000,
+}
+
+# Z-score of the interval a sampled win rate must cover the exact one with (99.9%)
+Z: float = 3.29
+
+# Exact win rate of Optimal against itself at 4 blanks, 4 lives and 3 health
+OPTIMAL_4_4_3: float = 0.5314
+
+
+@pytest.fixture(autouse=True)
+def _solution_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keeps solutions cached on disk by `optimal.solve` out of the repository."""
+    monkeypatch.chdir(tmp_path)
+
+
+def _exact(num_blanks: int, num_live: int, starting_health: int,
+           strat_one: type[Stratagem], strat_two: type[Stratagem]) -> float:
+    """Returns the exact probability that `strat_one` beats `strat_two` moving first."""
+    exact: ExactMatch = ExactMatch(num_blanks, num_live, starting_health, shared(strat_one), shared(strat_two))
+    return float(exact.win_probabilities()[1, num_blanks, num_live, starting_health, starting_health])
+
+
+def _sample(engine: str, num_blanks: int, num_live: int, starting_health: int,
+            strat_one: type[Stratagem], strat_two: type[Stratagem], num_games: int) -> int:
+    """Returns how many of `num_games` games `strat_one` wins on `engine`."""
+    if engine == 'batch':
+        batch: BatchMatch = BatchMatch(num_blanks, num_live, starting_health, shared(strat_one), shared(strat_two),
+                                       num_games, np.random.default_rng(0))
+        return int(batch.play().sum())
+
+    rng: BlockRandom = BlockRandom(np.random.default_rng(0))
+    if engine == 'fast':
+        reused_match: Match = Match(num_blanks, num_live, starting_health, shared(strat_one), shared(strat_two), rng=rng)
+        wins: int = 0
+        for _ in range(num_games):
+            reused_match.reset()
+            wins += reused_match.play_fast()
+        return wins
+
+    return sum(Match(num_blanks, num_live, starting_health, shared(strat_one), shared(strat_two), rng=rng).play()
+               for _ in range(num_games))
+
+
+@pytest.mark.parametrize('engine', list(NUM_GAMES))
+@pytest.mark.parametrize('load', LOADS)
+@pytest.mark.parametrize('pairing', PAIRINGS, ids=lambda pairing: f'{pairing[0].__name__}-{pairing[1].__name__}')
+def test_engine_matches_exact(engine: str, load: tuple[int, int, int],
+                              pairing: tuple[type[Stratagem], type[Stratagem]]) -> None:
+    wins: int = _sample(engine, *load, *pairing, NUM_GAMES[engine])
+    low, high = wilson_interval(wins, NUM_GAMES[engine], Z)
+    assert low <= _exact(*load, *pairing) <= high
+
+
+def test_optimal_reference_value() -> None:
+    assert _exact(4, 4, 3, Optimal, Optimal) == pytest.approx(OPTIMAL_4_4_3, abs=1e-4)
+
+
+@pytest.mark.parametrize('load', LOADS)
+def test_minimax_values_match_exact(load: tuple[int, int, int]) -> None:
+    num_blanks, num_live, starting_health = load
+    _, values = optimal.solve(*load, directory=None)
+    assert values[num_blanks, num_live, starting_health, starting_health] == pytest.approx(_exact(*load, Optimal, Optimal))
+
+
+@pytest.mark.parametrize('load', LOADS)
+def test_optimal_is_a_best_response_to_itself(load: tuple[int, int, int]) -> None:
+    _, minimax = optimal.solve(*load, directory=None)
+    _, response = optimal.solve(*load, compile_policy(Optimal, *load), 'test-vs-optimal', directory=None)
+    np.testing.assert_allclose(response, minimax, atol=1e-12)
+
+
+@pytest.mark.parametrize('load', LOADS)
+@pytest.mark.parametrize('opponent', [Greedy, Random, Balanced, Safe], ids=lambda opponent: opponent.__name__)
+def test_best_responses_bound_minimax(load: tuple[int, int, int], opponent: type[Stratagem]) -> None:
+    num_blanks, num_live, starting_health = load
+    _, minimax = optimal.solve(*load, directory=None)
+    _, response = optimal.solve(*load, compile_policy(opponent, *load), f'test-vs-{opponent.__name__}', directory=None)
+
+    # Exploiting a fixed opponent never does worse than the minimax guarantee
+    assert np.all(response >= minimax - 1e-12)
+    # ...and its value is what the exact solver gives the best response
+    assert response[num_blanks, num_live, starting_health, starting_health] == \
+           pytest.approx(_exact(*load, best_response(opponent), opponent))
+
+
+@pytest.mark.parametrize('load', LOADS)
+def test_fixed_policies_do_not_beat_minimax(load: tuple[int, int, int]) -> None:
+    num_blanks, num_live, starting_health = load
+    _, minimax = optimal.solve(*load, directory=None)
+    policies: np.ndarray = np.stack([compile_policy(stratagem, *load) for stratagem in (Greedy, Random, Balanced, Safe, Optimal)])
+    win_rates: np.ndarray = optimal.evaluate(*load, policies)
+
+    # Against an optimal opponent, no policy wins more often than Optimal, which reaches the minimax value
+    assert np.all(win_rates[:, 0] <= minimax[num_blanks, num_live, starting_health, starting_health] + 1e-12)
+    assert win_rates[-1, 0] == pytest.approx(minimax[num_blanks, num_live, starting_health, starting_health])
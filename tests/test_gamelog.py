@@ -0,0 +1,107 @@
+# test_gamelog.py
+#
+# Checks that game logs read back the games written to them, and that their
+# indexes are repaired or rebuilt after an interrupted writer.
+import numpy as np
+import os
+import pytest
+import sys
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from game import Match
+from gamelog import INDEX_FORMAT, GameLogReader, GameLogWriter, GameRecord, index_path
+from observer import MatchObserver
+from rng import BlockRandom
+from stratagem import Greedy, Move, Outcome, Random, shared
+
+# Load and starting health of every logged game
+LOAD: tuple[int, int, int] = (2, 3, 3)
+
+
+class Recorder(MatchObserver):
+    """Passes every game a `Match` plays on to `log`, and records it the way the log should read it back."""
+    def __init__(self, log: GameLogWriter) -> None:
+        self.games: list[GameRecord] = list()
+        self._log: GameLogWriter = log
+        self._loads: list[int] = list()
+        self._outcomes: list[Outcome] = list()
+
+
+    def on_load(self, shells: int) -> None:
+        self._log.on_load(shells)
+        self._loads.append(shells)
+
+
+    def on_shot(self, player1_turn: bool, move: Move, outcome: Outcome) -> None:
+        self._log.on_shot(player1_turn, move, outcome)
+        self._outcomes.append(outcome)
+
+
+    def on_game_end(self, player_one_won: bool) -> None:
+        self._log.on_game_end(player_one_won)
+        self.games.append(GameRecord(self._loads, self._outcomes, player_one_won))
+        self._loads, self._outcomes = list(), list()
+
+
+def _log_games(path: Path, num_games: int, seed: int = 0) -> list[GameRecord]:
+    """Appends `num_games` games of Greedy against Random to the log at `path`, and returns them."""
+    rng: BlockRandom = BlockRandom(np.random.default_rng(seed))
+    with GameLogWriter(path, *LOAD, 'Greedy', 'Random') as log:
+        recorder: Recorder = Recorder(log)
+        for _ in range(num_games):
+            Match(*LOAD, shared(Greedy), shared(Random), recorder, rng=rng).play()
+    return recorder.games
+
+
+def _read_games(path: Path) -> list[GameRecord]:
+    """Returns every game indexed in the log at `path`."""
+    with GameLogReader(path) as reader:
+        return [reader.game(game_num) for game_num in range(len(reader))]
+
+
+def test_games_read_back(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'games.log'
+    games: list[GameRecord] = _log_games(path, 20) + _log_games(path, 5, seed=1)
+    assert _read_games(path) == games
+
+
+def test_other_matches_are_refused(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'games.log'
+    _log_games(path, 1)
+    with pytest.raises(ValueError):
+        GameLogWriter(path, *LOAD, 'Greedy', 'Safe')
+
+
+def test_stale_index_entries_are_dropped(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'games.log'
+    games: list[GameRecord] = _log_games(path, 3)
+    log_size: int = path.stat().st_size
+    with open(index_path(path), 'ab') as index_file:
+        index_file.write(INDEX_FORMAT.pack(log_size) + INDEX_FORMAT.pack(log_size + 40))
+
+    assert _read_games(path) == games
+    games += _log_games(path, 2, seed=1)
+    assert _read_games(path) == games
+
+
+def test_missing_index_is_rebuilt(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'games.log'
+    games: list[GameRecord] = _log_games(path, 10)
+    os.remove(index_path(path))
+
+    games += _log_games(path, 3, seed=1)
+    assert _read_games(path) == games
+
+
+def test_torn_record_is_cut_when_rebuilding(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'games.log'
+    games: list[GameRecord] = _log_games(path, 4)
+    os.remove(index_path(path))
+    with open(path, 'ab') as log:
+        log.write(b'\x09\x00\x02')
+
+    games += _log_games(path, 2, seed=1)
+    assert _read_games(path) == games
@@ -0,0 +1,66 @@
+# test_server.py
+#
+# Checks that the server validates jobs before playing them, and plays and
+# evicts the jobs it accepts.
+import asyncio
+import json
+import pytest
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import server
+
+from server import HTTPError, Job, Service
+
+# A valid job, which the invalid ones below each change one field of
+JOB: dict = {'blanks': 2, 'lives': 2, 'health': 2, 'strat_one': 'greedy', 'strat_two': 'safe', 'trials': 1000, 'seed': 1}
+
+
+async def _post(service: Service, params: dict) -> Job:
+    """Submits `params` to `service` and waits for the job to finish."""
+    _, snapshot = await service._route('POST', ['jobs'], json.dumps(params).encode())
+    job: Job = service.jobs[snapshot['id']]
+    while not job.done:
+        await asyncio.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def service(tmp_path: Path) -> Service:
+    with ThreadPoolExecutor(1) as pool:
+        yield Service(tmp_path, pool, None)
+
+
+@pytest.mark.parametrize('change', [{'seed': -1}, {'seed': 1.5}, {'seed': 'one'}, {'trials': 0},
+                                    {'trials': server.MAX_JOB_TRIALS + 1}, {'lives': 0}, {'blanks': -1}, {'health': 0},
+                                    {'health': server.MAX_JOB_HEALTH + 1}, {'blanks': server.MAX_JOB_LOAD},
+                                    {'engine': 'gpu'}, {'strat_one': 'nobody'}, {'lives': None}],
+                         ids=lambda change: ','.join(f'{key}={value}' for key, value in change.items()))
+def test_invalid_jobs_are_rejected(service: Service, change: dict) -> None:
+    with pytest.raises(HTTPError) as error:
+        asyncio.run(_post(service, {**JOB, **change}))
+    assert error.value.status == 400
+    assert len(service.jobs) == 0
+
+
+def test_jobs_are_played_and_shared(service: Service) -> None:
+    async def submit_twice() -> tuple[Job, Job]:
+        return await _post(service, JOB), await _post(service, {**JOB, 'strat_one': 'g'})
+
+    first, second = asyncio.run(submit_twice())
+    assert first is second
+    assert first.error is None and first.trials == JOB['trials']
+
+
+def test_finished_jobs_are_evicted(service: Service, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server, 'MAX_FINISHED_JOBS', 2)
+
+    async def submit(seeds: range) -> list[Job]:
+        return [await _post(service, {**JOB, 'seed': seed}) for seed in seeds]
+
+    jobs: list[Job] = asyncio.run(submit(range(3)))
+    assert [job.job_id for job in jobs if job.job_id in service.jobs] == [job.job_id for job in jobs[1:]]
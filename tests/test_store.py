@@ -0,0 +1,80 @@
+# test_store.py
+#
+# Checks that result stores read back what was written, and that rewriting
+# one swaps its arrays atomically without breaking open readers.
+import json
+import numpy as np
+import pytest
+import sys
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import store
+
+from store import HEADER_NAME, ResultStore, is_store, write_store
+
+# Stratagems of every test store
+NAMES: list[str] = ['greedy', 'safe', 'random']
+
+
+def _arrays(num_experiments: int, fill: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns win rate, win and trial tensors of a store, with every win rate `fill`."""
+    shape: tuple[int, int, int] = (num_experiments, len(NAMES), len(NAMES))
+    return np.full(shape, fill), np.full(shape, int(fill * 100)), np.full(shape, 100)
+
+
+def _params(num_experiments: int) -> list[dict]:
+    """Returns the params of `num_experiments` experiments."""
+    return [{'blanks': exp_num + 1, 'lives': 4, 'health': 3} for exp_num in range(num_experiments)]
+
+
+def test_stores_read_back(tmp_path: Path) -> None:
+    write_store(tmp_path, NAMES, _params(2), *_arrays(2, 0.25), sources={'greedy': 'abc'})
+    assert is_store(tmp_path)
+
+    result_store: ResultStore = ResultStore(tmp_path)
+    assert result_store.names == NAMES and result_store.params == _params(2) and result_store.sources == {'greedy': 'abc'}
+    assert np.all(result_store.row(1, 'Safe') == 0.25)
+    assert result_store.experiment_dict(0, ['greedy'])['strats']['greedy']['overall'] == pytest.approx(0.25)
+
+
+def test_misshapen_arrays_are_refused(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        write_store(tmp_path, NAMES, _params(3), *_arrays(2, 0.5))
+
+
+def test_rewrites_keep_open_readers_and_remove_old_arrays(tmp_path: Path) -> None:
+    write_store(tmp_path, NAMES, _params(2), *_arrays(2, 0.25))
+    old_store: ResultStore = ResultStore(tmp_path)
+
+    write_store(tmp_path, NAMES, _params(3), *_arrays(3, 0.75))
+
+    assert np.all(old_store.winrates == 0.25) and old_store.winrates.shape[0] == 2
+    assert np.all(ResultStore(tmp_path).winrates == 0.75)
+    assert len(list(tmp_path.glob('*.npy'))) == 3
+
+
+def test_interrupted_rewrites_leave_the_old_store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    write_store(tmp_path, NAMES, _params(2), *_arrays(2, 0.25))
+
+    def crash(*_) -> None:
+        raise OSError('Killed before the header was replaced')
+
+    monkeypatch.setattr(store.os, 'replace', crash)
+    with pytest.raises(OSError):
+        write_store(tmp_path, NAMES, _params(3), *_arrays(3, 0.75))
+    monkeypatch.undo()
+
+    assert np.all(ResultStore(tmp_path).winrates == 0.25)
+
+
+def test_version_1_stores_are_readable(tmp_path: Path) -> None:
+    for name, array in zip(('winrates', 'wins', 'trials'), _arrays(1, 0.5)):
+        np.save(tmp_path / f'{name}.npy', array)
+    with open(tmp_path / HEADER_NAME, 'w') as out_file:
+        json.dump({'version': 1, 'strats': NAMES, 'params': _params(1), 'sources': dict(),
+                   'axes': ['experiment', 'strat', 'opponent']}, out_file)
+
+    assert np.all(ResultStore(tmp_path).winrates == 0.5)
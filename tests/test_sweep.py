@@ -0,0 +1,62 @@
+# test_sweep.py
+#
+# Checks that sweeps reject grids whose games never end, and that their
+# checkpoints survive torn lines and refuse other sweeps on resume.
+import json
+import pytest
+import sys
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import sweep
+
+from store import ResultStore
+
+
+def _spec(*args: str) -> dict:
+    """Returns the spec of an exact sweep of Greedy and Safe with the command line `args`."""
+    return sweep._make_spec(sweep.parser.parse_args(['--exact', '--strats', 'greedy', 'safe', *args]))
+
+
+@pytest.mark.parametrize('args', [['--lives', '0', '4'], ['--blanks', '-1', '2'], ['--health', '0'],
+                                  ['--blanks', '1', '4', '0'], ['--lives', '3', '1'], ['--health', '1', '2', '3', '4']])
+def test_invalid_grids_are_rejected(args: list[str]) -> None:
+    with pytest.raises(ValueError):
+        _spec(*args)
+
+
+def test_resume_refuses_invalid_grids(tmp_path: Path) -> None:
+    spec: dict = _spec('--blanks', '1', '--lives', '1', '--health', '2')
+    spec['experiments'][0]['num_lives'] = 0
+    with pytest.raises(ValueError):
+        sweep.run_sweep(tmp_path, spec)
+
+
+def test_resume_skips_finished_pairings_and_torn_lines(tmp_path: Path) -> None:
+    spec: dict = _spec('--blanks', '1', '--lives', '1', '2', '--health', '2')
+    digest: str = sweep.spec_digest(spec)
+
+    # A sweep killed after its first pairing, halfway through writing the next one
+    with open(tmp_path / sweep.CHECKPOINT_NAME, 'w') as checkpoint:
+        checkpoint.write(json.dumps({'spec': digest}) + '\n')
+        checkpoint.write(json.dumps({'exp': 0, 'pair': 1, 'winrate': 0.125}) + '\n')
+        checkpoint.write('{"exp": 0, "pa')
+
+    sweep.run_sweep(tmp_path, spec)
+
+    with open(tmp_path / sweep.CHECKPOINT_NAME, 'r') as checkpoint:
+        lines: list[dict] = [json.loads(line) for line in checkpoint]
+    assert lines[0] == {'spec': digest}
+    assert sorted((line['exp'], line['pair']) for line in lines[1:]) == [(exp, pair) for exp in range(2) for pair in range(3)]
+
+    # The finished pairing was kept rather than replayed
+    store: ResultStore = ResultStore(tmp_path)
+    assert store.winrates[0, store.index('greedy'), store.index('safe')] == 0.125
+
+
+def test_resume_refuses_another_sweeps_checkpoint(tmp_path: Path) -> None:
+    sweep.run_sweep(tmp_path, _spec('--blanks', '1', '--lives', '1', '--health', '2'))
+    with pytest.raises(ValueError):
+        sweep.run_sweep(tmp_path, _spec('--blanks', '2', '--lives', '1', '--health', '2'))